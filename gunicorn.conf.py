@@ -0,0 +1,31 @@
+# Konfigurace gunicornu, načítá se automaticky z pracovního adresáře (Procfile: gunicorn pojistovna_ITnetwork.wsgi)
+import os
+import shutil
+import tempfile
+
+
+# Aplikace se načte a zahřeje jednou v masteru (pojistovna/warmup.py), workery ji zdědí forkem
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+# Restart workeru po N požadavcích (0 = nikdy), s preloadem je nový worker hned zahřátý
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+# Vlákna na worker, od 2 gunicorn použije worker gthread. Souběžná stejná vyhledávání
+# se slévají jen mezi vlákny jednoho workeru (pojistovna/search_cache.py), synchronní
+# worker (GUNICORN_THREADS=1) obslouží najednou jeden požadavek a slévání se neuplatní.
+# Pool spojení PostgreSQL (POSTGRES_POOL_MAX) musí stačit na všechna vlákna workeru.
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+
+def on_starting(server):
+    # Metriky z předchozího běhu serveru nepatří k tomu novému (pojistovna/metrics.py)
+    metrics_dir = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'pojistovna_metrics'))
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def when_ready(server):
+    # Volá se v masteru po načtení aplikace a před forkem prvních workerů
+    if server.cfg.preload_app:
+        from pojistovna.warmup import warm
+        for step, (result, ms) in warm().items():
+            server.log.info("Warmup %s: %s (%.1f ms)", step, result, ms)
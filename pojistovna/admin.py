@@ -1,11 +1,187 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 # Register your models here.
 
-from .models import InsuredPerson, Insurance, InsuranceType
+from . import audit, catalogue
+from .deletion import request_deletion
+from .insurance_numbers import is_valid_insurance_number
+from .models import AuditLog, Event, InsuredPerson, Insurance, InsuranceType, PremiumInstallment
+from .paginators import AdminCountPaginator
 
-admin.site.register(InsuranceType)
-admin.site.register(InsuredPerson)
-admin.site.register(Insurance)
 
+def surname_prefix(queryset, term, field='surname'):
+    """
+    Hledání podle začátku příjmení přes index person_surname_upper_idx.
+    Rozsah místo LIKE: index na UPPER() umí SQLite i PostgreSQL použít jen pro porovnání.
+    SQLite převádí v UPPER() jen ASCII znaky, hledaný text se musí převést stejně.
+    """
+    if connections[queryset.db].vendor == 'sqlite':
+        upper = ''.join(char.upper() if char.isascii() else char for char in term)
+    else:
+        upper = term.upper()
+    return queryset.alias(_surname_upper=Upper(field)).filter(
+        _surname_upper__gte=upper, _surname_upper__lt=upper + '\uffff',
+    )
 
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist pro tabulky s miliony řádků: počet v cache místo COUNT(*) při každém
+    načtení, bez druhého počtu celé tabulky a řazení podle primárního klíče.
+    """
+    paginator = AdminCountPaginator
+    show_full_result_count = False
+    ordering = ('-id',)
+    list_per_page = 50
+
+    def _record_update(self, request, queryset, changes):
+        # update() nevyvolá signály, záznamy do historie se zapíší ručně
+        for pk in queryset.values_list('pk', flat=True):
+            audit.record(queryset.model._meta.model_name, pk, AuditLog.ACTION_UPDATE, changes, user=request.user)
+
+
+class BackgroundDeletionMixin:
+    """
+    Mazání přes frontu na pozadí (deletion.py), admin by kaskádu mazal v jednom požadavku.
+    """
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description="Smazat vybrané na pozadí")
+    def request_deletion_action(self, request, queryset):
+        jobs = [request_deletion(obj, user=request.user) for obj in queryset.visible()]
+        self.message_user(request, f"Ke smazání na pozadí zařazeno {len(jobs)} záznamů.", messages.SUCCESS)
+
+
+@admin.register(InsuranceType)
+class InsuranceTypeAdmin(admin.ModelAdmin):
+    list_display = ('insurance_name', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('insurance_name',)
+    actions = ('activate', 'deactivate')
+
+    @admin.action(description="Aktivovat vybrané typy pojištění")
+    def activate(self, request, queryset):
+        updated = queryset.update(is_active=True)
+        catalogue.invalidate()
+        self.message_user(request, f"Aktivováno {updated} typů pojištění.", messages.SUCCESS)
+
+    @admin.action(description="Deaktivovat vybrané typy pojištění")
+    def deactivate(self, request, queryset):
+        updated = queryset.update(is_active=False)
+        catalogue.invalidate()
+        self.message_user(request, f"Deaktivováno {updated} typů pojištění.", messages.SUCCESS)
+
+
+@admin.register(InsuredPerson)
+class InsuredPersonAdmin(BackgroundDeletionMixin, LargeTableAdmin):
+    list_display = ('id', 'surname', 'name', 'email', 'telephone_number', 'date_registration', 'anonymized_at')
+    search_fields = ('surname', 'email', 'birth_certificate_number', 'company_registration_number')
+    search_help_text = "Začátek příjmení, celý e-mail, rodné číslo, IČO nebo ID."
+    autocomplete_fields = ('user',)
+    actions = ('request_deletion_action',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Jen dotazy, které jdou přes index (výchozí icontains prochází celou tabulku)
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if '@' in term:
+            return queryset.filter(email=term), False
+        if term.isdigit():
+            return queryset.filter(Q(pk=int(term)) | Q(company_registration_number=term) | Q(birth_certificate_number=term)), False
+        if '/' in term:
+            return queryset.filter(birth_certificate_number=term), False
+        return surname_prefix(queryset, term), False
+
+
+@admin.register(Insurance)
+class InsuranceAdmin(BackgroundDeletionMixin, LargeTableAdmin):
+    list_display = ('insurance_number', 'insured_person', 'insurance_type', 'insurance_subject', 'insurance_price', 'payment_frequency', 'start_date', 'end_date', 'is_active', 'auto_renew')
+    list_select_related = ('insured_person', 'insurance_type')
+    list_filter = ('is_active', 'auto_renew', 'insurance_type')
+    search_fields = ('insurance_number', 'insured_person__surname')
+    search_help_text = "Číslo pojištění nebo začátek příjmení pojištěnce."
+    autocomplete_fields = ('insured_person', 'insurance_type')
+    actions = ('activate', 'deactivate', 'request_deletion_action')
+
+    def get_queryset(self, request):
+        # __str__ prochází pojištěnce a typ, potřebují je i autocomplete a výběr v událostech
+        return super().get_queryset(request).select_related('insured_person', 'insurance_type')
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term[:1].isdigit():
+            return queryset.filter(insurance_number=term), False
+        return surname_prefix(queryset, term, field='insured_person__surname'), False
+
+    @admin.action(description="Aktivovat vybraná pojištění")
+    def activate(self, request, queryset):
+        self._record_update(request, queryset.filter(is_active=False), {'is_active': [False, True]})
+        updated = queryset.update(is_active=True)
+        self.message_user(request, f"Aktivováno {updated} pojištění.", messages.SUCCESS)
+
+    @admin.action(description="Deaktivovat vybraná pojištění")
+    def deactivate(self, request, queryset):
+        self._record_update(request, queryset.filter(is_active=True), {'is_active': [True, False]})
+        updated = queryset.update(is_active=False)
+        self.message_user(request, f"Deaktivováno {updated} pojištění.", messages.SUCCESS)
+
+
+@admin.register(Event)
+class EventAdmin(LargeTableAdmin):
+    list_display = ('id', 'insurance', 'report_date', 'damage_amount', 'payment_amount', 'is_approved', 'anomaly_score')
+    list_select_related = ('insurance__insured_person', 'insurance__insurance_type')
+    list_filter = ('is_approved',)
+    date_hierarchy = 'report_date'
+    search_fields = ('=id', 'insurance__insurance_number')
+    search_help_text = "ID události nebo číslo pojištění."
+    autocomplete_fields = ('insurance',)
+    readonly_fields = ('anomaly_score', 'anomaly_flags')
+    actions = ('approve',)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if is_valid_insurance_number(term):
+            return queryset.filter(insurance__insurance_number=term), False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        return queryset.none(), False
+
+    @admin.action(description="Schválit vybrané události")
+    def approve(self, request, queryset):
+        pending = queryset.filter(is_approved=False)
+        self._record_update(request, pending, {'is_approved': [False, True]})
+        updated = pending.update(is_approved=True)
+        self.message_user(request, f"Schváleno {updated} událostí.", messages.SUCCESS)
+
+
+@admin.register(PremiumInstallment)
+class PremiumInstallmentAdmin(LargeTableAdmin):
+    list_display = ('id', 'insurance', 'sequence', 'due_date', 'amount', 'paid_at', 'dunning_level')
+    list_select_related = ('insurance__insured_person', 'insurance__insurance_type')
+    list_filter = ('dunning_level',)
+    search_fields = ('insurance__insurance_number',)
+    search_help_text = "Číslo pojištění."
+    autocomplete_fields = ('insurance',)
+    readonly_fields = ('dunning_level', 'reminded_at')
+    actions = ('mark_paid',)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(insurance__insurance_number=term), False
+
+    @admin.action(description="Označit vybrané splátky jako zaplacené")
+    def mark_paid(self, request, queryset):
+        updated = queryset.filter(paid_at__isnull=True).update(paid_at=timezone.now())
+        self.message_user(request, f"Zaplaceno {updated} splátek.", messages.SUCCESS)
@@ -0,0 +1,157 @@
+"""
+Anonymizace osobních údajů bývalých klientů (`manage.py anonymize_former_clients`).
+
+Bývalý klient je pojištěnec, který má alespoň jedno pojištění a všechna jeho pojištění
+skončila (end_date) před více než GDPR_RETENTION_YEARS lety. Pojištění bez end_date
+se považuje za trvající. Přeskočí se pojištěnci s nevyplaceným schváleným plněním
+a pojištěnci označení ke smazání.
+
+Pojištěnci se procházejí po blocích podle id přes částečný index nad dosud
+neanonymizovanými (anonymized_at IS NULL). Podmínky na konec pojištění jsou
+NOT EXISTS nad indexem (insured_person, end_date), tedy jeden skok do indexu na
+pojištěnce. Každý blok je krátká transakce s jedním bulk_update pojištěnců, jedním
+bulk_update jejich uživatelských účtů a přepisem jejich historie změn (AuditLog).
+
+Unikátní sloupce zůstávají splnitelné: e-mail dostane tvar anonymized-<id>@example.invalid,
+rodné číslo a číslo účtu se vymažou (NULL, resp. prázdný řetězec), uživatelské jméno
+účtu anonymized-<id>. Z data narození zůstane jen rok kvůli statistikám, IČO se
+nemění (veřejný údaj z obchodního rejstříku).
+
+Anonymizovaní pojištěnci z indexu vypadnou, přerušený běh proto stačí spustit znovu.
+S --after lze pokračovat od id vypsaného při přerušení a neprocházet znovu začátek.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import audit, search_cache
+from .models import AuditLog, Event, Insurance, InsuredPerson
+from .paginators import count_cache_key
+
+
+BATCH_SIZE = 1000
+ANONYMIZED_NAME = 'Anonymizováno'
+SCRUBBED = '***'
+
+# Pole pojištěnce, jejichž hodnoty se přepíší i v historii změn
+PERSONAL_FIELDS = (
+    'name', 'surname', 'email', 'date_of_birth', 'telephone_number', 'address',
+    'birth_certificate_number', 'bank_account', 'user_id',
+)
+
+
+def retention_cutoff(years=None, today=None):
+    years = settings.GDPR_RETENTION_YEARS if years is None else years
+    today = today or timezone.localdate()
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:  # 29. 2.
+        return today.replace(year=today.year - years, day=28)
+
+
+def eligible(queryset, cutoff):
+    """
+    Z querysetu pojištěnců jen bývalé klienty, jejichž pojištění skončila před cutoff.
+    """
+    insurances = Insurance.objects.filter(insured_person=OuterRef('pk'))
+    pending_payouts = Event.objects.filter(
+        insurance__insured_person=OuterRef('pk'), is_approved=True, paid_at__isnull=True, payment_amount__gt=0,
+    )
+    return (
+        queryset.filter(anonymized_at__isnull=True, deletion_requested_at__isnull=True)
+        .filter(Exists(insurances))
+        .exclude(Exists(insurances.filter(Q(end_date__isnull=True) | Q(end_date__gte=cutoff))))
+        .exclude(Exists(pending_payouts))
+    )
+
+
+def _scrub_history(person_ids):
+    entries = list(AuditLog.objects.filter(entity='insuredperson', entity_id__in=person_ids))
+    for entry in entries:
+        entry.changes = {
+            field: [SCRUBBED if value not in (None, '') else value for value in values] if field in PERSONAL_FIELDS else values
+            for field, values in entry.changes.items()
+        }
+    AuditLog.objects.bulk_update(entries, ['changes'], batch_size=BATCH_SIZE)
+
+
+def anonymize_persons(person_ids, now=None):
+    """
+    Anonymizuje pojištěnce s danými id (jedna transakce). Vrací počet anonymizovaných.
+    """
+    now = now or timezone.now()
+    with audit.buffered(), transaction.atomic():
+        persons = list(
+            InsuredPerson.objects.select_for_update()
+            .filter(pk__in=person_ids, anonymized_at__isnull=True)
+            .only('pk', 'date_of_birth', 'user')
+        )
+        user_ids = [person.user_id for person in persons if person.user_id]
+        for person in persons:
+            person.name = ANONYMIZED_NAME
+            person.surname = ANONYMIZED_NAME
+            person.email = f'anonymized-{person.pk}@example.invalid'
+            person.date_of_birth = person.date_of_birth and person.date_of_birth.replace(month=1, day=1)
+            person.telephone_number = None
+            person.address = None
+            person.birth_certificate_number = None
+            person.bank_account = ''
+            person.user_id = None
+            person.anonymized_at = now
+        InsuredPerson.objects.bulk_update(persons, [*(field.replace('user_id', 'user') for field in PERSONAL_FIELDS), 'anonymized_at'])
+
+        # Účet se neodstraňuje (může být autorem záznamů historie), jen se odpojí a zneplatní.
+        # Účty zaměstnanců zůstávají, jen se odpojí od pojištěnce.
+        users = list(User.objects.filter(pk__in=user_ids, is_staff=False).only('pk'))
+        for user in users:
+            user.username = f'anonymized-{user.pk}'
+            user.email = ''
+            user.first_name = ''
+            user.last_name = ''
+            user.is_active = False
+            user.set_unusable_password()
+        User.objects.bulk_update(users, ['username', 'email', 'first_name', 'last_name', 'is_active', 'password'])
+
+        anonymized_ids = [person.pk for person in persons]
+        _scrub_history(anonymized_ids)
+        for pk in anonymized_ids:
+            audit.record('insuredperson', pk, AuditLog.ACTION_UPDATE, {'anonymized_at': [None, now.isoformat()]})
+    return len(persons)
+
+
+def anonymize_former_clients(years=None, batch_size=BATCH_SIZE, after=0, dry_run=False, pause=0.0, progress=None):
+    """
+    Projde dosud neanonymizované pojištěnce s id větším než `after` a anonymizuje bývalé
+    klienty. progress(poslední id, prošlo, anonymizováno) se volá po každém bloku.
+    Vrací (prošlo, anonymizováno).
+    """
+    cutoff = retention_cutoff(years)
+    candidates = InsuredPerson.objects.filter(anonymized_at__isnull=True)
+    scanned = anonymized = 0
+    last_id = after
+    while True:
+        ids = list(candidates.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        scanned += len(ids)
+        eligible_ids = list(eligible(InsuredPerson.objects.filter(pk__in=ids), cutoff).values_list('pk', flat=True))
+        if dry_run:
+            anonymized += len(eligible_ids)
+        elif eligible_ids:
+            anonymized += anonymize_persons(eligible_ids)
+        if progress:
+            progress(last_id, scanned, anonymized)
+        if pause:
+            time.sleep(pause)  # mezi bloky se dostanou k databázi i požadavky
+
+    if anonymized and not dry_run:
+        cache.delete(count_cache_key('insured_person_list'))
+        search_cache.invalidate('insured_person')
+        search_cache.invalidate('user')
+    return scanned, anonymized
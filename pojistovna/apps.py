@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class PojistovnaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pojistovna'
+
+    def ready(self):
+        import os
+        from django.conf import settings
+        from . import audit, catalogue, metrics, paginators, search_cache
+        audit.connect_signals()
+        catalogue.connect_signals()
+        paginators.connect_signals()
+        search_cache.connect_signals()
+        # Nahrávané soubory (attachments.HashingUploadHandler), kontrola files.E001 vyžaduje existující adresář
+        os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+        if settings.METRICS_ENABLED:
+            metrics.install_template_timing()
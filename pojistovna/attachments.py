@@ -0,0 +1,304 @@
+"""
+Přílohy událostí (fotky a PDF).
+
+Nahrávání: HashingUploadHandler (FILE_UPLOAD_HANDLERS) zapisuje každý nahrávaný soubor
+po blocích do dočasného souboru v ATTACHMENT_ROOT/tmp a zároveň počítá SHA-256,
+soubor tak není nikdy celý v paměti a hash nevyžaduje druhé čtení. Uložení je pak
+jen přejmenování do ATTACHMENT_ROOT/objects/ab/<sha256>. Soubor se stejným obsahem
+už na disku je a nový se zahodí.
+
+Náhledy obrázků se generují po commitu v procesech ProcessPoolExecutor (thumbnails.py),
+požadavek na ně nečeká. Dokud náhled není, šablona zobrazí ikonu. PDF náhled nemá,
+prohlížeč ho zobrazí sám (stahování podporuje Range).
+
+Stahování jde přes FileResponse, pod gunicornem tedy sendfile. Hlavička Range
+(jeden rozsah) vrací 206 s částí souboru. Soubory se nemění (adresa podle obsahu),
+ETag je hash a prohlížeč je může cachovat.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import content_disposition_header
+
+
+logger = logging.getLogger(__name__)
+
+# (začátek souboru, typ) - typ se určuje z obsahu, hlavičce od prohlížeče se nevěří
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+)
+HEADER_SIZE = 16
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ORPHAN_MIN_AGE = 3600  # soubory mladší než hodina mohou patřit právě ukládané příloze
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Jako TemporaryFileUploadHandler (vše na disk, nic v paměti), navíc počítá SHA-256
+    a výsledný soubor má atribut sha256.
+    """
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+def blob_path(sha256):
+    return os.path.join(settings.ATTACHMENT_ROOT, 'objects', sha256[:2], sha256)
+
+
+def thumbnail_path(sha256):
+    return os.path.join(settings.ATTACHMENT_ROOT, 'thumbs', sha256[:2], f'{sha256}.jpg')
+
+
+def sniff_content_type(uploaded):
+    """
+    Typ souboru podle prvních bajtů, None = nepovolený typ.
+    """
+    uploaded.seek(0)
+    header = uploaded.read(HEADER_SIZE)
+    uploaded.seek(0)
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, content_type in SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    return None
+
+
+def _sha256(uploaded):
+    sha256 = getattr(uploaded, 'sha256', None)
+    if sha256 is None:  # soubor nenahraný přes HashingUploadHandler
+        digest = hashlib.sha256()
+        for chunk in uploaded.chunks():
+            digest.update(chunk)
+        sha256 = digest.hexdigest()
+    return sha256
+
+
+def store(uploaded):
+    """
+    Uloží nahraný soubor pod jeho hashem, vrací hash.
+    """
+    sha256 = _sha256(uploaded)
+    path = blob_path(sha256)
+    if os.path.exists(path):
+        os.utime(path)  # úklid sirotků pozná, že se soubor znovu používá
+        return sha256
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if hasattr(uploaded, 'temporary_file_path'):
+        # Dočasný soubor je ve stejném adresářovém stromu, přesun je jen přejmenování
+        file_move_safe(uploaded.temporary_file_path(), path, allow_overwrite=True)
+    else:
+        partial = f'{path}.{os.getpid()}.{threading.get_ident()}.partial'
+        with open(partial, 'wb') as f:
+            for chunk in uploaded.chunks():
+                f.write(chunk)
+        os.replace(partial, path)
+    return sha256
+
+
+def attach(event, files, user=None):
+    """
+    Uloží soubory (prošlé validací formuláře) jako přílohy události. Soubor, který už
+    u události je, se přeskočí. Vrací seznam nových příloh.
+    """
+    from .models import EventAttachment
+
+    created = []
+    for uploaded in files:
+        content_type = sniff_content_type(uploaded)
+        sha256 = store(uploaded)
+        try:
+            with transaction.atomic():
+                created.append(EventAttachment.objects.create(
+                    event=event, sha256=sha256, size=uploaded.size, content_type=content_type,
+                    original_name=os.path.basename(uploaded.name)[:255], uploaded_by=user,
+                ))
+        except IntegrityError:
+            continue
+    images = [attachment.sha256 for attachment in created if attachment.is_image]
+    if images:
+        transaction.on_commit(lambda: submit_thumbnails(images))
+    return created
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def thumbnail_pool():
+    """
+    Pool procesů pro náhledy, v každém procesu aplikace jeden, vytvoří se při prvním použití.
+    Metoda spawn: fork vícevláknového procesu se spojeními do databáze není bezpečný.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS, mp_context=get_context('spawn'))
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.warning("Náhled přílohy se nepodařilo vytvořit", exc_info=future.exception())
+
+
+def submit_thumbnails(sha256s):
+    """
+    Zařadí vytvoření chybějících náhledů, nečeká na ně. Vrací seznam futures.
+    """
+    from .thumbnails import make_thumbnail  # Pillow se načte až při prvním náhledu
+
+    futures = []
+    for sha256 in sha256s:
+        if os.path.exists(thumbnail_path(sha256)):
+            continue
+        try:
+            future = thumbnail_pool().submit(make_thumbnail, blob_path(sha256), thumbnail_path(sha256))
+        except BrokenProcessPool:
+            # Po pádu procesu (např. OOM) pool další úlohy nepřijme, založí se nový
+            _discard_pool()
+            future = thumbnail_pool().submit(make_thumbnail, blob_path(sha256), thumbnail_path(sha256))
+        future.add_done_callback(_log_failure)
+        futures.append(future)
+    return futures
+
+
+def orphaned_blobs(min_age=ORPHAN_MIN_AGE):
+    """
+    Soubory (a jejich náhledy), na které neodkazuje žádná příloha. Odkazy se načítají
+    po adresářích podle prvních dvou znaků hashe, v paměti je jen jeden adresář.
+    """
+    from .models import EventAttachment
+
+    objects_dir = os.path.join(settings.ATTACHMENT_ROOT, 'objects')
+    if not os.path.isdir(objects_dir):
+        return
+    threshold = time.time() - min_age
+    for prefix in sorted(os.listdir(objects_dir)):
+        directory = os.path.join(objects_dir, prefix)
+        # Rozsah místo LIKE, aby dotaz použil index nad sha256 i na PostgreSQL ('g' je za 'f')
+        referenced = set(
+            EventAttachment.objects.filter(sha256__gte=prefix, sha256__lt=prefix + 'g').values_list('sha256', flat=True)
+        )
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name not in referenced and os.path.getmtime(path) < threshold:
+                yield name, path
+
+
+def remove_blob(sha256):
+    for path in (blob_path(sha256), thumbnail_path(sha256)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class _FileRange:
+    """
+    Část otevřeného souboru pro FileResponse. read() nevrátí víc než `length` bajtů,
+    fileno() zůstává, takže gunicorn pošle rozsah přes sendfile od aktuální pozice.
+    """
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (začátek, konec včetně) z hlavičky Range, None = celý soubor, ValueError = nesplnitelný rozsah.
+    Více rozsahů najednou se nepodporuje, vrací se celý soubor.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:  # posledních N bajtů
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def file_response(request, path, content_type, filename, etag, as_attachment=False):
+    """
+    Odpověď se souborem s podporou Range, If-Range a If-None-Match.
+    """
+    quoted_etag = f'"{etag}"'
+    if quoted_etag in request.headers.get('If-None-Match', ''):
+        return HttpResponseNotModified(headers={'ETag': quoted_etag})
+
+    file = open(path, 'rb')
+    size = os.fstat(file.fileno()).st_size
+    byte_range = None
+    if request.headers.get('If-Range', quoted_etag) == quoted_etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            file.close()
+            return HttpResponse(status=416, headers={'Content-Range': f'bytes */{size}'})
+
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        response = FileResponse(_FileRange(file, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = quoted_etag
+    # Obsah pod daným hashem se nikdy nemění, ale je neveřejný
+    response['Cache-Control'] = 'private, max-age=86400, immutable'
+    return response
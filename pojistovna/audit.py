@@ -0,0 +1,175 @@
+"""
+Audit log změn pojištěnců, pojištění a událostí.
+
+Rozdíly polí se zjišťují v signálech (post_init si zapamatuje původní hodnoty,
+post_save je porovná) a neukládají se hned. Záznamy se sbírají do bufferu
+a zapíšou se jedním bulk_create:
+  - na konci HTTP požadavku (AuditMiddleware),
+  - na konci bloku `with audit.buffered():` (management příkazy, dávkové operace).
+Změny provedené uvnitř transakce se do bufferu dostanou až po jejím commitu,
+takže rollback po sobě nenechá v historii nic.
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+
+from .models import AuditLog, InsuredPerson, Insurance, Event
+
+
+# Sledovaná pole pro každý model (attname, tj. u FK včetně _id)
+TRACKED_FIELDS = {
+    InsuredPerson: (
+        'name', 'surname', 'email', 'date_of_birth', 'telephone_number', 'address',
+        'birth_certificate_number', 'company_registration_number', 'bank_account', 'user_id',
+    ),
+    Insurance: (
+        'insurance_type_id', 'insurance_subject', 'insurance_price', 'end_date', 'is_active', 'auto_renew',
+    ),
+    Event: (
+        'description', 'damage_amount', 'payment_amount', 'is_approved',
+    ),
+}
+
+_local = threading.local()
+
+
+class _Scope:
+    def __init__(self, request=None, user=None):
+        self.request = request
+        self.user = user
+        self.entries = []
+
+    def user_id(self):
+        if self.user is not None:
+            return self.user.pk
+        if self.request is not None:
+            user = getattr(self.request, 'user', None)
+            if user is not None and user.is_authenticated:
+                return user.pk
+        return None
+
+
+def _to_json(value):
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _snapshot(instance, fields):
+    # Čte se z __dict__, aby odložená pole (only()/defer()) nevyvolala další dotaz
+    data = instance.__dict__
+    return {field: data[field] for field in fields if field in data}
+
+
+def _store(entry):
+    scope = getattr(_local, 'scope', None)
+    if scope is None:
+        AuditLog.objects.bulk_create([entry])
+    else:
+        scope.entries.append(entry)
+
+
+def _enqueue(entry):
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(_store, entry))
+    else:
+        _store(entry)
+
+
+def record(entity, entity_id, action, changes, user=None):
+    """
+    Zařadí záznam do bufferu. Použít u hromadných operací (update(), bulk_create()),
+    které signály post_save nevyvolávají.
+    """
+    scope = getattr(_local, 'scope', None)
+    if user is not None:
+        changed_by_id = user.pk
+    else:
+        changed_by_id = scope.user_id() if scope is not None else None
+    _enqueue(AuditLog(
+        entity=entity,
+        entity_id=entity_id,
+        action=action,
+        changes=changes,
+        changed_by_id=changed_by_id,
+    ))
+
+
+def flush(entries):
+    if entries:
+        AuditLog.objects.bulk_create(entries, batch_size=500)
+
+
+@contextmanager
+def buffered(request=None, user=None):
+    """
+    Všechny záznamy vzniklé uvnitř bloku zapíše najednou při jeho ukončení.
+    """
+    parent = getattr(_local, 'scope', None)
+    scope = _Scope(request=request, user=user)
+    _local.scope = scope
+    try:
+        yield scope
+    finally:
+        _local.scope = parent
+        if parent is not None:
+            parent.entries.extend(scope.entries)
+        else:
+            flush(scope.entries)
+
+
+def _remember_state(sender, instance, **kwargs):
+    instance._audit_snapshot = _snapshot(instance, TRACKED_FIELDS[sender])
+
+
+def _record_changes(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    fields = TRACKED_FIELDS[sender]
+    current = _snapshot(instance, fields)
+
+    if created:
+        changes = {
+            field: [None, _to_json(value)]
+            for field, value in current.items()
+            if value is not None
+        }
+        action = AuditLog.ACTION_CREATE
+    else:
+        previous = getattr(instance, '_audit_snapshot', {})
+        changes = {
+            field: [_to_json(previous[field]), _to_json(value)]
+            for field, value in current.items()
+            if field in previous and previous[field] != value
+        }
+        action = AuditLog.ACTION_UPDATE
+
+    instance._audit_snapshot = current
+    if changes:
+        record(sender._meta.model_name, instance.pk, action, changes)
+
+
+def connect_signals():
+    for model in TRACKED_FIELDS:
+        post_init.connect(_remember_state, sender=model, dispatch_uid=f'audit_init_{model._meta.model_name}')
+        post_save.connect(_record_changes, sender=model, dispatch_uid=f'audit_save_{model._meta.model_name}')
+
+
+class AuditMiddleware:
+    """
+    Sbírá záznamy auditu během požadavku a zapíše je jedním INSERTem na jeho konci.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffered(request=request):
+            return self.get_response(request)
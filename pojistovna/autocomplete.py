@@ -0,0 +1,33 @@
+"""
+Autocomplete pro výběr pojištění (django-autocomplete-light).
+
+Modul se importuje až při prvním požadavku na autocomplete (views.insurance_autocomplete
+a AddEventForm), aby worker při startu nenačítal dal, který většina požadavků nepotřebuje.
+"""
+from dal import autocomplete
+from django.db.models import Q
+
+from .models import Insurance
+
+
+class InsuranceAutocomplete(autocomplete.Select2QuerySetView):
+    def get_queryset(self):
+        if not self.request.user.is_authenticated:
+            return Insurance.objects.none()
+
+        # Nové události jen k pojištěním, která dnes kryjí (ne vypršelým ani deaktivovaným)
+        qs = Insurance.objects.in_force().select_related('insured_person', 'insurance_type')
+
+        if self.q:
+            qs = qs.filter(
+                Q(insured_person__name__icontains=self.q) |
+                Q(insured_person__surname__icontains=self.q)
+            )
+        return qs
+
+    def get_result_label(self, result):
+        return f"{result.insured_person.name} {result.insured_person.surname} – {result.insurance_type.insurance_name} ({result.insurance_number})"
+
+
+def insurance_widget():
+    return autocomplete.ModelSelect2(url='pojistovna:insurance-autocomplete')
@@ -0,0 +1,39 @@
+"""
+Čísla českých bankovních účtů ve tvaru [předčíslí-]číslo/kód banky, např. 19-2000145399/0800.
+
+Předčíslí (až 6 číslic) i číslo (2 až 10 číslic) mají vlastní kontrolu modulo 11
+s vahami 6, 3, 7, 9, 10, 5, 8, 4, 2, 1 zprava doleva.
+"""
+import re
+
+from django.core.exceptions import ValidationError
+
+
+ACCOUNT_RE = re.compile(r'^(?:(\d{1,6})-)?(\d{2,10})/(\d{4})$')
+WEIGHTS = (6, 3, 7, 9, 10, 5, 8, 4, 2, 1)
+
+
+def _mod11_ok(digits):
+    padded = digits.zfill(len(WEIGHTS))
+    return sum(int(digit) * weight for digit, weight in zip(padded, WEIGHTS)) % 11 == 0
+
+
+def parse_account(value):
+    """
+    (předčíslí, číslo, kód banky) jako řetězce, předčíslí '' když chybí. ValueError pro neplatný účet.
+    """
+    match = ACCOUNT_RE.match((value or '').replace(' ', ''))
+    if not match:
+        raise ValueError(value)
+    prefix, number, bank_code = match.groups()
+    prefix = prefix or ''
+    if (prefix and not _mod11_ok(prefix)) or not _mod11_ok(number) or not number.strip('0'):
+        raise ValueError(value)
+    return prefix, number, bank_code
+
+
+def validate_bank_account(value):
+    try:
+        parse_account(value)
+    except ValueError:
+        raise ValidationError("Neplatné číslo účtu, zadejte ho ve tvaru 19-2000145399/0800.")
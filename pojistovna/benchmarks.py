@@ -0,0 +1,329 @@
+"""
+Mikrobenchmarky view, formulářů a šablon (spouští `manage.py benchmark`).
+
+Sada běží nad testovací databází naplněnou deterministickými daty (seed), produkční
+data se nečtou ani nemění. Každý případ se změří `repeat`-krát (časy v ms), jednou
+s počítáním SQL dotazů (všechna spojení, tedy i replika) a jednou s tracemalloc
+(špička alokované paměti v kB).
+
+Výsledky se ukládají jako JSON baseline. Při porovnání se za zpomalení považuje
+rozdíl, který je statisticky významný (jednostranný Mann-Whitney U, p < alpha)
+a zároveň větší než `threshold` mediánu. Nárůst počtu dotazů se hlásí vždy,
+nárůst špičky alokací o víc než ALLOC_TOLERANCE (10 %) a zároveň o víc než ALLOC_MIN_KB.
+"""
+import contextlib
+import gc
+import json
+import math
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import search_cache
+from .forms import AddEventForm, InsuredPersonForm
+from .insurance_numbers import allocate_insurance_numbers
+from .models import Event, Insurance, InsuranceType, InsuredPerson
+
+
+FORMAT_VERSION = 1
+ALLOC_TOLERANCE = 0.10  # relativní nárůst špičky alokací, který se ještě nehlásí
+ALLOC_MIN_KB = 16  # a absolutní, kvůli šumu u malých případů
+
+SURNAMES = ['Novák', 'Svoboda', 'Novotný', 'Dvořák', 'Černý', 'Procházka', 'Kučera', 'Veselý', 'Horák', 'Němec']
+NAMES = ['Jan', 'Petr', 'Jana', 'Marie', 'Tomáš', 'Lucie', 'Martin', 'Eva', 'Pavel', 'Hana']
+DESCRIPTIONS = [
+    'Škoda na vozidle po nehodě na parkovišti',
+    'Vytopený byt od souseda, poškozená podlaha',
+    'Krádež jízdního kola ze sklepa',
+    'Rozbité čelní sklo kamínkem na dálnici',
+    'Požár v kuchyni, poškozená linka a strop',
+    'Úraz na lyžích, zlomená ruka',
+]
+
+
+@dataclass
+class Case:
+    name: str
+    run: object  # funkce bez argumentů, měří se jedno volání
+    before: object = None  # volá se před každým měřením, do času se nepočítá
+
+
+def seed(persons=200, insurances_per_person=2, events_per_insurance=3, random_seed=42):
+    """
+    Naplní (testovací) databázi. Vrací superuživatele, za kterého se volají view.
+    """
+    rng = random.Random(random_seed)
+    user = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+    types = InsuranceType.objects.bulk_create([
+        InsuranceType(insurance_name=name, insurance_description=f'Pojištění {name.lower()}', is_active=True)
+        for name in ['Havarijní', 'Majetek', 'Úraz', 'Odpovědnost']
+    ])
+    InsuredPerson.objects.bulk_create([
+        InsuredPerson(
+            name=rng.choice(NAMES), surname=rng.choice(SURNAMES), email=f'pojistenec{index}@example.com',
+            date_of_birth=date(1950, 1, 1) + timedelta(days=rng.randrange(20000)),
+            telephone_number=f'+420{rng.randrange(10 ** 9):09d}', address='Dlouhá 1, Praha, 11000',
+            birth_certificate_number=f'{index:010d}',
+        )
+        for index in range(persons)
+    ])
+    person_ids = list(InsuredPerson.objects.order_by('id').values_list('id', flat=True))
+    numbers = iter(allocate_insurance_numbers(len(person_ids) * insurances_per_person))
+    Insurance.objects.bulk_create([
+        Insurance(
+            insured_person_id=person_id, insurance_type=rng.choice(types), insurance_number=next(numbers),
+            insurance_subject='Předmět pojištění', insurance_price=Decimal(rng.randrange(1000, 20000)),
+        )
+        for person_id in person_ids for _ in range(insurances_per_person)
+    ])
+    now = timezone.now()
+    Event.objects.bulk_create([
+        Event(
+            insurance_id=insurance_id, description=rng.choice(DESCRIPTIONS),
+            damage_amount=Decimal(rng.randrange(500, 200000)), report_date=now - timedelta(days=rng.randrange(700)),
+            is_approved=rng.random() < 0.5, anomaly_score=rng.uniform(0, 10),
+        )
+        for insurance_id in Insurance.objects.order_by('id').values_list('id', flat=True)
+        for _ in range(events_per_insurance)
+    ], batch_size=1000)
+    return user
+
+
+def _view_case(client, name, url, params=None, before=None):
+    def run():
+        response = client.get(url, params or {})
+        if response.status_code != 200:
+            raise RuntimeError(f"{name}: {url} vrátilo {response.status_code}")
+    return Case(f'view:{name}', run, before)
+
+
+def build_cases(user):
+    """
+    Případy nad daty ze seed(): všechna GET view z views.py, validace formulářů
+    a vykreslení nejtěžších šablon (data se načtou předem, měří se jen render).
+    """
+    client = Client()
+    client.force_login(user)
+    person = InsuredPerson.objects.order_by('id').first()
+    insurance = Insurance.objects.filter(insured_person=person).order_by('id').first()
+    event = Event.objects.filter(insurance=insurance).order_by('id').first()
+
+    def clear_search(kind):
+        return lambda: search_cache.invalidate(kind)
+
+    cases = [
+        _view_case(client, 'home', reverse('pojistovna:home')),
+        _view_case(client, 'insured_person_list', reverse('pojistovna:insured_person')),
+        _view_case(client, 'insured_person_detail', reverse('pojistovna:insured_person_detail', args=[person.id])),
+        _view_case(client, 'edit_insured_person', reverse('pojistovna:edit_insured_person', args=[person.id])),
+        _view_case(client, 'add_insured_person', reverse('pojistovna:insured_person_form')),
+        _view_case(client, 'insured_person_search', reverse('pojistovna:insured_person_search'),
+                   {'surname': 'No'}, clear_search('insured_person')),
+        _view_case(client, 'insured_person_search_json', reverse('pojistovna:insured_person_search'),
+                   {'surname': 'No', 'format': 'json'}, clear_search('insured_person')),
+        _view_case(client, 'assign_insurance', reverse('pojistovna:assign_insurance', args=[person.id])),
+        _view_case(client, 'deletion_jobs', reverse('pojistovna:deletion_jobs')),
+        _view_case(client, 'insurance_list', reverse('pojistovna:insurance_list')),
+        _view_case(client, 'add_insurance', reverse('pojistovna:add_insurance')),
+        _view_case(client, 'bulk_assign_insurance', reverse('pojistovna:bulk_assign_insurance')),
+        _view_case(client, 'insurance_detail', reverse('pojistovna:insurance_detail', args=[insurance.id])),
+        _view_case(client, 'edit_insurance', reverse('pojistovna:edit_insurance', args=[insurance.id])),
+        _view_case(client, 'event_list', reverse('pojistovna:event_list')),
+        _view_case(client, 'event_detail', reverse('pojistovna:event_detail', args=[event.id])),
+        _view_case(client, 'event_search', reverse('pojistovna:event_search'), {'q': 'škoda'}),
+        _view_case(client, 'suspicious_events', reverse('pojistovna:suspicious_events')),
+        _view_case(client, 'add_event', reverse('pojistovna:add_event')),
+        _view_case(client, 'insurance_autocomplete', reverse('pojistovna:insurance-autocomplete'), {'q': 'No'}),
+        _view_case(client, 'entity_history', reverse('pojistovna:entity_history', args=['insurance', insurance.id])),
+        _view_case(client, 'users_list', reverse('pojistovna:users_list')),
+        _view_case(client, 'user_search', reverse('pojistovna:user_search'), {'surname': 'a'}, clear_search('user')),
+        _view_case(client, 'staff_and_super_list', reverse('pojistovna:staff_and_super_list')),
+    ]
+
+    person_data = {
+        'name': 'Karel', 'surname': 'Benchmark', 'date_of_birth': '1980-05-17',
+        'birth_certificate_number': '8005171234', 'address': 'Krátká 2, Brno, 60200',
+        'email': 'karel.benchmark@example.com', 'telephone_number': '+420777123456',
+        'company_registration_number': '12345678',
+    }
+    event_data = {'insurance': insurance.id, 'description': DESCRIPTIONS[0], 'damage_amount': '15000.00'}
+
+    def validate(form_class, data):
+        def run():
+            form = form_class(data)
+            if not form.is_valid():
+                raise RuntimeError(f"{form_class.__name__}: {form.errors.as_text()}")
+        return run
+
+    cases += [
+        Case('form:InsuredPersonForm', validate(InsuredPersonForm, person_data)),
+        Case('form:AddEventForm', validate(AddEventForm, event_data)),
+    ]
+
+    request = RequestFactory().get('/')
+    request.user = user
+    rows = list(
+        InsuredPerson.objects.visible().order_by('id')
+        .values('id', 'name', 'surname', 'email', 'telephone_number', 'user')[:10]
+    )
+    events = list(
+        Event.objects.visible().select_related('insurance__insurance_type', 'insurance__insured_person')[:10]
+    )
+    insurances = list(
+        Insurance.objects.visible().filter(insured_person=person).select_related('insurance_type')
+    )
+
+    def render(template, context):
+        return lambda: render_to_string(f'pojistovna/{template}', context, request=request)
+
+    cases += [
+        Case('template:insured_person_table_rows', render(
+            'insured_person_table_rows.html', {'page_obj': Paginator(rows, 10).page(1)})),
+        Case('template:event_list_partial', render(
+            'event_list_partial.html', {'page_obj': Paginator(events, 10).page(1)})),
+        Case('template:insured_person_detail', render(
+            'insured_person_detail.html', {'insured_person': person, 'insurances': insurances})),
+    ]
+    return cases
+
+
+def measure(case, repeat=20, warmup=2):
+    for _ in range(warmup):
+        if case.before:
+            case.before()
+        case.run()
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()  # sběr garbage by přidával náhodné špičky do jednotlivých měření
+    try:
+        for _ in range(repeat):
+            if case.before:
+                case.before()
+            start = time.perf_counter()
+            case.run()
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    if case.before:
+        case.before()
+    with contextlib.ExitStack() as stack:
+        captured = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+        case.run()
+    queries = sum(len(context.captured_queries) for context in captured)
+
+    if case.before:
+        case.before()
+    tracemalloc.start()
+    try:
+        case.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'samples_ms': [round(sample, 4) for sample in samples],
+        'median_ms': round(statistics.median(samples), 4),
+        'mean_ms': round(statistics.mean(samples), 4),
+        'stdev_ms': round(statistics.stdev(samples), 4) if len(samples) > 1 else 0.0,
+        'queries': queries,
+        'alloc_peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_suite(cases, repeat=20, warmup=2, progress=None):
+    results = {}
+    for case in cases:
+        results[case.name] = measure(case, repeat=repeat, warmup=warmup)
+        if progress:
+            progress(case.name, results[case.name])
+    return {
+        'format': FORMAT_VERSION,
+        'created_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.node(),
+        'repeat': repeat,
+        'cases': results,
+    }
+
+
+def save_baseline(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Nepodporovaný formát baseline {data.get('format')!r}.")
+    return data
+
+
+def mann_whitney_greater(current, baseline):
+    """
+    Jednostranná p-hodnota hypotézy, že `current` je větší než `baseline`
+    (Mann-Whitney U, normální aproximace s korekcí na shody).
+    """
+    n1, n2 = len(current), len(baseline)
+    if not n1 or not n2:
+        return 1.0
+    combined = sorted([(value, 0) for value in current] + [(value, 1) for value in baseline])
+    ranks = [0.0] * len(combined)
+    ties = 0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        size = j - i + 1
+        ties += size ** 3 - size
+        i = j + 1
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)  # 0.5 = korekce na spojitost
+    return 1 - statistics.NormalDist().cdf(z)
+
+
+def compare(baseline, current, alpha=0.01, threshold=0.10):
+    """
+    Vrací seznam (případ, popis) zhoršení oproti baseline. Případy, které
+    v baseline nejsou, se přeskočí.
+    """
+    regressions = []
+    for name, result in current['cases'].items():
+        old = baseline['cases'].get(name)
+        if old is None:
+            continue
+        p_value = mann_whitney_greater(result['samples_ms'], old['samples_ms'])
+        change = result['median_ms'] / old['median_ms'] - 1 if old['median_ms'] else 0.0
+        if p_value < alpha and change > threshold:
+            regressions.append((name, f"čas {old['median_ms']:.2f} -> {result['median_ms']:.2f} ms ({change:+.0%}, p={p_value:.4f})"))
+        if result['queries'] > old['queries']:
+            regressions.append((name, f"dotazy {old['queries']} -> {result['queries']}"))
+        alloc_limit = max(old['alloc_peak_kb'] * (1 + ALLOC_TOLERANCE), old['alloc_peak_kb'] + ALLOC_MIN_KB)
+        if result['alloc_peak_kb'] > alloc_limit:
+            regressions.append((name, f"alokace {old['alloc_peak_kb']:.0f} -> {result['alloc_peak_kb']:.0f} kB"))
+    return regressions
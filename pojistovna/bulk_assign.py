@@ -0,0 +1,97 @@
+"""
+Hromadné přiřazení jednoho pojištění mnoha pojištěncům (skupinové pojištění firem).
+Používá ho view bulk_assign_insurance i příkaz `manage.py bulk_assign_insurance`.
+
+Pojištěnci nemají vazbu na zaměstnavatele, zaměstnance firmy tak nejde vybrat podle
+jejího IČO. Seznam zaměstnanců se zadává ID nebo CSV od klienta, filtry jména a příjmení
+ho mohou zúžit.
+"""
+import csv
+import io
+import re
+
+from django.db import transaction
+
+from . import audit, metrics, search_cache
+from .installments import generate_installments
+from .insurance_numbers import allocate_insurance_numbers
+from .models import AuditLog, Insurance, InsuredPerson
+
+
+BATCH_SIZE = 1000
+
+
+def parse_person_ids(text):
+    """
+    ID oddělená čárkou, středníkem, mezerou nebo novým řádkem.
+    """
+    return [int(value) for value in re.split(r'[\s,;]+', text or '') if value.isdigit()]
+
+
+def read_person_ids_csv(file):
+    """
+    ID pojištěnců z prvního sloupce CSV, řádky bez čísla (hlavička) se přeskočí.
+    """
+    if isinstance(file, io.TextIOBase):
+        reader = csv.reader(file)
+    else:
+        reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig'))
+    return [int(row[0]) for row in reader if row and row[0].strip().isdigit()]
+
+
+def select_persons(person_ids=None, name='', surname=''):
+    qs = InsuredPerson.objects.visible()
+    if person_ids:
+        qs = qs.filter(pk__in=person_ids)
+    if name:
+        qs = qs.filter(name__icontains=name)
+    if surname:
+        qs = qs.filter(surname__icontains=surname)
+    return qs
+
+
+def assign_insurance_bulk(persons, insurance_type, insurance_subject, insurance_price, skip_existing=False, batch_size=BATCH_SIZE):
+    """
+    Vytvoří pojištění všem pojištěncům z querysetu `persons` v jedné transakci, po jejím
+    potvrzení jim vygeneruje splátkové kalendáře. Vrací počet vytvořených pojištění.
+    """
+    if skip_existing:
+        persons = persons.exclude(insurances__insurance_type=insurance_type)
+    person_ids = list(persons.order_by('pk').values_list('pk', flat=True).distinct())
+    if not person_ids:
+        return 0
+
+    # Čísla se rezervují mimo transakci, aby rezervace bloků nečekala na její konec
+    numbers = allocate_insurance_numbers(len(person_ids))
+    insurance_ids = []
+    with audit.buffered(), transaction.atomic():
+        for start in range(0, len(person_ids), batch_size):
+            created = Insurance.objects.bulk_create([
+                Insurance(
+                    insured_person_id=person_id,
+                    insurance_type=insurance_type,
+                    insurance_subject=insurance_subject,
+                    insurance_price=insurance_price,
+                    insurance_number=number,
+                )
+                for person_id, number in zip(person_ids[start:start + batch_size], numbers[start:start + batch_size])
+            ])
+            insurance_ids += [insurance.pk for insurance in created]
+            # bulk_create nevolá post_save, historii zapíšeme sami
+            for insurance in created:
+                audit.record('insurance', insurance.pk, AuditLog.ACTION_CREATE, {
+                    'insurance_type_id': [None, insurance_type.pk],
+                    'insurance_subject': [None, insurance_subject],
+                    'insurance_price': [None, str(insurance_price)],
+                    'insurance_number': [None, insurance.insurance_number],
+                })
+
+    # Po blocích, ať seznam id nepřekročí limit parametrů SQLite. Nová pojištění splátky
+    # nemají, missing_only je jen vloží a nemaže po dlouhém seznamu id.
+    for start in range(0, len(insurance_ids), batch_size):
+        generate_installments(missing_only=True, insurance_ids=insurance_ids[start:start + batch_size])
+
+    # bulk_create neposílá post_save, počty pojištění ve vyhledávání zneplatníme sami
+    search_cache.invalidate('insured_person')
+    metrics.inc('pojistovna_policies_assigned_total', len(person_ids))
+    return len(person_ids)
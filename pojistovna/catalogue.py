@@ -0,0 +1,37 @@
+"""
+Katalog aktivních typů pojištění. Mění se zřídka a čte ho každé přiřazení pojištění,
+proto se drží v cache (INSURANCE_CATALOGUE_TTL). Při uložení/smazání typu pojištění
+se zahodí, s LocMemCache ale jen v procesu, který změnu provedl - ostatní workery
+uvidí změnu nejpozději po uplynutí TTL.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from . import metrics
+from .models import InsuranceType
+
+
+CACHE_KEY = 'insurance_catalogue'
+
+
+def active_insurance_types():
+    types = cache.get(CACHE_KEY)
+    metrics.cache_access('insurance_catalogue', types is not None)
+    if types is None:
+        types = list(InsuranceType.objects.filter(is_active=True))
+        cache.set(CACHE_KEY, types, settings.INSURANCE_CATALOGUE_TTL)
+    return types
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
+
+
+def _invalidate(sender, **kwargs):
+    invalidate()
+
+
+def connect_signals():
+    post_save.connect(_invalidate, sender=InsuranceType, dispatch_uid='catalogue_save')
+    post_delete.connect(_invalidate, sender=InsuranceType, dispatch_uid='catalogue_delete')
@@ -0,0 +1,139 @@
+"""
+Fulltextové hledání v popisech pojistných událostí.
+
+SQLite: virtuální tabulka FTS5 pojistovna_event_fts nad sloupcem description
+(external content, bez kopie textu), tokenizer unicode61 s remove_diacritics 2,
+takže "skoda" najde i "škoda". Index udržují triggery na pojistovna_event, platí
+tedy i pro bulk_create (intake.py) a mazání po částech (deletion.py).
+Řazení podle BM25, zvýraznění přes snippet().
+
+PostgreSQL: GIN index nad to_tsvector('simple', description), řazení ts_rank_cd,
+zvýraznění ts_headline. Bez rozšíření unaccent se diakritika neskládá.
+
+Dotaz: slova se hledají všechna (AND), "fráze v uvozovkách" jako fráze,
+slovo* jako prefix. Tabulka, triggery i GIN index vznikají v migraci 0018.
+"""
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Event, Insurance, InsuredPerson
+
+
+FTS_TABLE = 'pojistovna_event_fts'
+SNIPPET_TOKENS = 16
+# Značky zvýraznění z databáze, v textu popisu se nevyskytují, HTML se escapuje až v Pythonu
+MARK_START, MARK_END = '\x02', '\x03'
+
+_PART_RE = re.compile(r'"([^"]*)"?|(\S+)')
+_WORD_RE = re.compile(r'\w+')
+
+
+def parse_query(query):
+    """
+    Dotaz -> [(slova, prefix)]. Fráze dává víc slov, prefix platí pro poslední slovo.
+    Interpunkce se zahodí, uživatel tak nemůže poslat syntaxi FTS přímo.
+    """
+    parts = []
+    for match in _PART_RE.finditer(query or ''):
+        phrase, term = match.groups()
+        text = phrase if phrase is not None else term
+        words = _WORD_RE.findall(text)
+        if words:
+            parts.append((words, phrase is None and term.endswith('*')))
+    return parts
+
+
+def _sqlite_match(parts):
+    return ' '.join('"' + ' '.join(words) + '"' + ('*' if prefix else '') for words, prefix in parts)
+
+
+def _postgres_tsquery(parts):
+    return ' & '.join(
+        '(' + ' <-> '.join(words[:-1] + [words[-1] + (':*' if prefix else '')]) + ')' for words, prefix in parts
+    )
+
+
+def _search_sql(insurance_type_id, approved):
+    event, insurance, person = Event._meta.db_table, Insurance._meta.db_table, InsuredPerson._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = (
+            f"SELECT e.id, ts_headline('simple', e.description, q, %s) FROM {event} e "
+            f"CROSS JOIN to_tsquery('simple', %s) q "
+            f"JOIN {insurance} i ON i.id = e.insurance_id JOIN {person} p ON p.id = i.insured_person_id "
+            f"WHERE to_tsvector('simple', e.description) @@ q"
+        )
+        order = "ts_rank_cd(to_tsvector('simple', e.description), q) DESC, e.id DESC"
+    else:
+        sql = (
+            f"SELECT e.id, snippet({FTS_TABLE}, 0, %s, %s, '…', %s) FROM {FTS_TABLE} f "
+            f"JOIN {event} e ON e.id = f.rowid "
+            f"JOIN {insurance} i ON i.id = e.insurance_id JOIN {person} p ON p.id = i.insured_person_id "
+            f"WHERE {FTS_TABLE} MATCH %s"
+        )
+        order = "f.rank, e.id DESC"  # rank = bm25(), menší je lepší
+    sql += " AND i.deletion_requested_at IS NULL AND p.deletion_requested_at IS NULL"
+    if insurance_type_id is not None:
+        sql += " AND i.insurance_type_id = %s"
+    if approved is not None:
+        sql += " AND e.is_approved = %s"
+    return f"{sql} ORDER BY {order} LIMIT %s OFFSET %s"
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+class ClaimSearchResults:
+    """
+    Výsledky hledání pro LazyPaginator: řez [od:do] pošle jeden dotaz s LIMIT/OFFSET
+    a vrátí události (se select_related) s atributem search_snippet.
+    """
+    def __init__(self, query, insurance_type_id=None, approved=None):
+        self.parts = parse_query(query)
+        self.insurance_type_id = insurance_type_id
+        self.approved = approved
+
+    def __bool__(self):
+        return bool(self.parts)
+
+    def _params(self):
+        if connection.vendor == 'postgresql':
+            options = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxFragments=1, MaxWords={SNIPPET_TOKENS}, MinWords=5'
+            params = [options, _postgres_tsquery(self.parts)]
+        else:
+            params = [MARK_START, MARK_END, SNIPPET_TOKENS, _sqlite_match(self.parts)]
+        if self.insurance_type_id is not None:
+            params.append(self.insurance_type_id)
+        if self.approved is not None:
+            params.append(self.approved)
+        return params
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError("ClaimSearchResults podporuje jen řez [od:do].")
+        start, stop = key.start or 0, key.stop
+        if not self.parts or stop is not None and stop <= start:
+            return []
+        limit = -1 if stop is None else stop - start  # -1 = bez omezení (SQLite)
+        if limit < 0 and connection.vendor == 'postgresql':
+            limit = None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                _search_sql(self.insurance_type_id, self.approved),
+                self._params() + [limit, start],
+            )
+            rows = cursor.fetchall()
+
+        events = Event.objects.select_related('insurance__insurance_type', 'insurance__insured_person').in_bulk(
+            [event_id for event_id, _ in rows]
+        )
+        results = []
+        for event_id, snippet in rows:
+            event = events.get(event_id)
+            if event is not None:  # mezitím smazaná
+                event.search_snippet = highlight(snippet)
+                results.append(event)
+        return results
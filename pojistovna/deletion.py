@@ -0,0 +1,116 @@
+"""
+Mazání pojištěnců a pojištění po částech na pozadí.
+
+Smazání pojištěnce s tisíci událostmi jedním delete() drží zámek databáze po celou
+dobu kaskády (u SQLite zápisový zámek celé databáze) a požadavek čeká na dokončení.
+Proto se záznam jen označí (deletion_requested_at, okamžitě zmizí ze seznamů, viz
+.visible()) a vznikne DeletionJob. Worker (`manage.py process_deletions`) pak maže
+události a pojištění po blocích, každý blok ve vlastní krátké transakci, a průběžně
+ukládá počet smazaných řádků. Přerušenou úlohu lze spustit znovu (--retry), smazané
+bloky se neopakují.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import audit, search_cache
+from .models import AuditLog, DeletionJob, Event, Insurance, InsuredPerson
+from .paginators import count_cache_key
+
+
+MODELS = {model._meta.model_name: model for model in (InsuredPerson, Insurance)}
+OPEN_STATUSES = [DeletionJob.STATUS_PENDING, DeletionJob.STATUS_RUNNING]
+
+
+def _insurances(job):
+    if job.entity == 'insurance':
+        return Insurance.objects.filter(pk=job.entity_id)
+    return Insurance.objects.filter(insured_person_id=job.entity_id)
+
+
+def _events(job):
+    if job.entity == 'insurance':
+        return Event.objects.filter(insurance_id=job.entity_id)
+    return Event.objects.filter(insurance__insured_person_id=job.entity_id)
+
+
+def _invalidate_lists():
+    # Označený záznam musí ze seznamů zmizet hned, ne až po smazání
+    cache.delete(count_cache_key('insured_person_list'))
+    search_cache.invalidate('insured_person')
+    search_cache.invalidate('user')
+
+
+def request_deletion(obj, user=None):
+    """
+    Označí pojištěnce nebo pojištění ke smazání a vrátí DeletionJob (případně už
+    existující nedokončenou úlohu).
+    """
+    model = type(obj)
+    entity = model._meta.model_name
+    with transaction.atomic():
+        job = DeletionJob.objects.filter(entity=entity, entity_id=obj.pk, status__in=OPEN_STATUSES).first()
+        if job is not None:
+            return job
+        now = timezone.now()
+        model.objects.filter(pk=obj.pk).update(deletion_requested_at=now)
+        job = DeletionJob(entity=entity, entity_id=obj.pk, label=str(obj)[:255], requested_by=user)
+        job.total = _events(job).count() + _insurances(job).count() + (entity == 'insuredperson')
+        job.save()
+        audit.record(entity, obj.pk, AuditLog.ACTION_UPDATE,
+                     {'deletion_requested_at': [None, now.isoformat()]}, user=user)
+    _invalidate_lists()
+    return job
+
+
+def _delete_in_batches(queryset, job, batch_size, pause, progress):
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            # Do průběhu se počítají jen řádky mazaného modelu, ne kaskáda (splátky, přílohy)
+            deleted = queryset.model.objects.filter(pk__in=ids).delete()[1].get(queryset.model._meta.label, 0)
+            DeletionJob.objects.filter(pk=job.pk).update(deleted=F('deleted') + deleted)
+        job.deleted += deleted
+        if progress is not None:
+            progress(job)
+        if pause:
+            time.sleep(pause)  # mezi bloky se dostanou k databázi i požadavky
+
+
+def run_job(job, batch_size=None, pause=0.0, progress=None):
+    """
+    Provede úlohu. Vrací False, pokud ji mezitím převzal jiný worker.
+    """
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    claimed = DeletionJob.objects.filter(pk=job.pk, status=DeletionJob.STATUS_PENDING).update(
+        status=DeletionJob.STATUS_RUNNING, started_at=timezone.now(), error='',
+    )
+    if not claimed:
+        return False
+    job.refresh_from_db()
+
+    try:
+        _delete_in_batches(_events(job), job, batch_size, pause, progress)
+        _delete_in_batches(_insurances(job), job, batch_size, pause, progress)
+        if job.entity == 'insuredperson':
+            _delete_in_batches(InsuredPerson.objects.filter(pk=job.entity_id), job, batch_size, 0, progress)
+    except Exception as exc:
+        DeletionJob.objects.filter(pk=job.pk).update(
+            status=DeletionJob.STATUS_FAILED, error=str(exc)[:2000], finished_at=timezone.now(),
+        )
+        raise
+
+    DeletionJob.objects.filter(pk=job.pk).update(status=DeletionJob.STATUS_DONE, finished_at=timezone.now())
+    job.status = DeletionJob.STATUS_DONE
+    _invalidate_lists()
+    return True
+
+
+def pending_jobs():
+    return DeletionJob.objects.filter(status=DeletionJob.STATUS_PENDING).order_by('created_at')
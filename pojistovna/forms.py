@@ -1,8 +1,12 @@
+import datetime
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .attachments import sniff_content_type
 from .models import InsuredPerson, InsuranceType, Event, Insurance
-from dal import autocomplete
 
 
 class InsuredPersonForm(forms.ModelForm):
@@ -17,6 +21,7 @@ class InsuredPersonForm(forms.ModelForm):
             'email',
             'telephone_number',
             'company_registration_number',  # Pro podnikatele
+            'bank_account',
         ]
         labels = {    
             'name': 'Jméno',
@@ -27,11 +32,13 @@ class InsuredPersonForm(forms.ModelForm):
             'address': 'Adresa',
             'email': 'E-mail',             
             'company_registration_number': 'IČO (pro podnikatele)',                    
+            'bank_account': 'Číslo účtu pro výplatu plnění',
         }
         widgets = {
             'date_of_birth': forms.DateInput(attrs={'type': 'date'}),
             'telephone_number': forms.TextInput(attrs={'placeholder': '+420123456789'}),
             'address': forms.TextInput(attrs={'placeholder': 'Ulice, Město, PSČ'}),
+            'bank_account': forms.TextInput(attrs={'placeholder': '19-2000145399/0800'}),
         }
     
     def clean_email(self):
@@ -126,20 +133,53 @@ class AddInsuranceTypeForm(forms.ModelForm):
 class InsuranceForm(forms.ModelForm):
     class Meta:
         model = Insurance
-        fields = ['insurance_type', 'insurance_subject', 'insurance_price', 'is_active']
+        fields = ['insurance_type', 'insurance_subject', 'insurance_price', 'payment_frequency', 'end_date', 'auto_renew', 'is_active']
         labels = {
             'insurance_type': 'Typ pojištění',
             'insurance_subject': 'Předmět pojištění',
             'insurance_price': 'Cena pojištění',            
+            'payment_frequency': 'Splátky',
+            'end_date': 'Datum ukončení',
+            'auto_renew': 'Automaticky obnovit',
             'is_active': 'Aktivní',
         }
         widgets = {
             'insurance_subject': forms.TextInput(attrs={'placeholder': 'Např. automobil, dům...'}),
             'insurance_price': forms.NumberInput(attrs={'step': 1, 'min': 0}),
+            'end_date': forms.DateInput(attrs={'type': 'date'}, format='%Y-%m-%d'),
         }
 
 
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class AttachmentsField(forms.FileField):
+    """
+    Více souborů najednou. Povolené jsou fotky a PDF do ATTACHMENT_MAX_SIZE, typ se určuje z obsahu.
+    """
+    widget = MultipleFileInput(attrs={'accept': 'image/jpeg,image/png,image/gif,image/webp,application/pdf'})
+
+    def clean(self, data, initial=None):
+        files = data if isinstance(data, (list, tuple)) else [data] if data else []
+        if self.required and not files:
+            raise forms.ValidationError(self.error_messages['required'], code='required')
+        for file in files:
+            super().clean(file, initial)
+            if file.size > settings.ATTACHMENT_MAX_SIZE:
+                raise forms.ValidationError(f"Soubor {file.name} je větší než {settings.ATTACHMENT_MAX_SIZE // 2**20} MB.")
+            if sniff_content_type(file) is None:
+                raise forms.ValidationError(f"Soubor {file.name} není obrázek (JPEG, PNG, GIF, WebP) ani PDF.")
+        return files
+
+
+class EventAttachmentForm(forms.Form):
+    attachments = AttachmentsField(label='Přílohy (fotky, PDF)')
+
+
 class AddEventForm(forms.ModelForm):
+    attachments = AttachmentsField(required=False, label='Přílohy (fotky, PDF)')
+
     class Meta:
         model = Event
         fields = ['insurance', 'description', 'damage_amount']
@@ -149,10 +189,19 @@ class AddEventForm(forms.ModelForm):
             'damage_amount': 'Výše škody (Kč)',
         }
         widgets = {
-           'insurance': autocomplete.ModelSelect2(url='pojistovna:insurance-autocomplete'),
            'description': forms.Textarea(attrs={'rows': 3}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Widget z dal se vytváří až tady, modul forms tak dal při importu nenačítá
+        from .autocomplete import insurance_widget
+        field = self.fields['insurance']
+        field.queryset = Insurance.objects.in_force()
+        field.widget = insurance_widget()
+        field.widget.choices = field.choices
+        field.widget.is_required = field.required
+
 
 
 class SuperUserCreateForm(forms.ModelForm):
@@ -189,3 +238,67 @@ class StaffUserCreateForm(forms.ModelForm):
         return user
     
 
+
+
+class BulkAssignInsuranceForm(forms.Form):
+    insurance_type = forms.ModelChoiceField(queryset=InsuranceType.objects.filter(is_active=True), label='Typ pojištění')
+    insurance_subject = forms.CharField(max_length=30, label='Předmět pojištění')
+    insurance_price = forms.DecimalField(max_digits=10, decimal_places=2, min_value=0, label='Cena pojištění')
+    person_ids = forms.CharField(
+        required=False,
+        label='ID pojištěnců',
+        widget=forms.Textarea(attrs={'rows': 3, 'placeholder': 'např. 12, 15, 31'}),
+    )
+    person_csv = forms.FileField(required=False, label='CSV s ID pojištěnců (první sloupec)')
+    name = forms.CharField(required=False, label='Jméno obsahuje')
+    surname = forms.CharField(required=False, label='Příjmení obsahuje')
+    skip_existing = forms.BooleanField(required=False, initial=True, label='Přeskočit pojištěnce, kteří už toto pojištění mají')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not any(cleaned_data.get(field) for field in ('person_ids', 'person_csv', 'name', 'surname')):
+            raise forms.ValidationError("Zadejte ID pojištěnců, CSV soubor nebo alespoň jeden filtr.")
+        return cleaned_data
+
+
+class EventFilterForm(forms.Form):
+    APPROVED_CHOICES = [('', 'Vše'), ('1', 'Schválené'), ('0', 'Neschválené')]
+
+    date_from = forms.DateField(required=False, label='Nahlášeno od', widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, label='Nahlášeno do', widget=forms.DateInput(attrs={'type': 'date'}))
+    approved = forms.ChoiceField(required=False, choices=APPROVED_CHOICES, label='Stav')
+    damage_min = forms.DecimalField(required=False, max_digits=10, decimal_places=2, min_value=0, label='Škoda od (Kč)')
+    damage_max = forms.DecimalField(required=False, max_digits=10, decimal_places=2, min_value=0, label='Škoda do (Kč)')
+    insurance_type = forms.ModelChoiceField(queryset=InsuranceType.objects.all(), required=False, label='Typ pojištění', empty_label='Všechny typy')
+    insured_person = forms.IntegerField(required=False, min_value=1, label='ID pojištěnce')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs['class'] = 'form-control'
+
+    def filter(self, events):
+        """
+        Použije platně vyplněné filtry. Rozsahy jsou polootevřené intervaly nad
+        sloupci (bez funkcí), aby je databáze mohla hledat v indexech.
+        """
+        data = self.cleaned_data if self.is_bound else {}
+        if data.get('date_from'):
+            events = events.filter(report_date__gte=self._day_start(data['date_from']))
+        if data.get('date_to'):
+            events = events.filter(report_date__lt=self._day_start(data['date_to'] + datetime.timedelta(days=1)))
+        if data.get('approved'):
+            events = events.filter(is_approved=data['approved'] == '1')
+        if data.get('damage_min') is not None:
+            events = events.filter(damage_amount__gte=data['damage_min'])
+        if data.get('damage_max') is not None:
+            events = events.filter(damage_amount__lte=data['damage_max'])
+        if data.get('insurance_type'):
+            events = events.filter(insurance__insurance_type=data['insurance_type'])
+        if data.get('insured_person'):
+            events = events.filter(insurance__insured_person_id=data['insured_person'])
+        return events
+
+    @staticmethod
+    def _day_start(day):
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
@@ -0,0 +1,285 @@
+"""
+Splátkové kalendáře pojistného a upomínky (`manage.py generate_installments`, `manage.py run_dunning`).
+
+insurance_price je pojistné za celé období start_date..end_date, u pojištění bez end_date
+roční pojistné. Splátky jsou po 12 / payment_frequency měsících od start_date (stejný den
+v měsíci, v kratším měsíci poslední den):
+  - pojištění s end_date: n = ceil(délka období v měsících / interval) splátek po price / n,
+  - pojištění bez end_date: payment_frequency splátek ročně po price / payment_frequency,
+    kalendář se vytváří na 12 měsíců dopředu, po poslední splátce ho prodlouží běh s --missing.
+Haléřový zbytek se přičte k první splátce období, součet tak přesně odpovídá ceně.
+
+Generování běží po blocích pojištění podle id. Blok se načte jedním dotazem do polí
+NumPy, data splátek i částky se spočítají vektorově a v jedné transakci se smažou
+nezaplacené splátky splatné od zadaného dne a vloží nové (executemany). Zaplacené
+a už splatné splátky se nemění, přecenění i změna payment_frequency se tak projeví jen
+v budoucích splátkách. Nové splátky pokračují v pořadí za nejvyšším ponechaným a předem
+zaplacené budoucí splátky se odečtou od nejbližších nových.
+Při prvním běhu kalendář začíná zadaným dnem, minulé splátky se nedopočítávají.
+
+Upomínky: nezaplacená splátka dostane upomínku úrovně k, když je po splatnosti alespoň
+DUNNING_DAYS[k - 1] dní. Splátky se hledají v částečném indexu installment_unpaid_due_idx
+(due_date, id) od nejstarší splatnosti, stránkování po dvojicích (due_date, id) bez OFFSET.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import metrics
+from .anomaly import _day_sql
+from .models import Insurance, InsuredPerson, PremiumInstallment
+
+
+CHUNK_SIZE = 20000
+SCHEDULE_FIELDS = {'insurance_price', 'payment_frequency', 'end_date', 'is_active'}  # změna přegeneruje kalendář
+
+
+def _select_sql(missing_only, with_ids):
+    insurance, person, installment = Insurance._meta.db_table, InsuredPerson._meta.db_table, PremiumInstallment._meta.db_table
+    # Cena v haléřích a data jako počet dní od 1. 1. 1970, bez převodu na Decimal a date v Pythonu
+    sql = (
+        f'SELECT i.id, CAST(ROUND(i.insurance_price * 100) AS INTEGER), i.payment_frequency, '
+        f'{_day_sql("i.start_date")}, COALESCE({_day_sql("i.end_date")}, -1), '
+        f'CASE WHEN i.is_active AND i.deletion_requested_at IS NULL AND p.deletion_requested_at IS NULL '
+        f'AND (i.end_date IS NULL OR i.end_date >= %s) THEN 1 ELSE 0 END '
+        f'FROM {insurance} i JOIN {person} p ON p.id = i.insured_person_id WHERE i.id > %s'
+    )
+    if with_ids:
+        sql += ' AND i.id IN ({})'
+    if missing_only:
+        # Jen platná pojištění bez kalendáře, u pojištění bez end_date bez splátky splatné od zadaného dne
+        sql += (
+            f' AND i.is_active AND i.deletion_requested_at IS NULL AND (i.end_date IS NULL OR i.end_date >= %s)'
+            f' AND NOT EXISTS (SELECT 1 FROM {installment} s WHERE s.insurance_id = i.id'
+            f' AND (i.end_date IS NOT NULL OR s.due_date >= %s))'
+        )
+    return sql + ' ORDER BY i.id LIMIT %s'
+
+
+def _load_chunk(day, last_id, chunk_size, missing_only, insurance_ids):
+    sql = _select_sql(missing_only, insurance_ids is not None)
+    day_value = connection.ops.adapt_datefield_value(day)
+    params = [day_value, last_id]
+    if insurance_ids is not None:
+        sql = sql.format(', '.join(['%s'] * len(insurance_ids)))
+        params += list(insurance_ids)
+    if missing_only:
+        params += [day_value, day_value]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [chunk_size])
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+    ids, prices, frequencies, starts, ends, in_force = zip(*rows)
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'price': np.array(prices, dtype=np.int64),
+        'frequency': np.array(frequencies, dtype=np.int64),
+        'start': np.array(starts, dtype='datetime64[D]'),
+        'end': np.array(ends, dtype=np.int64),
+        'in_force': np.array(in_force, dtype=bool),
+    }
+
+
+def schedule(chunk, day):
+    """
+    Splátky splatné od `day` pro platná pojištění z bloku. Vrací pole
+    (id pojištění, pořadí, splatnost datetime64[D], částka v haléřích).
+    """
+    keep = chunk['in_force'] & (chunk['frequency'] > 0)
+    ids, price, frequency = chunk['id'][keep], chunk['price'][keep], chunk['frequency'][keep]
+    start, end = chunk['start'][keep], chunk['end'][keep]
+    day = np.datetime64(day, 'D')
+
+    step = 12 // frequency  # měsíců mezi splátkami
+    start_month = start.astype('datetime64[M]')
+    start_dom = (start - start_month.astype('datetime64[D]')).astype(np.int64)
+    elapsed = (day.astype('datetime64[M]') - start_month).astype(np.int64)
+
+    fixed = end >= 0
+    # Délka období v celých měsících, stejně jako renewals.term_months
+    term = np.maximum(1, np.rint((end - start.astype(np.int64) + 1) / (365.25 / 12))).astype(np.int64)
+    per_period = np.where(fixed, -(-term // step), frequency)
+    first = np.maximum(elapsed // step - 1, 0)  # o splátku dřív kvůli dni v měsíci, odfiltruje se níže
+    stop = np.where(fixed, per_period, np.maximum(elapsed + 11, 0) // step + 1)  # bez end_date na 12 měsíců dopředu
+    counts = np.maximum(stop - first, 0)
+
+    policy = np.repeat(np.arange(len(ids)), counts)
+    sequence = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + first[policy]
+    month = start_month[policy] + (sequence * step[policy]).astype('timedelta64[M]')
+    month_start = month.astype('datetime64[D]')
+    month_length = ((month + 1).astype('datetime64[D]') - month_start).astype(np.int64)
+    due = month_start + np.minimum(start_dom[policy], month_length - 1)
+
+    base = price // per_period
+    remainder = price - base * per_period
+    amount = base[policy] + np.where(sequence % per_period[policy] == 0, remainder[policy], 0)
+
+    upcoming = due >= day
+    return ids[policy][upcoming], sequence[upcoming], due[upcoming], amount[upcoming]
+
+
+def _kept(cursor, chunk, day_value, replace, installment_table):
+    """
+    Splátky, které zůstaly po smazání budoucích nezaplacených: pole (id pojištění, nejvyšší
+    pořadí, předplaceno v haléřích). Předplaceno je součet zaplacených splátek splatných od zadaného dne.
+    """
+    if replace == 'ids':
+        ids = chunk['id'].tolist()
+        where, params = f'insurance_id IN ({", ".join(["%s"] * len(ids))})', ids
+    else:
+        where, params = 'insurance_id BETWEEN %s AND %s', [int(chunk['id'][0]), int(chunk['id'][-1])]
+    cursor.execute(
+        f'SELECT insurance_id, MAX(sequence), '
+        f'CAST(ROUND(SUM(CASE WHEN paid_at IS NOT NULL AND due_date >= %s THEN amount ELSE 0 END) * 100) AS INTEGER) '
+        f'FROM {installment_table} WHERE {where} GROUP BY insurance_id ORDER BY insurance_id',
+        [day_value] + params,
+    )
+    rows = cursor.fetchall()
+    ids, last_sequence, prepaid = zip(*rows) if rows else ((), (), ())
+    return np.array(ids, dtype=np.int64), np.array(last_sequence, dtype=np.int64), np.array(prepaid, dtype=np.int64)
+
+
+def _group_starts(ids):
+    """
+    Pro seřazené id pojištění index prvního řádku jeho skupiny, pro každý řádek.
+    """
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    return np.repeat(starts, np.diff(np.r_[starts, len(ids)]))
+
+
+def fit_to_kept(insurance_ids, amount, kept):
+    """
+    Napojí nové splátky na ponechané. Předplacené částky se odečtou od nejbližších nových
+    splátek (plně pokryté vypadnou) a pořadí pokračuje za nejvyšším ponechaným, nové pořadí
+    se tak nesrazí se zaplacenými splátkami ani po změně payment_frequency.
+    Vrací (výběr řádků, nové pořadí, částka v haléřích).
+    """
+    kept_ids, last_sequence, prepaid = kept
+    first_sequence = np.zeros(len(insurance_ids), dtype=np.int64)
+    credit = np.zeros(len(insurance_ids), dtype=np.int64)
+    if len(kept_ids):
+        position = np.minimum(np.searchsorted(kept_ids, insurance_ids), len(kept_ids) - 1)
+        found = kept_ids[position] == insurance_ids
+        first_sequence[found] = last_sequence[position[found]] + 1
+        credit[found] = prepaid[position[found]]
+
+    # Součet splátek pojištění až po daný řádek včetně
+    starts = _group_starts(insurance_ids)
+    cumulative = np.cumsum(amount)
+    due_so_far = cumulative - cumulative[starts] + amount[starts]
+    amount = np.minimum(amount, np.maximum(due_so_far - credit, 0))
+
+    keep = amount > 0
+    insurance_ids, first_sequence = insurance_ids[keep], first_sequence[keep]
+    rank = np.arange(len(insurance_ids)) - _group_starts(insurance_ids)
+    return keep, first_sequence + rank, amount[keep]
+
+
+def _write_chunk(chunk, day, replace, installment_table):
+    """
+    replace: 'range' smaže budoucí nezaplacené splátky celého rozsahu id bloku, 'ids' jen pojištění
+    z bloku, None nic (--missing vybírá jen pojištění, která žádné budoucí splátky nemají).
+    """
+    insurance_ids, _, due, amount = schedule(chunk, day)
+    day_value = connection.ops.adapt_datefield_value(day)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if replace == 'range':
+            # Souvislý rozsah id, DELETE jde po unikátním indexu (insurance_id, sequence)
+            cursor.execute(
+                f'DELETE FROM {installment_table} WHERE insurance_id BETWEEN %s AND %s AND paid_at IS NULL AND due_date >= %s',
+                [int(chunk['id'][0]), int(chunk['id'][-1]), day_value],
+            )
+        elif replace == 'ids':
+            # Jen pro pár pojištění z view, u dlouhého seznamu by SQLite zvolilo index podle splatnosti
+            ids = chunk['id'].tolist()
+            cursor.execute(
+                f'DELETE FROM {installment_table} WHERE insurance_id IN ({", ".join(["%s"] * len(ids))}) '
+                f'AND paid_at IS NULL AND due_date >= %s',
+                ids + [day_value],
+            )
+        # Zaplacené a už splatné splátky zůstávají, nové se napojí za ně
+        keep, sequence, amount = fit_to_kept(insurance_ids, amount, _kept(cursor, chunk, day_value, replace, installment_table))
+        rows = zip(
+            insurance_ids[keep].tolist(), sequence.tolist(), due[keep].astype(str).tolist(),
+            [Decimal(cents).scaleb(-2) for cents in amount.tolist()],
+        )
+        cursor.executemany(
+            f'INSERT INTO {installment_table} (insurance_id, sequence, due_date, amount, dunning_level) '
+            f'VALUES (%s, %s, %s, %s, 0)',
+            rows,
+        )
+    return len(sequence)
+
+
+def generate_installments(day=None, chunk_size=CHUNK_SIZE, missing_only=False, insurance_ids=None, progress=None):
+    """
+    Přegeneruje splátky splatné od `day` (výchozí dnes). S missing_only jen platným pojištěním
+    bez kalendáře (u pojištění bez end_date bez budoucí splátky), s insurance_ids jen zadaným pojištěním.
+    progress(pojištění, splátek) se volá po každém bloku. Vrací (pojištění, splátek).
+    """
+    day = day or timezone.localdate()
+    table = PremiumInstallment._meta.db_table
+    replace = None if missing_only else 'range' if insurance_ids is None else 'ids'
+    policies = installments = last_id = 0
+    while True:
+        chunk = _load_chunk(day, last_id, chunk_size, missing_only, insurance_ids)
+        if chunk is None:
+            break
+        last_id = int(chunk['id'][-1])
+        installments += _write_chunk(chunk, day, replace, table)
+        policies += len(chunk['id'])
+        if progress:
+            progress(policies, installments)
+    return policies, installments
+
+
+def dunning_days():
+    return [int(days) for days in str(settings.DUNNING_DAYS).split(',')]
+
+
+def run_dunning(day=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Zvýší úroveň upomínky nezaplaceným splátkám po splatnosti. Vrací {úroveň: počet upomínek}.
+    """
+    day = day or timezone.localdate()
+    thresholds = np.array(dunning_days(), dtype=np.int64)
+    table = PremiumInstallment._meta.db_table
+    sql = (
+        f'SELECT id, due_date, {_day_sql("due_date")}, dunning_level FROM {table} '
+        f'WHERE paid_at IS NULL AND due_date <= %s AND (due_date, id) > (%s, %s) '
+        f'ORDER BY due_date, id LIMIT %s'
+    )
+    today = (np.datetime64(day, 'D') - np.datetime64(0, 'D')).astype(np.int64)
+    latest_due = connection.ops.adapt_datefield_value(day - timedelta(days=int(thresholds[0])))
+    last_due, last_id = connection.ops.adapt_datefield_value(day.min), 0
+    reminded = {}
+    now = timezone.now()
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [latest_due, last_due, last_id, chunk_size])
+            rows = cursor.fetchall()
+        if not rows:
+            break
+        ids, dues, due_days, levels = zip(*rows)
+        last_due, last_id = dues[-1], ids[-1]
+
+        ids = np.array(ids, dtype=np.int64)
+        overdue = today - np.array(due_days, dtype=np.int64)
+        level = np.searchsorted(thresholds, overdue, side='right')
+        raised = level > np.array(levels, dtype=np.int64)
+        with transaction.atomic():
+            for new_level in np.unique(level[raised]).tolist():
+                level_ids = ids[raised & (level == new_level)].tolist()
+                PremiumInstallment.objects.filter(pk__in=level_ids).update(dunning_level=new_level, reminded_at=now)
+                reminded[new_level] = reminded.get(new_level, 0) + len(level_ids)
+        if progress:
+            progress(sum(reminded.values()))
+
+    if reminded:
+        metrics.inc('pojistovna_dunning_reminders_total', sum(reminded.values()))
+    return reminded
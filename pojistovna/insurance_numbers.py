@@ -0,0 +1,126 @@
+"""
+Přidělování čísel pojištění.
+
+Číslo pojištění má 10 číslic: 9místné pořadové číslo a kontrolní číslice (Luhn),
+např. pořadové číslo 12345 -> "0000123455". Pořadová čísla se z databáze neberou po jednom,
+ale po blocích (INSURANCE_NUMBER_BLOCK_SIZE): každý proces si jedním UPDATE ... RETURNING
+na tabulce NumberSequence rezervuje blok a čísla z něj pak rozdává v paměti. Procesy se
+tak o čísla nepřetahují a kolize nejsou možné. V databázi je uložené přímo další volné
+číslo, ne pořadí bloku, změna velikosti bloku (i jen u části workerů při postupném
+nasazení) proto nepřidělí znovu už rezervovaná čísla.
+
+Blok rezervovaný uvnitř transakce se smí dál používat až po jejím commitu, při rollbacku
+se rezervace v databázi vrátí a blok by mohl dostat jiný proces.
+"""
+import os
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+
+
+SEQUENCE_NAME = 'insurance_number'
+BODY_DIGITS = 9
+
+
+def luhn_check_digit(body):
+    total = 0
+    for index, digit in enumerate(reversed(body)):
+        value = int(digit)
+        if index % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def format_insurance_number(value):
+    body = f'{value:0{BODY_DIGITS}d}'
+    return body + luhn_check_digit(body)
+
+
+def is_valid_insurance_number(number):
+    return (
+        len(number) == BODY_DIGITS + 1
+        and number.isdigit()
+        and luhn_check_digit(number[:-1]) == number[-1]
+    )
+
+
+def reserve_numbers(count):
+    """
+    Rezervuje `count` po sobě jdoucích pořadových čísel a vrátí první z nich.
+    """
+    NumberSequence = apps.get_model('pojistovna', 'NumberSequence')
+    sql = f'UPDATE {NumberSequence._meta.db_table} SET next_value = next_value + %s WHERE name = %s RETURNING next_value'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [count, SEQUENCE_NAME])
+        row = cursor.fetchone()
+        if row is None:
+            # Řádek zakládá migrace, v databázi bez nich se založí tady
+            NumberSequence.objects.get_or_create(name=SEQUENCE_NAME)
+            cursor.execute(sql, [count, SEQUENCE_NAME])
+            row = cursor.fetchone()
+    return row[0] - count
+
+
+class InsuranceNumberAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ranges = []  # potvrzené bloky [(další, konec)]
+
+    def reset(self):
+        # Po forku nesmí potomek používat bloky rodiče (měly by je oba)
+        self._lock = threading.Lock()
+        self._ranges = []
+
+    def allocate(self, count=1):
+        block_size = settings.INSURANCE_NUMBER_BLOCK_SIZE
+        values = []
+        with self._lock:
+            while len(values) < count and self._ranges:
+                values.extend(self._take(count - len(values)))
+
+            missing = count - len(values)
+            if missing:
+                reserved = -(-missing // block_size) * block_size
+                start = reserve_numbers(reserved)
+                end = start + reserved
+                values.extend(range(start, start + missing))
+                leftover = (start + missing, end)
+                if leftover[0] < end:
+                    if connection.in_atomic_block:
+                        transaction.on_commit(lambda: self._confirm(leftover))
+                    else:
+                        self._ranges.append(leftover)
+        return [format_insurance_number(value) for value in values]
+
+    def _take(self, count):
+        start, end = self._ranges[0]
+        stop = min(end, start + count)
+        if stop == end:
+            self._ranges.pop(0)
+        else:
+            self._ranges[0] = (stop, end)
+        return range(start, stop)
+
+    def _confirm(self, block):
+        with self._lock:
+            self._ranges.append(block)
+
+
+allocator = InsuranceNumberAllocator()
+os.register_at_fork(after_in_child=allocator.reset)
+
+
+def allocate_insurance_numbers(count):
+    return allocator.allocate(count)
+
+
+def next_insurance_number():
+    """
+    Výchozí hodnota Insurance.insurance_number.
+    """
+    return allocator.allocate(1)[0]
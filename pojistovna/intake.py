@@ -0,0 +1,179 @@
+"""
+Dávkový příjem pojistných událostí od partnerů (JSON Lines).
+
+Každý řádek je jedna událost:
+    {"idempotency_key": "cc-2026-000123", "insurance_number": "0000123455",
+     "damage_amount": "12500.00", "description": "...", "report_date": "2026-10-01T08:30:00+02:00"}
+
+report_date je nepovinné (výchozí je čas příjmu). Řádky se zpracovávají po blocích:
+čísla pojištění i už použité klíče se pro celý blok zjistí jedním dotazem a platné
+události se uloží jedním bulk_create. Řádek s již použitým klíčem se přeskočí
+(duplicita), partner tak může celou dávku po chybě bezpečně poslat znovu.
+Chybné řádky se vrátí s popisem chyby, ostatní se uloží.
+
+Používá ho view event_intake i příkaz `manage.py import_events`.
+"""
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import audit, metrics
+from .models import AuditLog, Event, Insurance
+
+
+BATCH_SIZE = 1000
+MAX_LINES = 100000  # na jeden požadavek endpointu
+MAX_KEY_LENGTH = Event._meta.get_field('idempotency_key').max_length
+MAX_DAMAGE = Decimal(10) ** 8  # damage_amount má max_digits=10, decimal_places=2
+
+
+@dataclass
+class IntakeResult:
+    created: int = 0
+    duplicates: list = field(default_factory=list)  # čísla řádků
+    errors: list = field(default_factory=list)  # (číslo řádku, chyba)
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'errors': [{'line': line, 'error': error} for line, error in self.errors],
+        }
+
+
+def parse_record(raw):
+    """
+    Řádek -> (klíč, číslo pojištění, popis, škoda, datum nahlášení). Chyba = ValueError.
+    """
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        raise ValueError("Neplatný JSON.")
+    if not isinstance(data, dict):
+        raise ValueError("Řádek musí být JSON objekt.")
+
+    key = str(data.get('idempotency_key') or '').strip()
+    if not key:
+        raise ValueError("Chybí idempotency_key.")
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"idempotency_key může mít nejvýše {MAX_KEY_LENGTH} znaků.")
+
+    number = str(data.get('insurance_number') or '').strip()
+    if not number:
+        raise ValueError("Chybí insurance_number.")
+
+    description = str(data.get('description') or '').strip()
+    if not description:
+        raise ValueError("Chybí description.")
+
+    try:
+        # Částka jako řetězec nebo číslo, float se převede přes str (bez binárních zbytků)
+        amount = Decimal(str(data.get('damage_amount'))).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ValueError("Neplatná damage_amount.")
+    if not amount.is_finite() or amount < 0 or amount >= MAX_DAMAGE:
+        raise ValueError("damage_amount musí být mezi 0 a 99 999 999,99.")
+
+    report_date = timezone.now()
+    if data.get('report_date'):
+        report_date = parse_datetime(str(data['report_date']))
+        if report_date is None:
+            raise ValueError("Neplatné report_date, očekává se ISO 8601.")
+        if timezone.is_naive(report_date):
+            report_date = timezone.make_aware(report_date)
+
+    return key, number, description, amount, report_date
+
+
+def _existing_keys(keys):
+    return set(Event.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', flat=True))
+
+
+def _import_batch(batch, result):
+    """
+    batch = [(číslo řádku, surový řádek)].
+    """
+    records = {}  # klíč -> (řádek, záznam), první výskyt klíče v bloku
+    for line_number, raw in batch:
+        try:
+            record = parse_record(raw)
+        except ValueError as exc:
+            result.errors.append((line_number, str(exc)))
+            continue
+        if record[0] in records:
+            result.duplicates.append(line_number)
+        else:
+            records[record[0]] = (line_number, record)
+    if not records:
+        return
+
+    numbers = {record[1] for _, record in records.values()}
+    insurance_ids = dict(
+        Insurance.objects.in_force()
+        .filter(insurance_number__in=numbers)
+        .values_list('insurance_number', 'id')
+    )
+
+    for attempt in range(2):
+        existing = _existing_keys(list(records))
+        events, duplicates, errors = [], [], []
+        for key, (line_number, (_, number, description, amount, report_date)) in records.items():
+            if key in existing:
+                duplicates.append(line_number)
+            elif number not in insurance_ids:
+                errors.append((line_number, f"Pojištění {number} neexistuje nebo není aktivní."))
+            else:
+                events.append(Event(
+                    insurance_id=insurance_ids[number], description=description,
+                    damage_amount=amount, report_date=report_date, idempotency_key=key,
+                ))
+        try:
+            with transaction.atomic():
+                created = Event.objects.bulk_create(events)
+                # bulk_create nevolá post_save, historii zapíšeme sami
+                for event in created:
+                    audit.record('event', event.pk, AuditLog.ACTION_CREATE, {
+                        'description': [None, event.description],
+                        'damage_amount': [None, str(event.damage_amount)],
+                    })
+        except IntegrityError:
+            if attempt:
+                raise
+            continue  # stejný klíč mezitím uložil souběžný požadavek, klíče se zjistí znovu
+        result.created += len(created)
+        result.duplicates.extend(duplicates)
+        result.errors.extend(errors)
+        return
+
+
+def import_events(lines, batch_size=BATCH_SIZE, max_lines=None):
+    """
+    Načte události z iterovatelných řádků (str nebo bytes). Prázdné řádky se přeskočí.
+    """
+    result = IntakeResult()
+    batch = []
+    with audit.buffered():
+        for line_number, raw in enumerate(lines, start=1):
+            if isinstance(raw, bytes):
+                raw = raw.decode('utf-8-sig' if line_number == 1 else 'utf-8', errors='replace')
+            raw = raw.strip()
+            if not raw:
+                continue
+            if max_lines is not None and line_number > max_lines:
+                result.errors.append((line_number, f"Překročen limit {max_lines} řádků, zbytek dávky se nezpracoval."))
+                break
+            batch.append((line_number, raw))
+            if len(batch) >= batch_size:
+                _import_batch(batch, result)
+                batch = []
+        if batch:
+            _import_batch(batch, result)
+
+    result.duplicates.sort()
+    result.errors.sort()
+    metrics.inc('pojistovna_events_added_total', result.created)
+    return result
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pojistovna.anonymization import BATCH_SIZE, anonymize_former_clients, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Anonymizuje osobní údaje pojištěnců, jejichž poslední pojištění skončilo před více "
+        "než GDPR_RETENTION_YEARS lety (viz pojistovna/anonymization.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=settings.GDPR_RETENTION_YEARS, help="Doba uchování údajů od konce posledního pojištění (roky).")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Počet pojištěnců v jednom bloku.")
+        parser.add_argument('--after', type=int, default=0, metavar='ID', help="Pokračovat od pojištěnců s id větším než ID.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Pauza mezi bloky v sekundách.")
+        parser.add_argument('--dry-run', action='store_true', help="Jen spočítat, kolik pojištěnců by se anonymizovalo.")
+
+    def handle(self, *args, **options):
+        if options['years'] < 1:
+            raise CommandError("Doba uchování musí být alespoň 1 rok.")
+        if options['batch_size'] < 1:
+            raise CommandError("Velikost bloku musí být kladná.")
+
+        self.stdout.write(f"Pojištění ukončená před {retention_cutoff(options['years'])}.")
+        start = time.perf_counter()
+        try:
+            scanned, anonymized = anonymize_former_clients(
+                years=options['years'], batch_size=options['batch_size'], after=options['after'],
+                dry_run=options['dry_run'], pause=options['pause'],
+                progress=lambda last_id, scanned, anonymized: self.stdout.write(
+                    f"  po id {last_id}: prošlo {scanned}, anonymizováno {anonymized}", ending='\r'),
+            )
+        except KeyboardInterrupt:
+            raise CommandError("\nPřerušeno, pro pokračování spusťte znovu (případně s --after posledním vypsaným id).")
+
+        elapsed = time.perf_counter() - start
+        verb = "K anonymizaci" if options['dry_run'] else "Anonymizováno"
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{verb} {anonymized} z {scanned} pojištěnců za {elapsed:.2f} s "
+            f"({scanned / elapsed if elapsed else 0:.0f} pojištěnců/s)."
+        ))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pojistovna.sqlite_backup import (
+    BACKUP_PAGES, BACKUP_SLEEP, CHECKPOINT_MODES, BackupError, LatencyProbe, backup, database_path, latency_summary,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Zálohuje SQLite databázi za běhu aplikace (online backup API po malých krocích, "
+        "viz pojistovna/sqlite_backup.py), ověří integritu kopie a smaže nejstarší zálohy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Adresář záloh (výchozí BACKUP_DIR).")
+        parser.add_argument('--keep', type=int, default=None, help="Kolik nejnovějších záloh ponechat (výchozí BACKUP_KEEP).")
+        parser.add_argument('--pages', type=int, default=BACKUP_PAGES, help="Stránek zkopírovaných v jednom kroku.")
+        parser.add_argument('--sleep', type=float, default=BACKUP_SLEEP, help="Pauza mezi kroky v sekundách.")
+        parser.add_argument('--checkpoint', choices=CHECKPOINT_MODES + ('NONE',), default='PASSIVE', help="WAL checkpoint před zálohou.")
+        parser.add_argument('--measure-latency', action='store_true', help="Měřit délku zapisovacích transakcí před zálohou a během ní.")
+
+    def handle(self, *args, **options):
+        try:
+            path = database_path()
+        except BackupError as exc:
+            raise CommandError(str(exc))
+
+        probe = None
+        if options['measure_latency']:
+            probe = LatencyProbe(path)
+            probe.start()
+            time.sleep(1)
+            baseline = list(probe.samples)
+
+        start = time.perf_counter()
+        try:
+            target, steps, removed = backup(
+                backup_dir=options['dir'], keep=options['keep'],
+                pages=options['pages'], sleep=options['sleep'],
+                checkpoint=None if options['checkpoint'] == 'NONE' else options['checkpoint'],
+            )
+        except BackupError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if probe:
+                during = probe.stop()[len(baseline):]
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(f"Záloha {target} ({steps} kroků, {elapsed:.2f} s), integrita v pořádku."))
+        for path in removed:
+            self.stdout.write(f"Smazána stará záloha {path}")
+        if probe:
+            self.stdout.write(f"Zápis bez zálohy: {latency_summary(baseline)}")
+            self.stdout.write(f"Zápis během zálohy: {latency_summary(during)}")
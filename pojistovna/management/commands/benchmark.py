@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from pojistovna.benchmarks import build_cases, compare, load_baseline, run_suite, save_baseline, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Změří view, validaci formulářů a vykreslení šablon nad testovací databází "
+        "naplněnou vygenerovanými daty (viz pojistovna/benchmarks.py), ne nad kopií produkční databáze. Výsledky lze uložit jako JSON "
+        "baseline a porovnat s předchozím během, zhoršení ukončí příkaz chybou."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--persons', type=int, default=200, help="Počet pojištěnců v testovacích datech.")
+        parser.add_argument('--seed', type=int, default=42, help="Seed generátoru testovacích dat.")
+        parser.add_argument('--repeat', type=int, default=20, help="Počet měření každého případu.")
+        parser.add_argument('--warmup', type=int, default=2, help="Počet neměřených volání před měřením.")
+        parser.add_argument('--filter', default='', help="Jen případy, jejichž název obsahuje tento text (např. view: nebo template:).")
+        parser.add_argument('--keepdb', action='store_true', help="Použít existující testovací databázi a nemazat ji.")
+        parser.add_argument('--save', default=None, help="Uložit výsledky jako JSON baseline do souboru.")
+        parser.add_argument('--compare', default=None, help="Porovnat s baseline ze souboru.")
+        parser.add_argument('--alpha', type=float, default=0.01, help="Hladina významnosti pro zpomalení.")
+        parser.add_argument('--threshold', type=float, default=0.10, help="Nejmenší hlášené relativní zpomalení mediánu.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = load_baseline(options['compare'])
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Baseline nelze načíst: {exc}")
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            # Data ze seed() se na konci vrátí, s --keepdb tak každý běh začíná ze stejného stavu
+            with transaction.atomic():
+                user = seed(persons=options['persons'], random_seed=options['seed'])
+                cases = [case for case in build_cases(user) if options['filter'] in case.name]
+                results = run_suite(cases, repeat=options['repeat'], warmup=options['warmup'], progress=self._progress)
+                transaction.set_rollback(True)
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['save']:
+            save_baseline(results, options['save'])
+            self.stdout.write(f"Baseline uložena do {options['save']}.")
+        if baseline is not None:
+            regressions = compare(baseline, results, alpha=options['alpha'], threshold=options['threshold'])
+            for name, message in regressions:
+                self.stderr.write(self.style.ERROR(f"{name}: {message}"))
+            if regressions:
+                raise CommandError(f"Zhoršení oproti {options['compare']}: {len(regressions)}.")
+            self.stdout.write(self.style.SUCCESS(f"Bez zhoršení oproti {options['compare']}."))
+
+    def _progress(self, name, result):
+        self.stdout.write(
+            f"{name:45} medián {result['median_ms']:8.2f} ms  ±{result['stdev_ms']:6.2f}  "
+            f"dotazy {result['queries']:3}  alokace {result['alloc_peak_kb']:8.1f} kB"
+        )
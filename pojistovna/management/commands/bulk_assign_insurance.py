@@ -0,0 +1,55 @@
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pojistovna.bulk_assign import assign_insurance_bulk, parse_person_ids, read_person_ids_csv, select_persons
+from pojistovna.models import InsuranceType
+
+
+class Command(BaseCommand):
+    help = "Hromadně přiřadí pojištění pojištěncům vybraným podle ID, CSV souboru nebo filtru."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', type=int, required=True, help="ID aktivního typu pojištění.")
+        parser.add_argument('--subject', required=True, help="Předmět pojištění.")
+        parser.add_argument('--price', required=True, help="Cena pojištění.")
+        parser.add_argument('--ids', default='', help="ID pojištěnců oddělená čárkou.")
+        parser.add_argument('--csv', default=None, help="CSV soubor s ID pojištěnců v prvním sloupci.")
+        parser.add_argument('--name', default='', help="Jméno obsahuje.")
+        parser.add_argument('--surname', default='', help="Příjmení obsahuje.")
+        parser.add_argument('--skip-existing', action='store_true', help="Přeskočit pojištěnce, kteří už pojištění tohoto typu mají.")
+
+    def handle(self, *args, **options):
+        try:
+            insurance_type = InsuranceType.objects.get(pk=options['type'], is_active=True)
+        except InsuranceType.DoesNotExist:
+            raise CommandError(f"Aktivní typ pojištění s ID {options['type']} neexistuje.")
+        try:
+            price = Decimal(options['price'])
+        except InvalidOperation:
+            raise CommandError("Zadejte platnou cenu pojištění.")
+
+        person_ids = parse_person_ids(options['ids'])
+        if options['csv']:
+            with open(options['csv'], encoding='utf-8-sig', newline='') as f:
+                person_ids += read_person_ids_csv(f)
+        if not (person_ids or options['name'] or options['surname']):
+            raise CommandError("Zadejte --ids, --csv nebo alespoň jeden filtr.")
+
+        persons = select_persons(
+            person_ids=person_ids,
+            name=options['name'],
+            surname=options['surname'],
+        )
+        start = time.perf_counter()
+        created = assign_insurance_bulk(
+            persons,
+            insurance_type=insurance_type,
+            insurance_subject=options['subject'],
+            insurance_price=price,
+            skip_existing=options['skip_existing'],
+        )
+        elapsed = time.perf_counter() - start
+        rate = created / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Vytvořeno {created} pojištění za {elapsed:.2f} s ({rate:.0f}/s)."))
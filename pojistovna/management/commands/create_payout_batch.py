@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pojistovna.models import PayoutBatch
+from pojistovna.payouts import CHUNK_SIZE, PayoutError, create_batch, render_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Zařadí schválené nevyplacené události do platební dávky, označí je jako vyplacené "
+        "a zapíše soubor pro banku (viz pojistovna/payouts.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='file_format', choices=[code for code, _ in PayoutBatch.FORMAT_CHOICES], default=PayoutBatch.FORMAT_ABO, help="Formát souboru.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Počet událostí v jedné transakci.")
+        parser.add_argument('--output-dir', default=None, help="Adresář souborů, výchozí PAYOUT_DIR.")
+        parser.add_argument('--render', type=int, default=None, metavar='BATCH_ID', help="Jen znovu vytvořit soubor existující dávky.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            if options['render'] is not None:
+                try:
+                    batch = PayoutBatch.objects.get(pk=options['render'])
+                except PayoutBatch.DoesNotExist:
+                    raise CommandError(f"Dávka {options['render']} neexistuje.")
+                path = render_batch(batch, chunk_size=options['chunk_size'], output_dir=options['output_dir'])
+                batch.refresh_from_db()
+                skipped = 0
+            else:
+                batch, path, skipped = create_batch(
+                    options['file_format'], chunk_size=options['chunk_size'], output_dir=options['output_dir'],
+                    progress=lambda count: self.stdout.write(f"  {count} plateb", ending='\r'),
+                )
+        except PayoutError as exc:
+            raise CommandError(str(exc))
+
+        elapsed = time.perf_counter() - start
+        if skipped:
+            self.stderr.write(f"\nPřeskočeno {skipped} událostí s neplatným číslem účtu.")
+        self.stdout.write(self.style.SUCCESS(
+            f"\nDávka {batch.pk}: {batch.event_count} plateb, celkem {batch.total_amount} Kč, "
+            f"{path} za {elapsed:.2f} s ({batch.event_count / elapsed if elapsed else 0:.0f} plateb/s)."
+        ))
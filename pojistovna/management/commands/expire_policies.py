@@ -0,0 +1,41 @@
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pojistovna.renewals import expire_policies
+
+
+class Command(BaseCommand):
+    help = (
+        "Deaktivuje pojištění, kterým vypršelo end_date, a vytvoří obnovená pojištění "
+        "s přepočtenou cenou (viz pojistovna/renewals.py). Spouštět jednou denně."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', default=None, help="Den, ke kterému se vypršení počítá (YYYY-MM-DD), výchozí dnes.")
+        parser.add_argument('--batch-size', type=int, default=settings.RENEWAL_BATCH_SIZE, help="Počet pojištění zpracovaných v jedné transakci.")
+        parser.add_argument('--indexation', default=settings.RENEWAL_INDEXATION, help="Koeficient ceny obnoveného pojištění, např. 1.03.")
+
+    def handle(self, *args, **options):
+        try:
+            day = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError(f"Neplatné datum: {options['date']}")
+        try:
+            indexation = Decimal(options['indexation'])
+        except InvalidOperation:
+            raise CommandError(f"Neplatný koeficient: {options['indexation']}")
+
+        start = time.perf_counter()
+        expired, renewed = expire_policies(
+            day, batch_size=options['batch_size'], indexation=indexation,
+            progress=lambda expired, renewed: self.stdout.write(f"  vypršelo {expired}, obnoveno {renewed}", ending='\r'),
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"\nVypršelo {expired} pojištění, obnoveno {renewed} za {elapsed:.2f} s "
+            f"({expired / elapsed if elapsed else 0:.0f} pojištění/s)."
+        ))
@@ -0,0 +1,35 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pojistovna.installments import CHUNK_SIZE, generate_installments
+
+
+class Command(BaseCommand):
+    help = (
+        "Vygeneruje splátkové kalendáře pojistného (viz pojistovna/installments.py). Bez --missing "
+        "přegeneruje budoucí nezaplacené splátky všech pojištění, např. po přecenění."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', default=None, help="Den, od kterého se splátky generují (YYYY-MM-DD), výchozí dnes.")
+        parser.add_argument('--missing', action='store_true', help="Jen platná pojištění bez budoucí splátky (denní běh).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Počet pojištění zpracovaných v jedné transakci.")
+
+    def handle(self, *args, **options):
+        try:
+            day = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError(f"Neplatné datum: {options['date']}")
+
+        start = time.perf_counter()
+        policies, installments = generate_installments(
+            day, chunk_size=options['chunk_size'], missing_only=options['missing'],
+            progress=lambda policies, installments: self.stdout.write(f"  {policies} pojištění, {installments} splátek", ending='\r'),
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"\nZpracováno {policies} pojištění, vytvořeno {installments} splátek za {elapsed:.2f} s "
+            f"({policies / elapsed if elapsed else 0:.0f} pojištění/s)."
+        ))
@@ -0,0 +1,38 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pojistovna.intake import BATCH_SIZE, import_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Načte pojistné události ze souboru JSON Lines (viz pojistovna/intake.py). "
+        "Řádky s již použitým idempotency_key se přeskočí."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="Soubor JSON Lines, '-' = standardní vstup.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Počet řádků uložených najednou.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['file'] == '-':
+            result = import_events(sys.stdin, batch_size=options['batch_size'])
+        else:
+            try:
+                f = open(options['file'], 'rb')
+            except OSError as exc:
+                raise CommandError(f"Soubor nelze otevřít: {exc}")
+            with f:
+                result = import_events(f, batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+
+        for line_number, error in result.errors:
+            self.stderr.write(f"Řádek {line_number}: {error}")
+        rate = result.created / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Vytvořeno {result.created} událostí za {elapsed:.2f} s ({rate:.0f}/s), "
+            f"duplicit {len(result.duplicates)}, chyb {len(result.errors)}."
+        ))
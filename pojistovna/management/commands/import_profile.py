@@ -0,0 +1,58 @@
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(output):
+    """
+    Výstup `python -X importtime` -> [(modul, vlastní µs, kumulativní µs, hloubka)].
+    """
+    rows = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Změří, co stojí start workeru: spustí nový interpret s `-X importtime`, "
+        "naimportuje WSGI aplikaci (a volitelně URLconf) a vypíše nejdražší moduly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='pojistovna_ITnetwork.wsgi', help="Importovaný modul.")
+        parser.add_argument('--urls', action='store_true', help="Načíst i URLconf (views, forms), jako při prvním požadavku.")
+        parser.add_argument('--top', type=int, default=20, help="Počet vypsaných modulů.")
+        parser.add_argument('--filter', default='', help="Jen moduly začínající tímto prefixem, např. pojistovna.")
+
+    def handle(self, *args, **options):
+        code = f"import {options['module']}"
+        if options['urls']:
+            code += "; from django.urls import get_resolver; get_resolver().url_patterns"
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Import selhal:\n{result.stderr[-2000:]}")
+
+        rows = parse_importtime(result.stderr)
+        top_level = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+        self.stdout.write(f"{len(rows)} modulů, celkem {top_level / 1000:.1f} ms")
+
+        selected = [row for row in rows if row[0].startswith(options['filter'])]
+        self.stdout.write("\nNejvyšší kumulativní čas:")
+        for module, self_us, cumulative_us, _ in sorted(selected, key=lambda row: -row[2])[:options['top']]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+        self.stdout.write("\nNejvyšší vlastní čas:")
+        for module, self_us, cumulative_us, _ in sorted(selected, key=lambda row: -row[1])[:options['top']]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms  {module}")
@@ -0,0 +1,45 @@
+import time
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from pojistovna.attachments import orphaned_blobs, remove_blob, submit_thumbnails
+from pojistovna.models import EventAttachment
+
+
+class Command(BaseCommand):
+    help = (
+        "Vytvoří chybějící náhledy obrázkových příloh (v procesech, viz pojistovna/attachments.py) "
+        "a s --orphans smaže soubory, na které už žádná příloha neodkazuje."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orphans', action='store_true', help="Smazat soubory bez příloh (např. po smazání událostí).")
+        parser.add_argument('--dry-run', action='store_true', help="S --orphans jen vypsat, co by se smazalo.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        sha256s = (
+            EventAttachment.objects.filter(content_type__startswith='image/')
+            .order_by('sha256').values_list('sha256', flat=True).distinct()
+        )
+        futures = submit_thumbnails(sha256s.iterator())
+        failed = 0
+        for done, future in enumerate(as_completed(futures), 1):
+            failed += future.exception() is not None
+            self.stdout.write(f"  náhledy {done}/{len(futures)}", ending='\r')
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"\nVytvořeno {len(futures) - failed} náhledů za {elapsed:.2f} s"
+            f"{f', {failed} se nepodařilo' if failed else ''}."
+        ))
+
+        if options['orphans']:
+            removed = 0
+            for sha256, path in orphaned_blobs():
+                self.stdout.write(path)
+                if not options['dry_run']:
+                    remove_blob(sha256)
+                removed += 1
+            verb = "Ke smazání" if options['dry_run'] else "Smazáno"
+            self.stdout.write(self.style.SUCCESS(f"{verb} {removed} souborů bez příloh."))
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pojistovna.deletion import pending_jobs, run_job
+from pojistovna.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Provede čekající mazání pojištěnců a pojištění po blocích (viz pojistovna/deletion.py). "
+        "S --loop běží jako worker a nové úlohy kontroluje v zadaném intervalu."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.DELETION_BATCH_SIZE, help="Počet řádků smazaných v jedné transakci.")
+        parser.add_argument('--pause', type=float, default=0.05, help="Pauza mezi bloky v sekundách.")
+        parser.add_argument('--loop', type=float, default=None, metavar='SECONDS', help="Běžet stále, nové úlohy hledat po SECONDS sekundách.")
+        parser.add_argument('--retry', action='store_true', help="Znovu zařadit neúspěšné a přerušené (running) úlohy.")
+
+    def handle(self, *args, **options):
+        if options['retry']:
+            requeued = DeletionJob.objects.filter(
+                status__in=[DeletionJob.STATUS_FAILED, DeletionJob.STATUS_RUNNING],
+            ).update(status=DeletionJob.STATUS_PENDING)
+            self.stdout.write(f"Znovu zařazeno {requeued} úloh.")
+
+        while True:
+            for job in pending_jobs():
+                self.process(job, options)
+            if options['loop'] is None:
+                return
+            close_old_connections()
+            time.sleep(options['loop'])
+
+    def process(self, job, options):
+        start = time.perf_counter()
+
+        def progress(job):
+            self.stdout.write(f"  {job.label}: {job.deleted}/{job.total}", ending='\r')
+
+        try:
+            if not run_job(job, batch_size=options['batch_size'], pause=options['pause'], progress=progress):
+                return
+        except Exception as exc:
+            self.stderr.write(f"\nMazání {job.label} selhalo: {exc}")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"\nSmazáno {job.label}: {job.deleted} řádků za {time.perf_counter() - start:.2f} s."
+        ))
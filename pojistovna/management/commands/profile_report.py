@@ -0,0 +1,81 @@
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pojistovna.profiling import PROFILE_SUFFIX, read_profile
+
+
+SQL_MARKER = 'django/db/'
+TEMPLATE_MARKER = 'django/template/'
+
+
+class Command(BaseCommand):
+    help = "Sloučí uložené profily podle view a vypíše nejdražší funkce, podíl SQL/šablon a folded stacks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Adresář s profily (výchozí PROFILER_DIR).")
+        parser.add_argument('--view', default=None, help="Jen profily daného view, např. pojistovna:event_list.")
+        parser.add_argument('--top', type=int, default=15, help="Počet vypsaných funkcí.")
+        parser.add_argument('--folded', default=None, help="Adresář, kam zapsat sloučené folded stacks pro každé view.")
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'] or settings.PROFILER_DIR)
+        if not directory.is_dir():
+            raise CommandError(f"Adresář s profily {directory} neexistuje.")
+
+        merged = defaultdict(Counter)
+        requests = Counter()
+        durations = defaultdict(float)
+        for path in directory.glob(f'*{PROFILE_SUFFIX}'):
+            meta, samples = read_profile(path)
+            view = meta.get('view', 'unknown')
+            if options['view'] and view != options['view']:
+                continue
+            merged[view].update(samples)
+            requests[view] += 1
+            durations[view] += float(meta.get('duration_ms', 0))
+
+        if not merged:
+            self.stdout.write("Žádné profily nenalezeny.")
+            return
+
+        folded_dir = Path(options['folded']) if options['folded'] else None
+        if folded_dir:
+            folded_dir.mkdir(parents=True, exist_ok=True)
+
+        for view, samples in sorted(merged.items(), key=lambda item: -sum(item[1].values())):
+            self.report_view(view, samples, requests[view], durations[view], options['top'])
+            if folded_dir:
+                path = folded_dir / f"{view.replace(':', '.')}{PROFILE_SUFFIX}"
+                with open(path, 'w', encoding='utf-8') as f:
+                    for stack, count in samples.most_common():
+                        f.write(f"{stack} {count}\n")
+                self.stdout.write(f"  folded stacks: {path}")
+
+    def report_view(self, view, samples, request_count, total_ms, top):
+        total = sum(samples.values())
+        self_time = Counter()
+        inclusive = Counter()
+        sql = template = 0
+        for stack, count in samples.items():
+            frames = stack.split(';')
+            self_time[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+            if SQL_MARKER in stack:
+                sql += count
+            elif TEMPLATE_MARKER in stack:
+                template += count
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{view}: {request_count} požadavků, průměr {total_ms / request_count:.1f} ms, {total} vzorků"
+        ))
+        self.stdout.write(
+            f"  SQL {100 * sql / total:.1f} % | šablony {100 * template / total:.1f} % | "
+            f"ostatní {100 * (total - sql - template) / total:.1f} %"
+        )
+        self.stdout.write("  Nejdražší funkce (vlastní čas / včetně volaných):")
+        for frame, count in self_time.most_common(top):
+            self.stdout.write(f"  {100 * count / total:6.1f} % {100 * inclusive[frame] / total:6.1f} %  {frame}")
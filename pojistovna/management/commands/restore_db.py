@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pojistovna.sqlite_backup import BackupError, database_path, restore
+
+
+class Command(BaseCommand):
+    help = (
+        "Obnoví SQLite databázi ze zálohy z backup_db. Záloha se nejdřív ověří a současný "
+        "stav se uloží jako pre-restore záloha. Zápisy aplikace během obnovy čekají."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup', help="Soubor zálohy.")
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive', help="Neptat se na potvrzení.")
+        parser.add_argument('--no-safety-backup', action='store_false', dest='safety_backup', help="Před obnovou nezálohovat současný stav.")
+
+    def handle(self, *args, **options):
+        try:
+            path = database_path()
+        except BackupError as exc:
+            raise CommandError(str(exc))
+        if options['interactive']:
+            answer = input(f"Databáze {path} bude přepsána zálohou {options['backup']}. Pokračovat? [ano/ne] ")
+            if answer.strip().lower() != 'ano':
+                raise CommandError("Obnova zrušena.")
+
+        try:
+            safety_path = restore(options['backup'], safety_backup=options['safety_backup'])
+        except (BackupError, OSError) as exc:
+            raise CommandError(str(exc))
+        if safety_path:
+            self.stdout.write(f"Původní stav uložen do {safety_path}")
+        self.stdout.write(self.style.SUCCESS(f"Databáze obnovena ze zálohy {options['backup']}."))
@@ -0,0 +1,36 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pojistovna.installments import CHUNK_SIZE, run_dunning
+
+
+class Command(BaseCommand):
+    help = (
+        "Označí upomínkou nezaplacené splátky pojistného po splatnosti podle DUNNING_DAYS "
+        "(viz pojistovna/installments.py). Spouštět jednou denně."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', default=None, help="Den, ke kterému se splatnost počítá (YYYY-MM-DD), výchozí dnes.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Počet splátek načtených najednou.")
+
+    def handle(self, *args, **options):
+        try:
+            day = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError(f"Neplatné datum: {options['date']}")
+
+        start = time.perf_counter()
+        reminded = run_dunning(
+            day, chunk_size=options['chunk_size'],
+            progress=lambda count: self.stdout.write(f"  {count} upomínek", ending='\r'),
+        )
+        elapsed = time.perf_counter() - start
+        total = sum(reminded.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"\nUpomínek celkem {total} za {elapsed:.2f} s ({total / elapsed if elapsed else 0:.0f}/s)."
+        ))
+        for level, count in sorted(reminded.items()):
+            self.stdout.write(f"  {level}. upomínka: {count} splátek")
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pojistovna.anomaly import CHUNK_SIZE, score_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Ohodnotí pojistné události skóre podezřelosti (viz pojistovna/anomaly.py). "
+        "Bez --full jen nové, dosud neohodnocené události."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Přepočítat základy typů pojištění a ohodnotit všechny události znovu.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Počet událostí načtených najednou.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        scored = score_events(full=options['full'], chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - start
+        rate = scored / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Ohodnoceno {scored} událostí za {elapsed:.2f} s ({rate:.0f}/s)."))
@@ -0,0 +1,67 @@
+import gzip
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from pojistovna import search_cache
+from pojistovna.models import InsuredPerson
+from pojistovna.views import dynamic_insured_person_search, dynamic_user_search
+
+
+ENDPOINTS = {
+    'insured_person': ('/insured_person/search/', dynamic_insured_person_search),
+    'user': ('/users/search/', dynamic_user_search),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Porovná HTML a JSON (?format=json) odpovědi dynamického vyhledávání: CPU serveru "
+        "na požadavek a velikost odpovědi (bez komprese i gzip). Dotazy simulují psaní "
+        "příjmení po písmenech."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', default=None, help="Uživatel, za kterého se vyhledává (výchozí první superuživatel).")
+        parser.add_argument('--surnames', type=int, default=20, help="Počet příjmení, jejichž psaní se simuluje.")
+        parser.add_argument('--repeat', type=int, default=5, help="Kolikrát se celá sada dotazů zopakuje.")
+        parser.add_argument('--cached', action='store_true', help="Nechat zapnutou cache výsledků (měří se jen vykreslení).")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=options['username']) if options['username'] else User.objects.filter(is_superuser=True)
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError("Nenalezen uživatel pro vyhledávání, zadejte --username.")
+
+        surnames = set(InsuredPerson.objects.order_by('id').values_list('surname', flat=True)[:options['surnames'] * 10])
+        surnames = sorted(surnames)[:options['surnames']]
+        queries = sorted({surname[:length] for surname in surnames for length in (1, 2, 3)}) or ['']
+        factory = RequestFactory()
+
+        for endpoint, (path, view) in ENDPOINTS.items():
+            self.stdout.write(f"\n{endpoint} ({len(queries)} dotazů x {options['repeat']}):")
+            for mode in ('html', 'json'):
+                cpu, wall, sizes, gzipped = [], [], [], []
+                for _ in range(options['repeat']):
+                    for query in queries:
+                        params = {'surname': query, 'page': 1}
+                        if mode == 'json':
+                            params['format'] = 'json'
+                        request = factory.get(path, params)
+                        request.user = user
+                        if not options['cached']:
+                            search_cache.invalidate(endpoint)
+                        cpu_start, wall_start = time.process_time(), time.perf_counter()
+                        response = view(request)
+                        cpu.append(time.process_time() - cpu_start)
+                        wall.append(time.perf_counter() - wall_start)
+                        sizes.append(len(response.content))
+                        gzipped.append(len(gzip.compress(response.content)))
+                self.stdout.write(
+                    f"  {mode:4}: CPU {statistics.mean(cpu) * 1000:6.2f} ms, "
+                    f"medián {statistics.median(wall) * 1000:6.2f} ms, "
+                    f"odpověď {statistics.mean(sizes) / 1024:7.1f} kB (gzip {statistics.mean(gzipped) / 1024:5.1f} kB)"
+                )
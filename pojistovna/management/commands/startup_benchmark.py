@@ -0,0 +1,102 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Spouští se v novém interpretu, aby se měřil skutečně studený start
+BENCHMARK_SCRIPT = r'''
+import io, json, os, sys, time
+
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pojistovna_ITnetwork.settings')
+from pojistovna_ITnetwork.wsgi import application
+imported = time.perf_counter()
+mode, paths = sys.argv[1], sys.argv[2:]
+
+
+def request(path):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+    }
+    statuses = []
+    began = time.perf_counter()
+    b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    return statuses[0], (time.perf_counter() - began) * 1000
+
+
+def serve():
+    first = [request(path) for path in paths]
+    second = [request(path) for path in paths]
+    return {'first': first, 'second': second}
+
+
+result = {'import_ms': (imported - start) * 1000}
+if mode == 'preload':
+    from pojistovna.warmup import warm
+    began = time.perf_counter()
+    warm()
+    result['warm_ms'] = (time.perf_counter() - began) * 1000
+    read_fd, write_fd = os.pipe()
+    forked = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        served = serve()
+        served['fork_to_first_ms'] = (time.perf_counter() - forked) * 1000
+        os.write(write_fd, json.dumps(served).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        result.update(json.loads(pipe.read()))
+    os.waitpid(pid, 0)
+else:
+    result.update(serve())
+    result['start_to_first_ms'] = (time.perf_counter() - start) * 1000
+print(json.dumps(result))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        "Změří time-to-first-response nového workeru: studený start (import + první požadavek) "
+        "proti preload režimu (aplikace zahřátá v masteru, worker vzniká forkem)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths', help="Měřená URL (lze opakovat), výchozí / a /login/.")
+        parser.add_argument('--runs', type=int, default=5, help="Počet opakování každého režimu.")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/', '/login/']
+        for mode in ('cold', 'preload'):
+            runs = [self.run(mode, paths) for _ in range(options['runs'])]
+            self.stdout.write(f"\n{mode} ({len(runs)}x, medián):")
+            self.stdout.write(f"  import aplikace:        {self.median(runs, 'import_ms'):8.1f} ms")
+            if mode == 'preload':
+                self.stdout.write(f"  warmup v masteru:       {self.median(runs, 'warm_ms'):8.1f} ms")
+                self.stdout.write(f"  fork -> první odpověď:  {self.median(runs, 'fork_to_first_ms'):8.1f} ms")
+            else:
+                self.stdout.write(f"  start -> první odpověď: {self.median(runs, 'start_to_first_ms'):8.1f} ms")
+            for index, path in enumerate(paths):
+                status = runs[0]['first'][index][0]
+                first = statistics.median(run['first'][index][1] for run in runs)
+                second = statistics.median(run['second'][index][1] for run in runs)
+                self.stdout.write(f"  {path} [{status}]: první {first:.1f} ms, další {second:.1f} ms")
+
+    def run(self, mode, paths):
+        result = subprocess.run(
+            [sys.executable, '-c', BENCHMARK_SCRIPT, mode, *paths],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Měření ({mode}) selhalo:\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def median(self, runs, key):
+        return statistics.median(run[key] for run in runs)
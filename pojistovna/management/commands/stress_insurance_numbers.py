@@ -0,0 +1,49 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from pojistovna.insurance_numbers import allocate_insurance_numbers, is_valid_insurance_number
+
+
+def _worker(count, batch):
+    numbers = []
+    start = time.perf_counter()
+    while len(numbers) < count:
+        numbers.extend(allocate_insurance_numbers(min(batch, count - len(numbers))))
+    return numbers, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Zátěžový test přidělování čísel pojištění: několik procesů (jako workery gunicornu) "
+        "najednou žádá o čísla a ověří se, že žádné číslo nebylo přiděleno dvakrát. "
+        "Spotřebovaná čísla se už nepoužijí (v číselné řadě vznikne mezera)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help="Počet souběžných procesů.")
+        parser.add_argument('--count', type=int, default=10000, help="Počet čísel na proces.")
+        parser.add_argument('--batch', type=int, default=1, help="Kolik čísel žádat najednou (1 = jako jednotlivá pojištění).")
+
+    def handle(self, *args, **options):
+        processes, count = options['processes'], options['count']
+        ctx = multiprocessing.get_context('fork')
+        # Potomci si otevřou vlastní spojení, zděděná spojení se sdílet nesmí
+        connections.close_all()
+        start = time.perf_counter()
+        with ctx.Pool(processes) as pool:
+            results = pool.starmap(_worker, [(count, options['batch'])] * processes)
+        elapsed = time.perf_counter() - start
+
+        numbers = [number for worker_numbers, _ in results for number in worker_numbers]
+        duplicates = len(numbers) - len(set(numbers))
+        invalid = sum(1 for number in numbers if not is_valid_insurance_number(number))
+
+        self.stdout.write(f"Procesů: {processes}, čísel: {len(numbers)}, čas: {elapsed:.2f} s, {len(numbers) / elapsed:.0f} čísel/s")
+        for index, (_, worker_elapsed) in enumerate(results):
+            self.stdout.write(f"  proces {index}: {count / worker_elapsed:.0f} čísel/s")
+        if duplicates or invalid:
+            raise CommandError(f"Chyba: {duplicates} duplicitních a {invalid} neplatných čísel.")
+        self.stdout.write(self.style.SUCCESS("OK: všechna čísla jsou unikátní a mají platnou kontrolní číslici."))
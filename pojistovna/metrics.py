@@ -0,0 +1,282 @@
+"""
+Metriky ve formátu Prometheus, sčítané přes všechny procesy gunicornu.
+
+Každý proces zapisuje své hodnoty do vlastního souboru METRICS_DIR/metrics_<pid>.db
+namapovaného do paměti (mmap). Zápis je jen přičtení k double na pevném offsetu,
+takže je dost levný na to, aby běžel stále. Endpoint /metrics při každém scrapu
+přečte soubory všech procesů a hodnoty sečte. Adresář se čistí při startu
+gunicorn mastera (gunicorn.conf.py).
+
+Histogramy se ukládají nekumulativně (jeden přičtený bucket na pozorování),
+kumulativní součty se dopočítají až při exportu.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+
+INITIAL_SIZE = 64 * 1024
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# název -> (typ, popis)
+FAMILIES = {
+    'pojistovna_http_request_duration_seconds': ('histogram', "Doba zpracování požadavku podle view."),
+    'pojistovna_db_queries_total': ('counter', "Počet SQL dotazů podle view."),
+    'pojistovna_db_query_seconds_total': ('counter', "Celkový čas SQL dotazů podle view."),
+    'pojistovna_template_render_seconds': ('histogram', "Doba vykreslení šablony."),
+    'pojistovna_cache_requests_total': ('counter', "Přístupy do cache podle výsledku (hit/miss)."),
+    'pojistovna_events_added_total': ('counter', "Počet přidaných pojistných událostí."),
+    'pojistovna_policies_assigned_total': ('counter', "Počet přiřazených pojištění."),
+    'pojistovna_policies_expired_total': ('counter', "Počet deaktivovaných vypršelých pojištění."),
+    'pojistovna_policies_renewed_total': ('counter', "Počet obnovených pojištění."),
+    'pojistovna_dunning_reminders_total': ('counter', "Počet upomínek nezaplacených splátek pojistného."),
+    'pojistovna_search_coalesced_total': ('counter', "Vyhledávání obsloužená výsledkem souběžného stejného dotazu."),
+}
+
+
+class MmapedValues:
+    """
+    Slovník klíč -> float64 v souboru namapovaném do paměti.
+    Formát: [uint32 použitá délka, 4 B výplň] a pak záznamy
+    [uint32 délka klíče][klíč zarovnaný na 8 B][double hodnota].
+    Zapisuje jen vlastník souboru, číst může kdokoli.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, 'a+b')
+        if os.fstat(self._f.fileno()).st_size == 0:
+            self._f.truncate(INITIAL_SIZE)
+        self._capacity = os.fstat(self._f.fileno()).st_size
+        self._m = mmap.mmap(self._f.fileno(), self._capacity)
+        self._positions = {}
+        self._used = struct.unpack_from('i', self._m, 0)[0] or 8
+        for key, _, pos in _iter_entries(self._m, self._used):
+            self._positions[key] = pos
+
+    def add(self, key, amount):
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._init_value(key)
+        value = struct.unpack_from('d', self._m, pos)[0]
+        struct.pack_into('d', self._m, pos, value + amount)
+
+    def _init_value(self, key):
+        encoded = key.encode('utf-8')
+        padded = encoded + b' ' * (8 - (len(encoded) + 4) % 8)
+        entry = struct.pack(f'i{len(padded)}sd', len(encoded), padded, 0.0)
+        while self._used + len(entry) > self._capacity:
+            self._capacity *= 2
+            self._f.truncate(self._capacity)
+            self._m.close()
+            self._m = mmap.mmap(self._f.fileno(), self._capacity)
+        self._m[self._used:self._used + len(entry)] = entry
+        self._used += len(entry)
+        # Délku zapsat až po záznamu, aby čtenář nikdy neviděl nedopsaný záznam
+        struct.pack_into('i', self._m, 0, self._used)
+        pos = self._used - 8
+        self._positions[key] = pos
+        return pos
+
+
+def _iter_entries(data, used):
+    pos = 8
+    while pos < used:
+        length = struct.unpack_from('i', data, pos)[0]
+        pos += 4
+        key = bytes(data[pos:pos + length]).decode('utf-8')
+        pos += length + (8 - (length + 4) % 8)
+        value = struct.unpack_from('d', data, pos)[0]
+        pos += 8
+        yield key, value, pos - 8
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 8:
+        return
+    used = struct.unpack_from('i', data, 0)[0]
+    for key, value, _ in _iter_entries(data, used):
+        yield key, value
+
+
+_lock = threading.Lock()
+_values = None
+_values_pid = None
+
+
+def _store():
+    global _values, _values_pid
+    pid = os.getpid()
+    if _values is None or _values_pid != pid:
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        _values = MmapedValues(directory / f'metrics_{pid}.db')
+        _values_pid = pid
+    return _values
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def inc(name, amount=1, **labels):
+    if not settings.METRICS_ENABLED:
+        return
+    with _lock:
+        _store().add(_key(name, labels), amount)
+
+
+def observe(name, value, **labels):
+    if not settings.METRICS_ENABLED:
+        return
+    le = next((str(bound) for bound in DURATION_BUCKETS if value <= bound), '+Inf')
+    with _lock:
+        store = _store()
+        store.add(_key(name + '_bucket', dict(labels, le=le)), 1)
+        store.add(_key(name + '_sum', labels), value)
+        store.add(_key(name + '_count', labels), 1)
+
+
+def cache_access(cache, hit):
+    inc('pojistovna_cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+
+def collect():
+    """
+    Sečte hodnoty ze souborů všech procesů.
+    """
+    totals = {}
+    for path in Path(settings.METRICS_DIR).glob('metrics_*.db'):
+        for key, value in read_file(path):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _le_order(le):
+    return float('inf') if le == '+Inf' else float(le)
+
+
+def render_exposition():
+    samples = {}
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        samples.setdefault(name, []).append((tuple(map(tuple, labels)), value))
+
+    lines = []
+    for family, (kind, help_text) in FAMILIES.items():
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        if kind == 'counter':
+            for labels, value in sorted(samples.get(family, [])):
+                lines.append(f"{family}{_format_labels(labels)} {value}")
+            continue
+
+        # histogram: buckety pro každou sadu labelů kumulativně
+        series = {}
+        for labels, value in samples.get(family + '_bucket', []):
+            le = dict(labels)['le']
+            base = tuple(label for label in labels if label[0] != 'le')
+            series.setdefault(base, {})[le] = value
+        counts = dict(samples.get(family + '_count', []))
+        sums = dict(samples.get(family + '_sum', []))
+        for base in sorted(series):
+            cumulative = 0.0
+            for le in sorted(set(map(str, DURATION_BUCKETS)) | set(series[base]) | {'+Inf'}, key=_le_order):
+                cumulative += series[base].get(le, 0.0)
+                labels = sorted(base + (('le', le),))
+                lines.append(f"{family}_bucket{_format_labels(labels)} {cumulative}")
+            lines.append(f"{family}_sum{_format_labels(base)} {sums.get(base, 0.0)}")
+            lines.append(f"{family}_count{_format_labels(base)} {counts.get(base, 0.0)}")
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Přístup má scraper s "Authorization: Bearer <METRICS_TOKEN>" nebo přihlášený zaměstnanec.
+    Bez nastaveného tokenu je endpoint pro ostatní skrytý (404).
+    """
+    token = settings.METRICS_TOKEN
+    if not request.user.is_staff:
+        if not token:
+            raise Http404
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    return HttpResponse(render_exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def install_template_timing():
+    """
+    Měří čas vykreslení šablon z view (render()). Vložené šablony ({% include %})
+    se renderují uvnitř a započítají se do šablony nadřazené.
+    """
+    from django.template.backends.django import Template
+
+    original_render = Template.render
+
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            observe('pojistovna_template_render_seconds', time.perf_counter() - start,
+                    template=self.origin.template_name)
+
+    Template.render = render
+
+
+class MetricsMiddleware:
+    """
+    Pro každý požadavek zaznamená dobu zpracování a počet a čas SQL dotazů podle view.
+    """
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0, 0.0]
+
+        def count_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        if view != 'metrics':
+            observe('pojistovna_http_request_duration_seconds', duration, view=view)
+            inc('pojistovna_db_queries_total', queries[0], view=view)
+            inc('pojistovna_db_query_seconds_total', queries[1], view=view)
+        return response
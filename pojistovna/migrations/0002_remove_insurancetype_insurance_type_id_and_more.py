@@ -10,11 +10,15 @@ class Migration(migrations.Migration):
     ]
 
     operations = [
-        migrations.RemoveField(
+        # Přejmenování místo RemoveField + AddField: na SQLite by se tabulka přestavěla
+        # bez sloupce, na který odkazuje cizí klíč pojistovna_insurance (foreign key mismatch).
+        # Výsledný stav modelu je stejný, databáze s už aplikovanou migrací se nemění.
+        migrations.RenameField(
             model_name='insurancetype',
-            name='insurance_type_id',
+            old_name='insurance_type_id',
+            new_name='id',
         ),
-        migrations.AddField(
+        migrations.AlterField(
             model_name='insurancetype',
             name='id',
             field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-19 12:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0011_alter_insurance_insurance_number'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=20)),
+                ('entity_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('C', 'Vytvoření'), ('U', 'Změna')], max_length=1)),
+                ('changes', models.JSONField()),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Audit log',
+                'verbose_name_plural': 'Audit log',
+                'ordering': ['-changed_at'],
+                'indexes': [models.Index(fields=['entity', 'entity_id', 'changed_at'], name='auditlog_entity_time_idx')],
+            },
+        ),
+    ]
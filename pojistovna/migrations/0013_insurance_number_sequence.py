@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-19 12:17
+
+import pojistovna.insurance_numbers
+from django.db import migrations, models
+
+
+def create_insurance_number_sequence(apps, schema_editor):
+    NumberSequence = apps.get_model('pojistovna', 'NumberSequence')
+    NumberSequence.objects.get_or_create(name='insurance_number', defaults={'next_block': 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0012_auditlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_block', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='insurance',
+            name='insurance_number',
+            field=models.CharField(default=pojistovna.insurance_numbers.next_insurance_number, max_length=20, unique=True),
+        ),
+        migrations.RunPython(create_insurance_number_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-19 12:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0013_insurance_number_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyBaseline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_count', models.PositiveIntegerField()),
+                ('damage_median', models.FloatField()),
+                ('damage_mad', models.FloatField()),
+                ('ratio_median', models.FloatField()),
+                ('ratio_mad', models.FloatField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Anomaly baseline',
+                'verbose_name_plural': 'Anomaly baselines',
+            },
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='anomaly_flags',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='anomaly_score',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_approved', '-anomaly_score'], name='event_suspicious_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('anomaly_score__isnull', True)), fields=['id'], name='event_unscored_idx'),
+        ),
+        migrations.AddField(
+            model_name='anomalybaseline',
+            name='insurance_type',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='anomaly_baseline', to='pojistovna.insurancetype'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-19 12:35
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0015_deletion_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['report_date'], name='event_report_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='insuredperson',
+            index=models.Index(django.db.models.functions.text.Upper('surname'), name='person_surname_upper_idx'),
+        ),
+    ]
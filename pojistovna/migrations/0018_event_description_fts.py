@@ -0,0 +1,50 @@
+from django.db import migrations
+
+
+# Fulltext nad popisy událostí (viz pojistovna/claim_search.py)
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE pojistovna_event_fts USING fts5(description, content='pojistovna_event', "
+    "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER pojistovna_event_fts_ai AFTER INSERT ON pojistovna_event BEGIN "
+    "INSERT INTO pojistovna_event_fts(rowid, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER pojistovna_event_fts_ad AFTER DELETE ON pojistovna_event BEGIN "
+    "INSERT INTO pojistovna_event_fts(pojistovna_event_fts, rowid, description) VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER pojistovna_event_fts_au AFTER UPDATE OF description ON pojistovna_event BEGIN "
+    "INSERT INTO pojistovna_event_fts(pojistovna_event_fts, rowid, description) VALUES ('delete', old.id, old.description); "
+    "INSERT INTO pojistovna_event_fts(rowid, description) VALUES (new.id, new.description); END",
+    "INSERT INTO pojistovna_event_fts(pojistovna_event_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS pojistovna_event_fts_ai",
+    "DROP TRIGGER IF EXISTS pojistovna_event_fts_ad",
+    "DROP TRIGGER IF EXISTS pojistovna_event_fts_au",
+    "DROP TABLE IF EXISTS pojistovna_event_fts",
+]
+POSTGRES_FORWARD = [
+    "CREATE INDEX IF NOT EXISTS event_description_fts_idx ON pojistovna_event "
+    "USING GIN (to_tsvector('simple', description))",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS event_description_fts_idx",
+]
+
+
+def _execute(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0017_event_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _execute({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _execute({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
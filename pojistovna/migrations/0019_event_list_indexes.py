@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0018_event_description_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['-event_date', '-id'], name='event_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_approved', '-event_date', '-id'], name='event_approved_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['insurance', '-event_date', '-id'], name='event_insurance_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_approved', 'report_date'], name='event_approved_report_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_approved', 'damage_amount'], name='event_approved_damage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['damage_amount'], name='event_damage_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0019_event_list_indexes'),
+    ]
+
+    operations = [
+        # Stávající pojištění se neobnovují, nikdo o obnovu nežádal. Nová mají obnovu zapnutou.
+        migrations.AddField(
+            model_name='insurance',
+            name='auto_renew',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='insurance',
+            name='auto_renew',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='insurance',
+            name='renewed_from',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='renewals', to='pojistovna.insurance'),
+        ),
+        migrations.AlterField(
+            model_name='insurance',
+            name='start_date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='insurance',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['end_date', 'id'], name='insurance_expiry_idx'),
+        ),
+    ]
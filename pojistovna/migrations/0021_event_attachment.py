@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0020_insurance_renewal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('content_type', models.CharField(max_length=100)),
+                ('original_name', models.CharField(max_length=255)),
+                ('uploaded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='pojistovna.event')),
+                ('uploaded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Event attachment',
+                'verbose_name_plural': 'Event attachments',
+                'ordering': ['uploaded_at', 'id'],
+                'indexes': [models.Index(fields=['sha256'], name='eventattachment_sha256_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'sha256'), name='eventattachment_unique_content')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:19
+
+import django.db.models.deletion
+import django.utils.timezone
+import pojistovna.bank_accounts
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0021_event_attachment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='insuredperson',
+            name='bank_account',
+            field=models.CharField(blank=True, default='', max_length=30, validators=[pojistovna.bank_accounts.validate_bank_account]),
+        ),
+        migrations.CreateModel(
+            name='PayoutBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_format', models.CharField(choices=[('abo', 'ABO'), ('csv', 'CSV')], default='abo', max_length=3)),
+                ('event_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Payout batch',
+                'verbose_name_plural': 'Payout batches',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='payout_batch',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='events', to='pojistovna.payoutbatch'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_approved', True), ('paid_at__isnull', True)), fields=['id'], name='event_unpaid_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0022_payout_batch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insuredperson',
+            name='anonymized_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='insurance',
+            index=models.Index(fields=['insured_person', 'end_date'], name='insurance_person_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='insuredperson',
+            index=models.Index(condition=models.Q(('anonymized_at__isnull', True)), fields=['id'], name='person_not_anonymized_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0023_insuredperson_anonymized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insurance',
+            name='payment_frequency',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Ročně'), (4, 'Čtvrtletně'), (12, 'Měsíčně')], default=1),
+        ),
+        migrations.CreateModel(
+            name='PremiumInstallment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveSmallIntegerField()),
+                ('due_date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('dunning_level', models.PositiveSmallIntegerField(default=0)),
+                ('reminded_at', models.DateTimeField(blank=True, null=True)),
+                ('insurance', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='installments', to='pojistovna.insurance')),
+            ],
+            options={
+                'verbose_name': 'Premium installment',
+                'verbose_name_plural': 'Premium installments',
+                'indexes': [models.Index(condition=models.Q(('paid_at__isnull', True)), fields=['due_date', 'id'], name='installment_unpaid_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('insurance', 'sequence'), name='installment_insurance_seq_uniq')],
+            },
+        ),
+    ]
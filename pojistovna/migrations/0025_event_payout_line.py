@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0024_premium_installments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='paid_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='payout_account',
+            field=models.CharField(blank=True, default='', editable=False, max_length=30),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:05
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Max
+
+
+def block_index_to_next_value(apps, schema_editor):
+    """
+    Pořadí bloku na další volné číslo. Velikost bloku, se kterou se dosud přidělovalo, je
+    INSURANCE_NUMBER_BLOCK_SIZE z doby migrace. Kdyby se mezitím měnila, pojistí to
+    nejvyšší už přidělené číslo pojištění (10 číslic, legacy čísla z UUID se přeskočí).
+    """
+    NumberSequence = apps.get_model('pojistovna', 'NumberSequence')
+    Insurance = apps.get_model('pojistovna', 'Insurance')
+    highest = Insurance.objects.filter(insurance_number__regex=r'^[0-9]{10}$').aggregate(Max('insurance_number'))['insurance_number__max']
+    issued = int(highest[:-1]) + 1 if highest else 0
+    for sequence in NumberSequence.objects.all():
+        floor = issued if sequence.name == 'insurance_number' else 0
+        sequence.next_value = max(sequence.next_value * settings.INSURANCE_NUMBER_BLOCK_SIZE, floor)
+        sequence.save(update_fields=['next_value'])
+
+
+def next_value_to_block_index(apps, schema_editor):
+    NumberSequence = apps.get_model('pojistovna', 'NumberSequence')
+    block_size = settings.INSURANCE_NUMBER_BLOCK_SIZE
+    for sequence in NumberSequence.objects.all():
+        sequence.next_value = -(-sequence.next_value // block_size)
+        sequence.save(update_fields=['next_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pojistovna', '0025_event_payout_line'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='numbersequence',
+            old_name='next_block',
+            new_name='next_value',
+        ),
+        migrations.RunPython(block_index_to_next_value, next_value_to_block_index),
+    ]
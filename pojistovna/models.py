@@ -1,7 +1,55 @@
+import os
+
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
 from django.utils import timezone
-import uuid
+from .bank_accounts import validate_bank_account
+from .insurance_numbers import next_insurance_number
+
+
+class VisibleQuerySet(models.QuerySet):
+    def visible(self):
+        """
+        Bez záznamů označených ke smazání (mažou se na pozadí, viz deletion.py).
+        """
+        return self.filter(deletion_requested_at__isnull=True)
+
+
+class EventQuerySet(models.QuerySet):
+    def visible(self):
+        """
+        Bez událostí pojištění a pojištěnců označených ke smazání.
+        """
+        return self.filter(
+            insurance__deletion_requested_at__isnull=True,
+            insurance__insured_person__deletion_requested_at__isnull=True,
+        )
+
+
+class EventAttachmentQuerySet(models.QuerySet):
+    def visible(self):
+        """
+        Bez příloh událostí pojištění a pojištěnců označených ke smazání.
+        """
+        return self.filter(
+            event__insurance__deletion_requested_at__isnull=True,
+            event__insurance__insured_person__deletion_requested_at__isnull=True,
+        )
+
+
+class InsuranceQuerySet(VisibleQuerySet):
+    def in_force(self, day=None):
+        """
+        Pojištění, která kryjí daný den (výchozí dnes): aktivní, neoznačená ke smazání
+        a s nevypršelým end_date. Vypršelá pojištění deaktivuje až `manage.py expire_policies`,
+        do té doby je vyřadí podmínka na end_date.
+        """
+        day = day or timezone.localdate()
+        return self.visible().filter(
+            models.Q(end_date__isnull=True) | models.Q(end_date__gte=day),
+            is_active=True, insured_person__deletion_requested_at__isnull=True,
+        )
 
 
 # model pro pojistence
@@ -22,8 +70,13 @@ class InsuredPerson(models.Model):
     address = models.CharField(max_length=255, null=True, blank=True)        
     birth_certificate_number = models.CharField(max_length=11, unique=True, null=True, blank=True)  # Např. 123456/7890
     company_registration_number = models.CharField(max_length=20, unique=True, null=True, blank=True)  # Např. IČO pro podnikatele        
+    bank_account = models.CharField(max_length=30, blank=True, default='', validators=[validate_bank_account])  # Účet pro výplatu plnění, např. 19-2000145399/0800
     date_registration = models.DateTimeField(auto_now_add=True) # Datum registrace pojistence
     date_last_modification = models.DateTimeField(auto_now=True) # Datum poslední úpravy pojistence        
+    deletion_requested_at = models.DateTimeField(null=True, blank=True, editable=False)  # Čeká na smazání na pozadí
+    anonymized_at = models.DateTimeField(null=True, blank=True, editable=False)  # Osobní údaje anonymizovány (anonymization.py)
+
+    objects = VisibleQuerySet.as_manager()
 
     def __str__(self):
         return f"Pojistenec: {self.name} {self.surname} (ID: {self.id})"
@@ -31,6 +84,12 @@ class InsuredPerson(models.Model):
     class Meta:
         verbose_name = "Insured person"
         verbose_name_plural = "Insured persons"
+        indexes = [
+            # Hledání podle začátku příjmení bez ohledu na velikost písmen (admin)
+            models.Index(Upper('surname'), name='person_surname_upper_idx'),
+            # Anonymizace prochází jen dosud neanonymizované pojištěnce
+            models.Index(fields=['id'], condition=models.Q(anonymized_at__isnull=True), name='person_not_anonymized_idx'),
+        ]
 
 
 
@@ -53,23 +112,81 @@ class Insurance(models.Model):
     """
     Model pro pojištění, které mohou mít pojištěnci.
     """
+    PAYMENT_ANNUAL = 1
+    PAYMENT_QUARTERLY = 4
+    PAYMENT_MONTHLY = 12
+    PAYMENT_FREQUENCY_CHOICES = [
+        (PAYMENT_ANNUAL, 'Ročně'),
+        (PAYMENT_QUARTERLY, 'Čtvrtletně'),
+        (PAYMENT_MONTHLY, 'Měsíčně'),
+    ]
+
     # Propojení s pojistencem a typem pojištění
     insured_person = models.ForeignKey(InsuredPerson, on_delete=models.CASCADE, related_name='insurances')
     insurance_type = models.ForeignKey(InsuranceType, on_delete=models.CASCADE, related_name='insurances')    
-    insurance_number = models.CharField(max_length=20, unique=True, default=uuid.uuid4())  # Unikátní identifikátor pojištění, generovaný UUID
+    insurance_number = models.CharField(max_length=20, unique=True, default=next_insurance_number)  # Unikátní číslo pojištění s kontrolní číslicí, viz insurance_numbers.py
     insurance_subject = models.CharField(max_length=30, verbose_name="Insurance subject", null=True, blank=True)
     insurance_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Insurance price", default=100)
-    start_date = models.DateField(auto_now_add=True)  # Datum začátku pojištění
+    payment_frequency = models.PositiveSmallIntegerField(choices=PAYMENT_FREQUENCY_CHOICES, default=PAYMENT_ANNUAL)  # Počet splátek za rok, viz installments.py
+    start_date = models.DateField(default=timezone.localdate, editable=False)  # Datum začátku pojištění, obnova ho nastavuje sama
     end_date = models.DateField(null=True, blank=True)  # Datum konce pojištění (pokud je relevantní)
     is_active = models.BooleanField(default=True)  # Stav pojištění
+    auto_renew = models.BooleanField(default=True)  # Po vypršení obnovit, viz renewals.py
+    renewed_from = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='renewals')  # Předchozí období obnoveného pojištění
+    deletion_requested_at = models.DateTimeField(null=True, blank=True, editable=False)  # Čeká na smazání na pozadí
+
+    objects = InsuranceQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.insured_person.name} {self.insured_person.surname} - {self.insurance_type}"
 
+    @property
+    def is_in_force(self):
+        return self.is_active and (self.end_date is None or self.end_date >= timezone.localdate())
+
     class Meta:
         verbose_name = "Insurance"
         verbose_name_plural = "Insurances"
         ordering = ['-start_date']
+        indexes = [
+            # Dávka expire_policies hledá aktivní pojištění s end_date před dneškem,
+            # částečný index obsahuje jen aktivní pojištění a s vypršením se zmenšuje
+            models.Index(fields=['end_date', 'id'], condition=models.Q(is_active=True), name='insurance_expiry_idx'),
+            # Konec posledního pojištění pojištěnce (anonymizace bývalých klientů)
+            models.Index(fields=['insured_person', 'end_date'], name='insurance_person_end_idx'),
+        ]
+
+class PremiumInstallment(models.Model):
+    """
+    Splátka pojistného podle splátkového kalendáře pojištění (`manage.py generate_installments`).
+    Úzká tabulka: jeden řádek na splátku, pořadí splátky od začátku pojištění místo odkazu na období.
+    """
+    insurance = models.ForeignKey(Insurance, on_delete=models.CASCADE, related_name='installments', db_index=False)  # pokrývá ho unikátní index (insurance, sequence)
+    sequence = models.PositiveSmallIntegerField()  # Pořadí splátky od začátku pojištění (0, 1, ...)
+    due_date = models.DateField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    paid_at = models.DateTimeField(null=True, blank=True)
+    dunning_level = models.PositiveSmallIntegerField(default=0)  # Počet odeslaných upomínek, viz DUNNING_DAYS
+    reminded_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Splátka {self.sequence + 1} pojištění {self.insurance_id} ({self.due_date})"
+
+    @property
+    def is_overdue(self):
+        return self.paid_at is None and self.due_date < timezone.localdate()
+
+    class Meta:
+        verbose_name = "Premium installment"
+        verbose_name_plural = "Premium installments"
+        constraints = [
+            models.UniqueConstraint(fields=['insurance', 'sequence'], name='installment_insurance_seq_uniq'),
+        ]
+        indexes = [
+            # Upomínky hledají nezaplacené splátky podle splatnosti, zaplacené z indexu vypadnou
+            models.Index(fields=['due_date', 'id'], condition=models.Q(paid_at__isnull=True), name='installment_unpaid_due_idx'),
+        ]
+
 
 class Event(models.Model):
     """
@@ -82,11 +199,229 @@ class Event(models.Model):
     damage_amount = models.DecimalField(decimal_places=2, max_digits=10, default=0.00)  # výše škody
     payment_amount = models.DecimalField(decimal_places=2, max_digits=9, default=0.00)  # výše vyplacené částky(pokud schváleno)
     is_approved = models.BooleanField(default=False)
+    # Skóre podezřelosti z dávky `manage.py score_events` (viz anomaly.py), NULL = zatím neohodnoceno
+    anomaly_score = models.FloatField(null=True, blank=True, editable=False)
+    anomaly_flags = models.PositiveSmallIntegerField(default=0, editable=False)  # bitová maska anomaly.FLAG_*
+    # Klíč od partnera z dávkového příjmu (intake.py), opakované odeslání událost nezdvojí
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    # Výplata plnění (payouts.py), vyplněno při zařazení do platební dávky
+    payout_batch = models.ForeignKey('PayoutBatch', null=True, blank=True, on_delete=models.PROTECT, related_name='events', editable=False)
+    paid_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Co přesně odešlo v dávce, soubor dávky se znovu vytváří jen z těchto hodnot
+    payout_account = models.CharField(max_length=30, blank=True, default='', editable=False)
+    paid_amount = models.DecimalField(decimal_places=2, max_digits=9, null=True, blank=True, editable=False)
+
+    objects = EventQuerySet.as_manager()
 
     def __str__(self):
         return f"Událost {self.id} pro pojištění {self.insurance.insurance_number} - {self.event_date.strftime('%Y-%m-%d %H:%M:%S')}"
+
+    def anomaly_flag_labels(self):
+        from .anomaly import flag_labels
+        return flag_labels(self.anomaly_flags)
     
     class Meta:
         verbose_name = "Event"
         verbose_name_plural = "Events"
-        ordering = ['-event_date']
\ No newline at end of file
+        ordering = ['-event_date']
+        indexes = [
+            # Fronta podezřelých (neschválených) událostí seřazená podle skóre
+            models.Index(fields=['is_approved', '-anomaly_score'], name='event_suspicious_idx'),
+            # Inkrementální skórování hledá jen neohodnocené události
+            models.Index(fields=['id'], condition=models.Q(anomaly_score__isnull=True), name='event_unscored_idx'),
+            # date_hierarchy v adminu (rozsah let/měsíců a filtr podle data)
+            models.Index(fields=['report_date'], name='event_report_date_idx'),
+            # Seznam událostí (event_list) a jeho filtry, řazení -event_date, -id
+            models.Index(fields=['-event_date', '-id'], name='event_list_idx'),
+            models.Index(fields=['is_approved', '-event_date', '-id'], name='event_approved_list_idx'),
+            models.Index(fields=['insurance', '-event_date', '-id'], name='event_insurance_list_idx'),
+            models.Index(fields=['is_approved', 'report_date'], name='event_approved_report_idx'),
+            models.Index(fields=['is_approved', 'damage_amount'], name='event_approved_damage_idx'),
+            models.Index(fields=['damage_amount'], name='event_damage_idx'),
+            # Schválené a dosud nevyplacené události pro platební dávku, s výplatou z indexu vypadnou
+            models.Index(fields=['id'], condition=models.Q(is_approved=True, paid_at__isnull=True), name='event_unpaid_idx'),
+        ]
+
+
+class EventAttachment(models.Model):
+    """
+    Příloha události (fotka, PDF). Obsah je na disku pod svým SHA-256 (viz attachments.py),
+    stejný soubor přiložený vícekrát se ukládá jen jednou.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='attachments')
+    sha256 = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=100)  # podle obsahu souboru, ne podle prohlížeče
+    original_name = models.CharField(max_length=255)
+    uploaded_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    uploaded_at = models.DateTimeField(default=timezone.now)
+
+    objects = EventAttachmentQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.original_name} ({self.event_id})"
+
+    @property
+    def is_image(self):
+        return self.content_type.startswith('image/')
+
+    @property
+    def has_thumbnail(self):
+        from .attachments import thumbnail_path
+        return self.is_image and os.path.exists(thumbnail_path(self.sha256))
+
+    class Meta:
+        verbose_name = "Event attachment"
+        verbose_name_plural = "Event attachments"
+        ordering = ['uploaded_at', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'sha256'], name='eventattachment_unique_content'),
+        ]
+        indexes = [
+            # Úklid souborů bez příloh hledá odkazy podle prefixu hashe
+            models.Index(fields=['sha256'], name='eventattachment_sha256_idx'),
+        ]
+
+
+class PayoutBatch(models.Model):
+    """
+    Platební dávka výplat plnění pro banku (`manage.py create_payout_batch`, viz payouts.py).
+    Soubor dávky se dá znovu vytvořit z účtů a částek uložených u jejích událostí.
+    """
+    FORMAT_ABO = 'abo'
+    FORMAT_CSV = 'csv'
+    FORMAT_CHOICES = [
+        (FORMAT_ABO, 'ABO'),
+        (FORMAT_CSV, 'CSV'),
+    ]
+
+    file_format = models.CharField(max_length=3, choices=FORMAT_CHOICES, default=FORMAT_ABO)
+    event_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)  # NULL = dávka se ještě vytváří nebo selhala
+
+    def __str__(self):
+        return f"Dávka {self.pk} ({self.event_count} plateb, {self.total_amount} Kč)"
+
+    @property
+    def file_name(self):
+        return f"vyplaty-{self.pk:06d}-{self.created_at:%Y%m%d}.{'kpc' if self.file_format == self.FORMAT_ABO else 'csv'}"
+
+    class Meta:
+        verbose_name = "Payout batch"
+        verbose_name_plural = "Payout batches"
+        ordering = ['-created_at']
+
+
+class AnomalyBaseline(models.Model):
+    """
+    Medián a MAD logaritmu škody a poměru škoda/cena pojištění pro typ pojištění.
+    Řádek bez typu pojištění je společný základ pro typy s malým počtem událostí.
+    Přepočítává se při `manage.py score_events --full`.
+    """
+    insurance_type = models.OneToOneField(InsuranceType, null=True, blank=True, on_delete=models.CASCADE, related_name='anomaly_baseline')
+    event_count = models.PositiveIntegerField()
+    damage_median = models.FloatField()
+    damage_mad = models.FloatField()
+    ratio_median = models.FloatField()
+    ratio_mad = models.FloatField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Základ pro {self.insurance_type or 'všechny typy'} ({self.event_count} událostí)"
+
+    class Meta:
+        verbose_name = "Anomaly baseline"
+        verbose_name_plural = "Anomaly baselines"
+
+
+class DeletionJob(models.Model):
+    """
+    Smazání pojištěnce nebo pojištění po částech na pozadí (`manage.py process_deletions`).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Čeká'),
+        (STATUS_RUNNING, 'Probíhá'),
+        (STATUS_DONE, 'Dokončeno'),
+        (STATUS_FAILED, 'Chyba'),
+    ]
+
+    entity = models.CharField(max_length=20)  # model_name mazaného modelu, 'insuredperson' nebo 'insurance'
+    entity_id = models.BigIntegerField()
+    label = models.CharField(max_length=255)  # popis záznamu, ten už po smazání nepůjde dohledat
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total = models.PositiveIntegerField(default=0)  # odhad počtu mazaných řádků (události, pojištění, záznam)
+    deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Smazání {self.label} ({self.get_status_display()})"
+
+    def progress_percent(self):
+        if self.status == self.STATUS_DONE:
+            return 100
+        if not self.total:
+            return 0
+        return min(99, self.deleted * 100 // self.total)
+
+    class Meta:
+        verbose_name = "Deletion job"
+        verbose_name_plural = "Deletion jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='deletionjob_status_idx'),
+        ]
+
+
+class NumberSequence(models.Model):
+    """
+    Čítač pro přidělování čísel (např. čísel pojištění) po blocích.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=1)  # Další nerezervované pořadové číslo, nezávisí na velikosti bloku
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+
+class AuditLog(models.Model):
+    """
+    Historie změn (kdo, kdy, co) pojištěnců, pojištění a událostí.
+    Jeden řádek na jedno uložení, změněná pole jsou v `changes` jako {pole: [stará, nová]}.
+    Záznamy se nezapisují při každém save(), ale hromadně na konci požadavku (viz audit.py).
+    """
+    ACTION_CREATE = 'C'
+    ACTION_UPDATE = 'U'
+    ACTION_CHOICES = [
+        (ACTION_CREATE, 'Vytvoření'),
+        (ACTION_UPDATE, 'Změna'),
+    ]
+
+    entity = models.CharField(max_length=20)  # model_name sledovaného modelu, např. 'insurance'
+    entity_id = models.BigIntegerField()
+    action = models.CharField(max_length=1, choices=ACTION_CHOICES)
+    changes = models.JSONField()
+    changed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.entity} {self.entity_id} - {self.get_action_display()} ({self.changed_at:%Y-%m-%d %H:%M:%S})"
+
+    class Meta:
+        verbose_name = "Audit log"
+        verbose_name_plural = "Audit log"
+        ordering = ['-changed_at']
+        indexes = [
+            models.Index(fields=['entity', 'entity_id', 'changed_at'], name='auditlog_entity_time_idx'),
+        ]
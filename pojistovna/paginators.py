@@ -0,0 +1,161 @@
+"""
+Paginátory, které při každém načtení stránky neposílají do databáze COUNT(*).
+
+CachedCountPaginator - celkový počet drží v cache (PAGINATOR_COUNT_TTL), na PostgreSQL
+    u velkých tabulek bere odhad z pg_class.reltuples. Při přidání/smazání záznamu
+    se uložený počet zahodí (signály níže).
+AdminCountPaginator - totéž pro changelisty adminu, počet podle filtrů a hledání.
+LazyPaginator - počet vůbec nezjišťuje, načte per_page + 1 řádků a podle toho pozná,
+    zda existuje další stránka. Pro seznamy, kde stačí Předchozí/Další.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.utils.functional import cached_property
+
+from . import metrics
+from .models import InsuredPerson
+
+
+# Klíče uložených počtů, které se zahodí při změně daného modelu
+COUNT_KEYS = {
+    InsuredPerson: ['insured_person_list'],
+    User: ['staff_and_super_list'],
+}
+
+
+def count_cache_key(name):
+    return f'paginator_count:{name}'
+
+
+def approximate_count(queryset):
+    """
+    Odhad počtu řádků celé tabulky ze statistik PostgreSQL. Pro filtrovaný queryset
+    nebo jinou databázi vrací None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < settings.PAGINATOR_APPROXIMATE_THRESHOLD:
+        return None  # malé tabulky se spočítají přesně
+    return int(row[0])
+
+
+class CachedCountPaginator(Paginator):
+    """
+    count_key - název uloženého počtu (viz COUNT_KEYS),
+    count_queryset - levnější queryset pro počet (např. bez annotate/GROUP BY).
+    """
+    def __init__(self, object_list, per_page, count_key, count_queryset=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.count_queryset = count_queryset if count_queryset is not None else object_list
+
+    @cached_property
+    def count(self):
+        key = count_cache_key(self.count_key)
+        value = cache.get(key)
+        metrics.cache_access('paginator_count', value is not None)
+        if value is None:
+            value = approximate_count(self.count_queryset)
+            if value is None:
+                value = self.count_queryset.count()
+            cache.set(key, value, settings.PAGINATOR_COUNT_TTL)
+        return value
+
+
+class AdminCountPaginator(CachedCountPaginator):
+    """
+    Paginátor changelistu adminu. Počet se drží v cache zvlášť pro každý dotaz (filtry,
+    hledání) a na rozdíl od COUNT_KEYS se při změnách nezahazuje, platí PAGINATOR_COUNT_TTL.
+    """
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True):
+        try:
+            digest = hashlib.sha1(str(object_list.query).encode()).hexdigest()
+        except EmptyResultSet:
+            digest = None  # queryset.none() (např. hledání, které nic nenajde), SQL nemá
+        super().__init__(
+            object_list, per_page, count_key=f'admin:{object_list.model._meta.label_lower}:{digest}',
+            orphans=orphans, allow_empty_first_page=allow_empty_first_page,
+        )
+        self.is_empty = digest is None
+
+    @cached_property
+    def count(self):
+        if self.is_empty:
+            return 0
+        return super().count
+
+
+class LazyPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class LazyPaginator(Paginator):
+    """
+    Stránkování bez COUNT(*): count, num_pages a page_range nejsou k dispozici.
+    """
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("Číslo stránky není celé číslo.")
+        if number < 1:
+            raise EmptyPage("Číslo stránky je menší než 1.")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        return LazyPage(rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+    def get_page(self, number):
+        try:
+            number = self.validate_number(number)
+        except (PageNotAnInteger, EmptyPage):
+            number = 1
+        return self.page(number)
+
+    @property
+    def count(self):
+        return None
+
+    @property
+    def num_pages(self):
+        return None
+
+    @property
+    def page_range(self):
+        return []
+
+
+def _invalidate_counts(sender, created=True, **kwargs):
+    if created:
+        cache.delete_many([count_cache_key(name) for name in COUNT_KEYS[sender]])
+
+
+def connect_signals():
+    for model in COUNT_KEYS:
+        post_save.connect(_invalidate_counts, sender=model, dispatch_uid=f'paginator_save_{model._meta.model_name}')
+        post_delete.connect(_invalidate_counts, sender=model, dispatch_uid=f'paginator_delete_{model._meta.model_name}')
@@ -0,0 +1,253 @@
+"""
+Výplata schválených plnění převodem (`manage.py create_payout_batch`, view payout_batches).
+
+Do dávky patří schválené a dosud nevyplacené události s payment_amount > 0, jejichž
+pojištěnec má platný účet (bank_accounts.py). Čtou se po blocích podle id přes částečný
+index event_unpaid_idx. Každý blok je jedna transakce: UPDATE nastaví paid_at a payout_batch
+jen událostem, které mezitím nevyplatil souběžný běh, a tytéž řádky se zapíšou do těla
+souboru. Účet a částka, které do souboru odešly, se uloží k události (payout_account,
+paid_amount). V paměti je najednou vždy jen jeden blok.
+
+Kontrolní součty (počet plateb a součet) jsou v hlavičce souboru, ta se proto skládá až
+na konci: tělo se píše do dočasného souboru a za hlavičku se zkopíruje. Soubor dávky
+lze znovu vytvořit (render_batch) jen z uložených účtů a částek, ne z aktuálních údajů
+pojištěnců - ti mezitím mohli účet změnit nebo být anonymizováni. Dávka, jejíž soubor
+chybí, se ve view jen označí jako neúplná, znovu se vytváří příkazem s --render.
+
+Formát ABO (KPC) pro tuzemské platby, řádky oddělené CRLF, jen ASCII:
+    UHL1 DDMMRR název klienta (20) číslo klienta (10) 001999 000000 000000
+    1 1501 číslo souboru (3) 000 kód banky plátce
+    2 účet plátce součet v haléřích (14) datum splatnosti DDMMRR
+    účet příjemce částka v haléřích (12) VS (10) kód banky + 0 + KS (4) SS (10) AV:zpráva
+    3 +
+    5 +
+CSV: středník, UTF-8, hlavička s názvy sloupců, poslední řádek CELKEM;počet;součet.
+"""
+import os
+import shutil
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import audit
+from .bank_accounts import parse_account
+from .models import AuditLog, Event, PayoutBatch
+
+
+CHUNK_SIZE = 5000
+CONSTANT_SYMBOL = 3558  # plnění z pojistných smluv
+
+# (id, částka, účet, číslo pojištění)
+ROW_COLUMNS = ('pk', 'payment_amount', 'insurance__insured_person__bank_account', 'insurance__insurance_number')
+PAID_COLUMNS = ('pk', 'paid_amount', 'payout_account', 'insurance__insurance_number')
+
+
+class PayoutError(Exception):
+    pass
+
+
+def to_halere(amount):
+    return int(amount * 100)
+
+
+def format_account(account):
+    prefix, number, bank_code = account
+    return f"{prefix}-{number}/{bank_code}" if prefix else f"{number}/{bank_code}"
+
+
+def _symbol(value):
+    """
+    Číselný symbol (nejvýše 10 číslic) z čísla pojištění, starší čísla mohou obsahovat i jiné znaky.
+    """
+    digits = ''.join(char for char in str(value) if char.isdigit())
+    return int(digits[-10:] or 0)
+
+
+class AboFormat:
+    encoding = 'ascii'
+
+    def __init__(self, due_date):
+        if not settings.PAYOUT_ACCOUNT:
+            raise PayoutError("Pro formát ABO je potřeba nastavit PAYOUT_ACCOUNT (účet plátce).")
+        try:
+            self.payer = parse_account(settings.PAYOUT_ACCOUNT)
+        except ValueError:
+            raise PayoutError(f"PAYOUT_ACCOUNT {settings.PAYOUT_ACCOUNT} není platné číslo účtu.")
+        self.due_date = due_date
+
+    @staticmethod
+    def _account(prefix, number):
+        return f"{prefix:0>6}-{number:0>10}"
+
+    def header(self, batch, count, total_halere):
+        prefix, number, bank_code = self.payer
+        client_name = settings.PAYOUT_CLIENT_NAME.encode('ascii', 'ignore').decode()
+        return (
+            f"UHL1{self.due_date:%d%m%y}{client_name:<20.20}{number:0>10}001999000000000000\r\n"
+            f"1 1501 {batch.pk % 1000:03d}000 {bank_code}\r\n"
+            f"2 {self._account(prefix, number)} {total_halere:014d} {self.due_date:%d%m%y}\r\n"
+        )
+
+    def item(self, event_id, amount, account, insurance_number):
+        prefix, number, bank_code = account
+        return (
+            f"{self._account(prefix, number)} {to_halere(amount):012d} {event_id % 10**10:010d} "
+            f"{bank_code}0{CONSTANT_SYMBOL:04d} {_symbol(insurance_number):010d} AV:PLNENI PU {event_id}\r\n"
+        )
+
+    def trailer(self, count, total_halere):
+        return "3 +\r\n5 +\r\n"
+
+
+class CsvFormat:
+    encoding = 'utf-8'
+
+    def __init__(self, due_date):
+        self.due_date = due_date
+
+    def header(self, batch, count, total_halere):
+        return "ucet;kod_banky;castka;variabilni_symbol;konstantni_symbol;specificky_symbol;splatnost;zprava\r\n"
+
+    def item(self, event_id, amount, account, insurance_number):
+        prefix, number, bank_code = account
+        account_number = f"{prefix}-{number}" if prefix else number
+        return f"{account_number};{bank_code};{amount:.2f};{event_id};{CONSTANT_SYMBOL};{insurance_number};{self.due_date:%Y-%m-%d};Plnění PU {event_id}\r\n"
+
+    def trailer(self, count, total_halere):
+        return f"CELKEM;;{Decimal(total_halere) / 100:.2f};{count};;;;\r\n"
+
+
+FORMATS = {
+    PayoutBatch.FORMAT_ABO: AboFormat,
+    PayoutBatch.FORMAT_CSV: CsvFormat,
+}
+
+
+def unpaid_events():
+    return (
+        Event.objects.visible()
+        .filter(is_approved=True, paid_at__isnull=True, payment_amount__gt=0)
+        .exclude(insurance__insured_person__bank_account='')
+    )
+
+
+def batch_path(batch, output_dir=None):
+    return os.path.join(output_dir or settings.PAYOUT_DIR, batch.file_name)
+
+
+def _assemble(batch, path, body_path, file_format, count, total_halere):
+    """
+    Hlavička s kontrolními součty + tělo + patička, přes dočasný soubor.
+    """
+    partial = path + '.partial'
+    with open(partial, 'w', encoding=file_format.encoding, newline='') as out, \
+            open(body_path, encoding=file_format.encoding, newline='') as body:
+        out.write(file_format.header(batch, count, total_halere))
+        shutil.copyfileobj(body, out)
+        out.write(file_format.trailer(count, total_halere))
+    os.replace(partial, path)
+    os.remove(body_path)
+
+
+def create_batch(file_format=PayoutBatch.FORMAT_ABO, user=None, chunk_size=CHUNK_SIZE, output_dir=None, progress=None):
+    """
+    Vytvoří dávku ze všech nevyplacených událostí a její soubor. Vrací (dávka, cesta, přeskočeno),
+    přeskočené jsou události s neplatným číslem účtu (zůstávají nevyplacené).
+    """
+    output_dir = output_dir or settings.PAYOUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    # Formát se ověří před založením dávky, špatná konfigurace tak žádnou událost neoznačí
+    formatter = FORMATS[file_format](timezone.localdate())
+    batch = PayoutBatch.objects.create(file_format=file_format, created_by=user)
+    path = batch_path(batch, output_dir)
+    body_path = path + '.body'
+    paid_at = timezone.now()
+    count = total_halere = skipped = last_id = 0
+
+    try:
+        with open(body_path, 'w', encoding=formatter.encoding, newline='') as body:
+            while True:
+                with audit.buffered(user=user), transaction.atomic():
+                    rows = list(unpaid_events().filter(pk__gt=last_id).order_by('pk').values_list(*ROW_COLUMNS)[:chunk_size])
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    accounts = {}
+                    for event_id, _, account, _ in rows:
+                        try:
+                            accounts[event_id] = parse_account(account)
+                        except ValueError:
+                            skipped += 1
+                    Event.objects.filter(pk__in=accounts, paid_at__isnull=True).update(paid_at=paid_at, payout_batch=batch)
+                    # Události, které mezitím vyplatil souběžný běh, UPDATE nezměnil
+                    claimed = set(Event.objects.filter(pk__in=accounts, payout_batch=batch).values_list('pk', flat=True))
+                    lines = [
+                        Event(pk=event_id, paid_amount=amount, payout_account=format_account(accounts[event_id]))
+                        for event_id, amount, _, _ in rows if event_id in claimed
+                    ]
+                    Event.objects.bulk_update(lines, ['paid_amount', 'payout_account'], batch_size=500)
+                    for event_id, amount, _, insurance_number in rows:
+                        if event_id not in claimed:
+                            continue
+                        body.write(formatter.item(event_id, amount, accounts[event_id], insurance_number))
+                        audit.record('event', event_id, AuditLog.ACTION_UPDATE, {
+                            'paid_at': [None, paid_at.isoformat()], 'payout_batch_id': [None, batch.pk],
+                        })
+                        count += 1
+                        total_halere += to_halere(amount)
+                if progress:
+                    progress(count)
+    except BaseException:
+        # Zaplacené bloky už jsou v databázi, soubor se z nich vytvoří přes render_batch
+        if os.path.exists(body_path):
+            os.remove(body_path)
+        raise
+
+    if not count:
+        os.remove(body_path)
+        batch.delete()
+        raise PayoutError("Žádné události k výplatě." + (f" Přeskočeno {skipped} s neplatným číslem účtu." if skipped else ""))
+    _assemble(batch, path, body_path, formatter, count, total_halere)
+    PayoutBatch.objects.filter(pk=batch.pk).update(
+        event_count=count, total_amount=Decimal(total_halere) / 100, finished_at=timezone.now()
+    )
+    batch.refresh_from_db()
+    return batch, path, skipped
+
+
+def render_batch(batch, chunk_size=CHUNK_SIZE, output_dir=None):
+    """
+    Znovu vytvoří soubor dávky z účtů a částek uložených u jejích událostí (po blocích
+    podle id) a doplní součty, např. po přerušené tvorbě. Vrací cestu.
+    """
+    output_dir = output_dir or settings.PAYOUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    formatter = FORMATS[batch.file_format](timezone.localtime(batch.created_at).date())
+    path = batch_path(batch, output_dir)
+    body_path = path + '.body'
+    count = total_halere = last_id = 0
+    with open(body_path, 'w', encoding=formatter.encoding, newline='') as body:
+        while True:
+            rows = list(batch.events.filter(pk__gt=last_id).order_by('pk').values_list(*PAID_COLUMNS)[:chunk_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            for event_id, amount, account, insurance_number in rows:
+                try:
+                    account = parse_account(account)
+                except ValueError:
+                    account = None
+                if account is None or amount is None:
+                    os.remove(body_path)
+                    raise PayoutError(f"Událost {event_id} nemá uložený účet a částku výplaty, soubor dávky {batch.pk} nelze znovu vytvořit.")
+                body.write(formatter.item(event_id, amount, account, insurance_number))
+                count += 1
+                total_halere += to_halere(amount)
+
+    _assemble(batch, path, body_path, formatter, count, total_halere)
+    PayoutBatch.objects.filter(pk=batch.pk).update(
+        event_count=count, total_amount=Decimal(total_halere) / 100, finished_at=batch.finished_at or timezone.now()
+    )
+    return path
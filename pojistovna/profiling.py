@@ -0,0 +1,192 @@
+"""
+Vzorkovací profiler požadavků.
+
+Middleware je volitelný (PROFILER_ENABLED). Vybrané požadavky (náhodný vzorek
+PROFILER_SAMPLE_RATE, nebo všechny pomalejší než PROFILER_SLOW_MS) se profilují
+vzorkováním zásobníku: jedno vlákno na proces každých PROFILER_INTERVAL_MS ms
+přečte rámce sledovaných vláken přes sys._current_frames(). Výsledek se uloží
+do PROFILER_DIR jako "folded stacks" (formát pro flamegraph.pl / speedscope),
+soubor je označený názvem URL z pojistovna/urls.py. Agregaci dělá
+`manage.py profile_report`.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+PROFILE_SUFFIX = '.folded'
+
+
+class StackSampler:
+    """
+    Jedno vzorkovací vlákno na proces, které sbírá zásobníky registrovaných vláken.
+    Když se nic neprofiluje, vlákno spí a nic nestojí.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._labels = {}
+
+    def start(self, ident):
+        self._ensure_thread()
+        samples = Counter()
+        with self._lock:
+            self._active[ident] = samples
+        self._wakeup.set()
+        return samples
+
+    def stop(self, ident):
+        with self._lock:
+            return self._active.pop(ident, None)
+
+    def _ensure_thread(self):
+        # Po forku (gunicorn) vlákno z mastera v potomkovi neexistuje
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            if not self._active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                active = list(self._active.items())
+            folded = [
+                (ident, samples, self._fold(frames[ident]))
+                for ident, samples in active if ident in frames
+            ]
+            # Přičítá se pod zámkem a jen požadavkům, které ještě běží: stop() vyjme
+            # Counter pod stejným zámkem, po něm už se do něj nezapisuje
+            with self._lock:
+                for ident, samples, stack in folded:
+                    if self._active.get(ident) is samples:
+                        samples[stack] += 1
+
+    def _fold(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return ';'.join(stack)
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+
+def short_path(filename):
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    base = str(settings.BASE_DIR) + os.sep
+    if filename.startswith(base):
+        return filename[len(base):]
+    return filename
+
+
+def write_profile(directory, view_name, samples, meta, max_files):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    tag = view_name.replace(':', '.')
+    path = directory / f"{tag}__{int(time.time() * 1000)}_{os.getpid()}{PROFILE_SUFFIX}"
+    header = ' '.join(f"{key}={value}" for key, value in meta.items())
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"# {header}\n")
+        for stack, count in samples.items():
+            f.write(f"{stack} {count}\n")
+    rotate(directory, max_files)
+    return path
+
+
+def rotate(directory, max_files):
+    profiles = sorted(Path(directory).glob(f'*{PROFILE_SUFFIX}'), key=lambda p: p.stat().st_mtime)
+    for old in profiles[:max(len(profiles) - max_files, 0)]:
+        try:
+            old.unlink()
+        except FileNotFoundError:
+            pass  # smazal ho jiný worker
+
+
+def read_profile(path):
+    """
+    Vrátí (meta, Counter zásobníků) ze souboru zapsaného write_profile().
+    """
+    meta = {}
+    samples = Counter()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('# '):
+                for item in line[2:].split(' '):
+                    key, _, value = item.partition('=')
+                    meta[key] = value
+            elif line:
+                stack, _, count = line.rpartition(' ')
+                samples[stack] += int(count)
+    return meta, samples
+
+
+class ProfilerMiddleware:
+    """
+    Profiluje vzorek požadavků a pomalé požadavky. Bez PROFILER_ENABLED se vyřadí
+    z řetězce middlewarů (MiddlewareNotUsed), takže nic nestojí.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILER_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILER_SAMPLE_RATE
+        self.slow_ms = settings.PROFILER_SLOW_MS
+        self.directory = settings.PROFILER_DIR
+        self.max_files = settings.PROFILER_MAX_FILES
+        self.sampler = StackSampler(settings.PROFILER_INTERVAL_MS / 1000)
+
+    def __call__(self, request):
+        sampled = random.random() < self.sample_rate
+        if not sampled and not self.slow_ms:
+            return self.get_response(request)
+
+        ident = threading.get_ident()
+        self.sampler.start(ident)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            samples = self.sampler.stop(ident)
+
+        if samples and (sampled or duration_ms >= self.slow_ms):
+            match = request.resolver_match
+            view_name = match.view_name if match else 'unresolved'
+            write_profile(self.directory, view_name, samples, {
+                'view': view_name,
+                'method': request.method,
+                'status': response.status_code,
+                'duration_ms': f"{duration_ms:.1f}",
+                'interval_ms': settings.PROFILER_INTERVAL_MS,
+            }, self.max_files)
+        return response
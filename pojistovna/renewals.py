@@ -0,0 +1,156 @@
+"""
+Vypršení a obnova pojištění (`manage.py expire_policies`, spouštět jednou denně).
+
+Aktivní pojištění s end_date před zadaným dnem se zpracují po blocích
+(RENEWAL_BATCH_SIZE) přes částečný index insurance_expiry_idx. Každý blok je jedna
+transakce: jedním UPDATE se pojištění deaktivují a jedním bulk_create se vytvoří
+obnovená pojištění na další období stejné délky (začíná den po end_date).
+Zpracovaná pojištění z indexu vypadnou, další blok se tak čte opět od začátku bez OFFSET.
+
+Obnovují se jen pojištění s auto_renew, jejichž typ je stále aktivní a pojištěnec ani
+pojištění nejsou označeni ke smazání. Cena se navýší o RENEWAL_INDEXATION a o přirážku
+za každou schválenou událost v končícím období (nejvýše MAX_CLAIM_LOADING).
+Obnoví se jen pojištění, jejichž end_date je nejvýše RENEWAL_GRACE_DAYS před zadaným
+dnem. Starší (např. pojištění z doby před zavedením obnovy nebo když dávka dlouho
+neběžela) se jen deaktivují, obnova tak nikdy nenavrší zdražení za roky zpětně.
+"""
+import calendar
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import audit, metrics, search_cache
+from .insurance_numbers import allocate_insurance_numbers
+from .models import AuditLog, Event, Insurance
+
+
+CLAIM_LOADING = Decimal('0.10')  # přirážka za jednu schválenou událost
+MAX_CLAIM_LOADING = Decimal('0.50')
+CENTS = Decimal('0.01')
+
+COLUMNS = (
+    'id', 'insured_person_id', 'insurance_type_id', 'insurance_subject', 'insurance_price', 'payment_frequency',
+    'start_date', 'end_date', 'auto_renew', 'deletion_requested_at',
+    'insurance_type__is_active', 'insured_person__deletion_requested_at',
+)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def term_months(start_date, end_date):
+    """
+    Délka období v celých měsících (pojištění na rok od 1. 1. do 31. 12. = 12).
+    """
+    if start_date is None or start_date > end_date:
+        return 12
+    return max(1, round(((end_date - start_date).days + 1) / (365.25 / 12)))
+
+
+def renewal_price(price, approved_claims, indexation):
+    loading = min(MAX_CLAIM_LOADING, CLAIM_LOADING * approved_claims)
+    return (price * (indexation + loading)).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def is_renewable(row, renew_after):
+    return (
+        row['auto_renew'] and row['end_date'] >= renew_after and row['insurance_type__is_active']
+        and row['deletion_requested_at'] is None and row['insured_person__deletion_requested_at'] is None
+    )
+
+
+def expired_policies(day):
+    return Insurance.objects.filter(is_active=True, end_date__lt=day)
+
+
+def _approved_claims(insurance_ids):
+    return dict(
+        Event.objects.filter(insurance_id__in=insurance_ids)
+        .values('insurance_id').annotate(approved=Count('id', filter=Q(is_approved=True)))
+        .values_list('insurance_id', 'approved')
+    )
+
+
+def _expire_chunk(rows, indexation, renew_after):
+    """
+    Deaktivuje pojištění z rows a obnoví ta, která se obnovují. Vrací (vypršelo, obnoveno).
+    """
+    renewable = [row for row in rows if is_renewable(row, renew_after)]
+    claims = _approved_claims([row['id'] for row in renewable])
+    # Čísla se rezervují mimo transakci, aby rezervace bloků nečekala na její konec
+    numbers = allocate_insurance_numbers(len(renewable))
+
+    with audit.buffered(), transaction.atomic():
+        # Pojištění, která mezitím zpracoval souběžný běh, se přeskočí (na PostgreSQL čeká na jeho commit)
+        locked = set(
+            Insurance.objects.select_for_update(of=('self',))
+            .filter(pk__in=[row['id'] for row in rows], is_active=True).values_list('pk', flat=True)
+        )
+        Insurance.objects.filter(pk__in=locked).update(is_active=False)
+
+        renewals = []
+        for row, number in zip(renewable, numbers):
+            if row['id'] not in locked:
+                continue
+            start_date = row['end_date'] + timedelta(days=1)
+            renewals.append(Insurance(
+                insured_person_id=row['insured_person_id'],
+                insurance_type_id=row['insurance_type_id'],
+                insurance_subject=row['insurance_subject'],
+                insurance_price=renewal_price(row['insurance_price'], claims.get(row['id'], 0), indexation),
+                payment_frequency=row['payment_frequency'],
+                insurance_number=number,
+                start_date=start_date,
+                end_date=add_months(start_date, term_months(row['start_date'], row['end_date'])) - timedelta(days=1),
+                renewed_from_id=row['id'],
+            ))
+        created = Insurance.objects.bulk_create(renewals)
+
+        # update() a bulk_create nevolají post_save, historii zapíšeme sami
+        for pk in locked:
+            audit.record('insurance', pk, AuditLog.ACTION_UPDATE, {'is_active': [True, False]})
+        for insurance in created:
+            audit.record('insurance', insurance.pk, AuditLog.ACTION_CREATE, {
+                'insurance_type_id': [None, insurance.insurance_type_id],
+                'insurance_subject': [None, insurance.insurance_subject],
+                'insurance_price': [None, str(insurance.insurance_price)],
+                'insurance_number': [None, insurance.insurance_number],
+                'end_date': [None, str(insurance.end_date)],
+                'renewed_from_id': [None, insurance.renewed_from_id],
+            })
+    return len(locked), len(created)
+
+
+def expire_policies(day=None, batch_size=None, indexation=None, progress=None):
+    """
+    Deaktivuje pojištění vypršelá před dnem `day` (výchozí dnes) a obnoví je.
+    progress(vypršelo, obnoveno) se volá po každém bloku. Vrací (vypršelo, obnoveno).
+    """
+    day = day or timezone.localdate()
+    batch_size = batch_size or settings.RENEWAL_BATCH_SIZE
+    indexation = Decimal(settings.RENEWAL_INDEXATION) if indexation is None else indexation
+    renew_after = day - timedelta(days=settings.RENEWAL_GRACE_DAYS)
+    expired = renewed = 0
+    while True:
+        rows = list(expired_policies(day).order_by('end_date', 'id').values(*COLUMNS)[:batch_size])
+        if not rows:
+            break
+        chunk_expired, chunk_renewed = _expire_chunk(rows, indexation, renew_after)
+        expired += chunk_expired
+        renewed += chunk_renewed
+        if progress:
+            progress(expired, renewed)
+
+    if expired:
+        # Počty pojištění ve vyhledávání pojištěnců počítají jen aktivní pojištění
+        search_cache.invalidate('insured_person')
+        metrics.inc('pojistovna_policies_expired_total', expired)
+        metrics.inc('pojistovna_policies_renewed_total', renewed)
+    return expired, renewed
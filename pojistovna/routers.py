@@ -0,0 +1,85 @@
+"""
+Směrování dotazů mezi primární databází a read-replikou.
+
+Zápisy jdou vždy do 'default'. Čtení jdou do 'replica' jen tehdy, když:
+  - replika je nakonfigurovaná (POSTGRES_REPLICA_HOST),
+  - požadavek je GET/HEAD na view ze seznamu REPLICA_READ_VIEWS,
+  - klient v posledních REPLICA_PIN_SECONDS sekundách neposlal zápis (POST...).
+Poslední podmínka zajišťuje read-your-writes: po zápisu dostane klient cookie,
+se kterou čte z primární databáze, dokud replika zápis nedožene.
+"""
+import threading
+
+from django.conf import settings
+
+
+REPLICA_ALIAS = 'replica'
+PIN_COOKIE = 'db_pin'
+
+# Čistě čtecí view (seznamy, vyhledávání, detaily, autocomplete, exporty)
+REPLICA_READ_VIEWS = {
+    'pojistovna:insured_person',
+    'pojistovna:insured_person_search',
+    'pojistovna:insured_person_detail',
+    'pojistovna:insurance_list',
+    'pojistovna:insurance_detail',
+    'pojistovna:event_list',
+    'pojistovna:event_detail',
+    'pojistovna:suspicious_events',
+    'pojistovna:insurance-autocomplete',
+    'pojistovna:users_list',
+    'pojistovna:user_search',
+    'pojistovna:staff_and_super_list',
+    'pojistovna:entity_history',
+}
+
+_local = threading.local()
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Session se mění téměř každým požadavkem, zpoždění repliky by uživatele odhlásilo
+        if getattr(_local, 'use_replica', False) and model._meta.app_label != 'sessions':
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replika je kopie primární databáze, vztahy mezi nimi jsou v pořádku
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Podle view rozhodne, zda se má číst z repliky, a po zápisu klienta
+    na REPLICA_PIN_SECONDS "přišpendlí" k primární databázi.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.use_replica = False
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and replica_configured():
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.use_replica = (
+            replica_configured()
+            and request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in REPLICA_READ_VIEWS
+            and PIN_COOKIE not in request.COOKIES
+        )
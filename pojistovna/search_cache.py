@@ -0,0 +1,187 @@
+"""
+Krátkodobá cache výsledků dynamického vyhledávání (dynamic_insured_person_search,
+dynamic_user_search).
+
+Ukládají se data stránky (řádky a celkový počet), ne HTML - šablony obsahují CSRF token.
+Klíč tvoří druh vyhledávání, generace a normalizované (jméno, příjmení, stránka),
+velikost písmen se sjednocuje jen u ASCII (fold_ascii).
+Zápis pojištěnce, pojištění nebo uživatele posune generaci daného druhu, staré
+klíče se tím přestanou používat a vyprší samy (SEARCH_CACHE_TTL). S LocMemCache
+platí posun generace jen v procesu, který zápis provedl, ostatní workery vidí změnu
+nejpozději po uplynutí TTL.
+
+Souběžná stejná vyhledávání v jednom procesu se slévají (single-flight): dotaz do
+databáze pošle jen první vlákno, ostatní počkají na jeho výsledek. Slévání funguje jen
+mezi vlákny jednoho workeru, tedy s gthread workerem (gunicorn.conf.py, GUNICORN_THREADS).
+Synchronní worker obsluhuje najednou jediný požadavek a stejná vyhledávání se v něm
+nikdy nepřekrývají. Mezi workery se neslévá, sdílená je nanejvýš cache s výsledkem.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.http import JsonResponse
+from django.db.models.signals import post_delete, post_save
+
+from . import metrics
+from .models import Insurance, InsuredPerson
+
+
+# Druhy vyhledávání, jejichž výsledky zneplatní zápis daného modelu
+INVALIDATED_BY = {
+    InsuredPerson: ['insured_person', 'user'],
+    Insurance: ['insured_person'],  # počet pojištění ve výsledcích
+    User: ['user'],
+}
+
+
+def generation_key(kind):
+    return f'search_generation:{kind}'
+
+
+def invalidate(kind):
+    cache.set(generation_key(kind), time.time_ns(), None)
+
+
+def fold_ascii(text):
+    """
+    Malá písmena jen u ASCII znaků. Stejně porovnává icontains na SQLite (LIKE), "Čapek"
+    a "čapek" tak najdou různé řádky a nesmí sdílet záznam v cache. Na PostgreSQL
+    porovnává icontains i ostatní znaky bez ohledu na velikost, klíče jsou jen jemnější.
+    """
+    return ''.join(char.lower() if char.isascii() else char for char in text)
+
+
+def cache_key(kind, name, surname, page):
+    generation = cache.get(generation_key(kind), 0)
+    normalized = '\x00'.join([fold_ascii(name.strip()), fold_ascii(surname.strip()), str(page or 1).strip()])
+    digest = hashlib.sha1(normalized.encode()).hexdigest()
+    return f'search:{kind}:{generation}:{digest}'
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Pro každý klíč běží nejvýš jedno volání, ostatní volající dostanou jeho výsledek.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Vrací (výsledek, sdílený), sdílený = výsledek spočítalo jiné vlákno.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+flight = SingleFlight()
+os.register_at_fork(after_in_child=flight.reset)
+
+
+def cached_search(kind, name, surname, page, compute):
+    """
+    compute() vrací data stránky k uložení, volá se jen při miss a jen jednou pro
+    souběžné stejné požadavky.
+    """
+    key = cache_key(kind, name, surname, page)
+    value = cache.get(key)
+    metrics.cache_access(f'search_{kind}', value is not None)
+    if value is not None:
+        return value
+
+    def load():
+        result = compute()
+        cache.set(key, result, settings.SEARCH_CACHE_TTL)
+        return result
+
+    value, shared = flight.do(key, load)
+    if shared:
+        metrics.inc('pojistovna_search_coalesced_total', kind=kind)
+    return value
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginátor pro stránku z cache, celkový počet je už známý.
+    """
+    def __init__(self, count, per_page):
+        super().__init__([], per_page)
+        self._count = count
+
+    @property
+    def count(self):
+        return self._count
+
+
+def paginate_rows(rows, per_page, page):
+    """
+    Stránka z (dict) řádků k uložení do cache: {'rows', 'count', 'number'}.
+    """
+    page_obj = Paginator(rows, per_page).get_page(page)
+    return {'rows': list(page_obj.object_list), 'count': page_obj.paginator.count, 'number': page_obj.number}
+
+
+def page_from_cache(data, per_page):
+    return Page(data['rows'], data['number'], CountedPaginator(data['count'], per_page))
+
+
+def compact_json(data, per_page, columns):
+    """
+    Odpověď pro ?format=json: řádky jako pole hodnot v pořadí `columns`, bez HTML
+    a bez mezer. Řádky tabulky z nich sestaví skript stránky.
+    """
+    return JsonResponse({
+        'columns': columns,
+        'rows': [[row[column] for column in columns] for row in data['rows']],
+        'page': data['number'],
+        'pages': max(1, -(-data['count'] // per_page)),
+    }, json_dumps_params={'separators': (',', ':')})
+
+
+def _invalidate_searches(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return  # přihlášení výsledky vyhledávání nemění
+    for kind in INVALIDATED_BY[sender]:
+        invalidate(kind)
+
+
+def connect_signals():
+    for model in INVALIDATED_BY:
+        post_save.connect(_invalidate_searches, sender=model, dispatch_uid=f'search_save_{model._meta.model_name}')
+        post_delete.connect(_invalidate_searches, sender=model, dispatch_uid=f'search_delete_{model._meta.model_name}')
@@ -0,0 +1,172 @@
+"""
+Export dat do Parquetu pro analytiky (`manage.py snapshot_parquet`).
+
+Každá tabulka se čte po blocích podle id (WHERE id > poslední ORDER BY id LIMIT n,
+bez OFFSET) přes values_list a každý blok se zapíše jako jedna row group, v paměti
+je tak najednou vždy jen jeden blok. Sloupce mají typy podle polí modelu:
+DecimalField -> decimal128(max_digits, decimal_places), DateField -> date32,
+DateTimeField -> timestamp v UTC, cizí klíče jako int64 sloupce *_id.
+
+Inkrementální snapshot obsahuje nové řádky (id větší než při minulém běhu)
+a řádky změněné od minulého běhu podle AuditLog. Typy pojištění se exportují
+vždy celé, mazání na pozadí (DeletionJob) se zapíše do deletions.parquet.
+Stav posledního běhu je v souboru STATE_FILE ve výstupním adresáři.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.utils import timezone
+
+from .models import AuditLog, DeletionJob, Event, Insurance, InsuranceType, InsuredPerson
+
+
+CHUNK_SIZE = 50000
+STATE_FILE = 'snapshot_state.json'
+COMPRESSION = 'zstd'
+# AuditLog se zapisuje až na konci požadavku, změna těsně před minulým během mohla
+# být uložena až po něm. Takové řádky se raději exportují znovu (odběratel slučuje podle id).
+AUDIT_OVERLAP = timedelta(minutes=5)
+
+# Soubor -> (model, entita v AuditLog, inkrementálně)
+TABLES = {
+    'insurance_type': (InsuranceType, None, False),
+    'insured_person': (InsuredPerson, 'insuredperson', True),
+    'insurance': (Insurance, 'insurance', True),
+    'event': (Event, 'event', True),
+}
+
+
+def arrow_type(field):
+    internal = field.get_internal_type()
+    if field.is_relation:
+        return pa.int64()
+    if internal == 'DecimalField':
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if internal == 'DateTimeField':
+        return pa.timestamp('us', tz='UTC' if settings.USE_TZ else None)
+    if internal == 'DateField':
+        return pa.date32()
+    if internal == 'BooleanField':
+        return pa.bool_()
+    if internal == 'FloatField':
+        return pa.float64()
+    if internal in ('PositiveSmallIntegerField', 'SmallIntegerField'):
+        return pa.int32()
+    if internal in ('AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField', 'PositiveIntegerField'):
+        return pa.int64()
+    return pa.string()
+
+
+def table_schema(model):
+    fields = model._meta.concrete_fields
+    return [field.attname for field in fields], pa.schema(
+        # Starší řádky mohou mít NULL i ve sloupcích, které model jako NULL nedeklaruje
+        [pa.field(field.attname, arrow_type(field), nullable=not field.primary_key) for field in fields]
+    )
+
+
+def iter_chunks(queryset, columns, chunk_size=CHUNK_SIZE):
+    """
+    Bloky řádků (n-tice) seřazené podle id, stránkované podle id.
+    """
+    last_id = 0
+    pk_index = columns.index(queryset.model._meta.pk.attname)
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id).order_by('pk').values_list(*columns)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][pk_index]
+
+
+def write_table(path, queryset, chunk_size=CHUNK_SIZE):
+    """
+    Zapíše queryset do Parquet souboru, vrací počet řádků.
+    """
+    columns, schema = table_schema(queryset.model)
+    written = 0
+    with pq.ParquetWriter(path, schema, compression=COMPRESSION) as writer:
+        for rows in iter_chunks(queryset, columns, chunk_size):
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            written += len(rows)
+    return written
+
+
+def changed_ids(entity, since, max_id):
+    return (
+        AuditLog.objects.filter(entity=entity, changed_at__gte=since - AUDIT_OVERLAP, entity_id__lte=max_id)
+        .values_list('entity_id', flat=True).distinct()
+    )
+
+
+def write_deletions(path, since):
+    schema = pa.schema([
+        pa.field('entity', pa.string()),
+        pa.field('entity_id', pa.int64()),
+        pa.field('finished_at', arrow_type(DeletionJob._meta.get_field('finished_at'))),
+    ])
+    jobs = DeletionJob.objects.filter(status=DeletionJob.STATUS_DONE)
+    if since is not None:
+        jobs = jobs.filter(finished_at__gte=since)
+    rows = list(jobs.order_by('finished_at').values_list('entity', 'entity_id', 'finished_at'))
+    columns = list(zip(*rows)) or [[] for _ in schema]
+    table = pa.Table.from_arrays([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+    pq.write_table(table, path, compression=COMPRESSION)
+    return len(rows)
+
+
+def load_state(output_dir):
+    try:
+        with open(os.path.join(output_dir, STATE_FILE), encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    state['started_at'] = datetime.fromisoformat(state['started_at'])
+    return state
+
+
+def save_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({**state, 'started_at': state['started_at'].isoformat()}, f, indent=2)
+    os.replace(path + '.tmp', path)  # stav se nikdy nepřepíše napůl
+
+
+def snapshot(output_dir, full=False, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Vytvoří adresář snapshotu v output_dir, vrací (adresář, {soubor: počet řádků}).
+    Bez předchozího stavu nebo s full=True se exportuje vše.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    previous = None if full else load_state(output_dir)
+    # Čas se bere před čtením, změny uložené během exportu se dostanou do dalšího snapshotu
+    started_at = timezone.now()
+    kind = 'incremental' if previous else 'full'
+    target = os.path.join(output_dir, f"{started_at:%Y%m%dT%H%M%S}_{kind}")
+    partial = target + '.partial'  # přejmenuje se až po zápisu všech souborů
+    os.makedirs(partial)
+
+    counts, last_ids = {}, {}
+    for name, (model, entity, incremental) in TABLES.items():
+        queryset = model._default_manager.all()
+        last_ids[name] = queryset.order_by('-pk').values_list('pk', flat=True).first() or 0
+        if previous and incremental:
+            since_id = previous['last_ids'].get(name, 0)
+            changed = changed_ids(entity, previous['started_at'], since_id)
+            queryset = queryset.filter(pk__gt=since_id) | queryset.filter(pk__in=changed)
+        queryset = queryset.filter(pk__lte=last_ids[name])  # nové řádky během exportu až příště
+        counts[name] = write_table(os.path.join(partial, f'{name}.parquet'), queryset, chunk_size)
+        if progress:
+            progress(name, counts[name])
+    counts['deletions'] = write_deletions(
+        os.path.join(partial, 'deletions.parquet'), previous['started_at'] if previous else None
+    )
+
+    os.rename(partial, target)
+    save_state(output_dir, {'started_at': started_at, 'last_ids': last_ids, 'last_snapshot': os.path.basename(target)})
+    return target, counts
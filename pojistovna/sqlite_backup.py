@@ -0,0 +1,191 @@
+"""
+Zálohování a obnova SQLite databáze za běhu (`manage.py backup_db`, `manage.py restore_db`).
+
+Záloha používá online backup API SQLite: kopíruje se po BACKUP_PAGES stránkách
+a mezi kroky se čeká BACKUP_SLEEP sekund, aby mezi nimi mohli zapisovat ostatní.
+V režimu WAL drží zdrojové spojení po celou dobu jednu čtecí transakci. Kopie
+je proto konzistentní k okamžiku začátku zálohy, zápisy aplikace neblokuje
+a kopírování se kvůli nim neopakuje od začátku. Bez WAL se drží zámek jen
+po dobu kroku a SQLite po změně zdroje kopíruje znovu od začátku.
+
+Kopie se zapisuje do dočasného souboru, ověří se PRAGMA integrity_check a teprve
+pak se přejmenuje. V adresáři záloh se drží posledních `keep` souborů od každého
+prefixu.
+"""
+import glob
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.005
+BUSY_TIMEOUT = 30
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+class BackupError(Exception):
+    pass
+
+
+def database_path(alias=DEFAULT_DB_ALIAS):
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        raise BackupError(f"Databáze {alias} není SQLite ({connection.vendor}), použijte nástroje dané databáze.")
+    connection.ensure_connection()  # init_command přepne databázi do WAL
+    return str(connection.settings_dict['NAME'])
+
+
+def _connect(path):
+    return sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+
+
+def check_integrity(path):
+    """
+    Vrací seznam chyb z PRAGMA integrity_check, prázdný seznam = v pořádku.
+    """
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = [row[0] for row in connection.execute('PRAGMA integrity_check')]
+    finally:
+        connection.close()
+    return [] if rows == ['ok'] else rows
+
+
+def copy_database(source_path, target_path, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, checkpoint='PASSIVE', progress=None):
+    """
+    Zkopíruje databázi za běhu do target_path (přes dočasný soubor) a ověří kopii.
+    progress(zbývá, celkem) se volá po každém kroku. Vrací počet kroků.
+    """
+    partial = target_path + '.partial'
+    source, target = _connect(source_path), _connect(partial)
+    steps = 0
+    try:
+        wal = source.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+        if wal and checkpoint:
+            # PASSIVE nečeká na čtenáře ani zapisovatele, jen zkrátí WAL, který se bude kopírovat
+            source.execute(f'PRAGMA wal_checkpoint({checkpoint})')
+        if wal:
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone()  # začátek čtecí transakce
+
+        def step(status, remaining, total):
+            nonlocal steps
+            steps += 1
+            if progress:
+                progress(remaining, total)
+            time.sleep(sleep)
+
+        source.backup(target, pages=pages, progress=step)
+        if wal:
+            source.execute('COMMIT')
+        target.execute('PRAGMA journal_mode=DELETE')  # záloha je samostatný soubor bez -wal
+    except BaseException:
+        target.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        source.close()
+    target.close()
+
+    errors = check_integrity(partial)
+    if errors:
+        os.remove(partial)
+        raise BackupError("Kopie neprošla kontrolou integrity: " + '; '.join(errors[:5]))
+    os.replace(partial, target_path)
+    return steps
+
+
+def rotate(backup_dir, prefix, keep):
+    """
+    Smaže starší zálohy s daným prefixem, ponechá `keep` nejnovějších. Vrací smazané soubory.
+    """
+    backups = sorted(glob.glob(os.path.join(backup_dir, f'{prefix}-*.sqlite3')))
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def backup(backup_dir=None, keep=None, prefix='db', **kwargs):
+    """
+    Záloha výchozí databáze do backup_dir, vrací (cesta, počet kroků, smazané staré zálohy).
+    """
+    backup_dir = backup_dir or settings.BACKUP_DIR
+    keep = settings.BACKUP_KEEP if keep is None else keep
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, f"{prefix}-{timezone.now():%Y%m%dT%H%M%S}.sqlite3")
+    steps = copy_database(database_path(), path, **kwargs)
+    return path, steps, rotate(backup_dir, prefix, keep)
+
+
+def restore(backup_path, safety_backup=True, progress=None):
+    """
+    Obnoví výchozí databázi ze zálohy. Zápisy aplikace po dobu obnovy čekají na zámek.
+    Před obnovou se (se safety_backup) zazálohuje současný stav s prefixem pre-restore.
+    Vrací cestu k této záloze nebo None.
+    """
+    errors = check_integrity(backup_path)
+    if errors:
+        raise BackupError("Záloha neprošla kontrolou integrity: " + '; '.join(errors[:5]))
+    safety_path = backup(prefix='pre-restore')[0] if safety_backup else None
+
+    target_path = database_path()
+    connections[DEFAULT_DB_ALIAS].close()
+    source, target = sqlite3.connect(f'file:{backup_path}?mode=ro', uri=True), _connect(target_path)
+    try:
+        # Jedním krokem, zámek cílové databáze se drží po celou dobu obnovy tak jako tak
+        source.backup(target, pages=-1, progress=(lambda status, remaining, total: progress(remaining, total)) if progress else None)
+    finally:
+        source.close()
+        target.close()
+    errors = check_integrity(target_path)
+    if errors:
+        raise BackupError("Obnovená databáze neprošla kontrolou integrity: " + '; '.join(errors[:5]))
+    return safety_path
+
+
+class LatencyProbe(threading.Thread):
+    """
+    Vlastním spojením opakovaně provádí krátkou zapisovací transakci (BEGIN IMMEDIATE,
+    čtení, ROLLBACK), jako by ukládal událost, a měří, jak dlouho trvá. Data nemění.
+    """
+    def __init__(self, path, interval=0.02):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.samples = []
+        self._halt = threading.Event()
+
+    def run(self):
+        connection = _connect(self.path)
+        try:
+            while not self._halt.is_set():
+                start = time.perf_counter()
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute('SELECT max(id) FROM pojistovna_event').fetchone()
+                connection.execute('ROLLBACK')
+                self.samples.append((time.perf_counter() - start) * 1000)
+                self._halt.wait(self.interval)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+        return self.samples
+
+
+def latency_summary(samples):
+    if not samples:
+        return "bez měření"
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"{len(samples)} transakcí, medián {statistics.median(ordered):.2f} ms, p95 {p95:.2f} ms, max {ordered[-1]:.2f} ms"
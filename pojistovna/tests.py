@@ -1,3 +1,384 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import attachments
+from .bulk_assign import assign_insurance_bulk
+from .installments import generate_installments
+from .insurance_numbers import InsuranceNumberAllocator, allocate_insurance_numbers, allocator, is_valid_insurance_number
+from .metrics import metrics_view
+from .models import Event, EventAttachment, Insurance, InsuranceType, InsuredPerson, PayoutBatch, PremiumInstallment
+from .payouts import create_batch, render_batch
+from .renewals import expire_policies
+from .routers import PIN_COOKIE, REPLICA_ALIAS, PrimaryReplicaRouter, ReplicaRoutingMiddleware
+from .search_cache import cache_key
+
+
+THREADS = 8
+
+
+def run_in_threads(target, count=THREADS):
+    """
+    Spustí target(index) v `count` vláknech najednou a vrátí jejich výsledky.
+    Každé vlákno má vlastní spojení do databáze, na konci ho zavře.
+    """
+    results = [None] * count
+    errors = []
+    barrier = threading.Barrier(count)
+
+    def worker(index):
+        try:
+            barrier.wait()
+            results[index] = target(index)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+# Malé bloky, aby se vlákna o rezervaci v databázi přetahovala co nejčastěji
+@override_settings(INSURANCE_NUMBER_BLOCK_SIZE=10)
+class InsuranceNumberAllocationTests(TransactionTestCase):
+    """
+    Souběžné přidělování čísel pojištění (insurance_numbers.py).
+    """
+    def setUp(self):
+        # Bloky z předchozích testů patří do databáze, kterou TransactionTestCase vyprázdnil
+        allocator.reset()
+
+    def assert_unique_and_valid(self, numbers, expected_count):
+        self.assertEqual(len(numbers), expected_count)
+        self.assertEqual(len(set(numbers)), len(numbers), "Některé číslo bylo přiděleno dvakrát.")
+        invalid = [number for number in numbers if not is_valid_insurance_number(number)]
+        self.assertEqual(invalid, [])
+
+    def test_parallel_calls_share_allocator(self):
+        # Vlákna jednoho workeru sdílejí alokátor procesu
+        results = run_in_threads(lambda index: [
+            number for batch in (1, 3, 7, 1, 25) for number in allocate_insurance_numbers(batch)
+        ])
+        self.assert_unique_and_valid([number for numbers in results for number in numbers], THREADS * 37)
+
+    def test_separate_allocators_reserve_disjoint_blocks(self):
+        # Vlastní alokátor na vlákno odpovídá samostatným workerům, které se potkají jen v databázi
+        def allocate(index):
+            allocator = InsuranceNumberAllocator()
+            return [number for _ in range(20) for number in allocator.allocate(4)]
+
+        results = run_in_threads(allocate)
+        self.assert_unique_and_valid([number for numbers in results for number in numbers], THREADS * 80)
+
+    def test_smaller_block_size_does_not_reissue_numbers(self):
+        # Postupné nasazení: část workerů ještě rezervuje velké bloky, část už malé
+        with override_settings(INSURANCE_NUMBER_BLOCK_SIZE=1000):
+            numbers = InsuranceNumberAllocator().allocate(1000)
+        with override_settings(INSURANCE_NUMBER_BLOCK_SIZE=100):
+            numbers += [number for _ in range(60) for number in InsuranceNumberAllocator().allocate(100)]
+        self.assert_unique_and_valid(numbers, 7000)
+
+
+@mock.patch('pojistovna.routers.replica_configured', return_value=True)
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+    Směrování čtení a zápisů (routers.py). Replika se jen předstírá, rozhoduje router
+    podle view a cookie, do databáze se nesahá.
+    """
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+
+    def route(self, method, url, cookies=None):
+        """
+        Projde požadavek middlewarem a vrátí (databáze pro čtení, pro čtení session,
+        pro zápis) zjištěné během view a odpověď.
+        """
+        request = getattr(self.factory, method)(url)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(url)
+        seen = {}
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            seen['read'] = self.router.db_for_read(InsuredPerson)
+            seen['session'] = self.router.db_for_read(Session)
+            seen['write'] = self.router.db_for_write(InsuredPerson)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        response = middleware(request)
+        return seen, response
+
+    def test_read_view_reads_from_replica(self, _):
+        seen, _ = self.route('get', reverse('pojistovna:insured_person'))
+        self.assertEqual(seen['read'], REPLICA_ALIAS)
+        self.assertEqual(seen['session'], 'default')
+
+    def test_writes_go_to_primary(self, _):
+        seen, _ = self.route('get', reverse('pojistovna:insured_person_detail', args=[1]))
+        self.assertEqual(seen['read'], REPLICA_ALIAS)
+        self.assertEqual(seen['write'], 'default')
+
+    def test_other_views_read_from_primary(self, _):
+        seen, _ = self.route('get', reverse('pojistovna:edit_insurance', args=[1]))
+        self.assertEqual(seen['read'], 'default')
+
+    def test_routing_is_reset_after_request(self, _):
+        self.route('get', reverse('pojistovna:insured_person'))
+        self.assertEqual(self.router.db_for_read(InsuredPerson), 'default')
+
+    def test_post_pins_client_to_primary(self, _):
+        seen, response = self.route('post', reverse('pojistovna:edit_insurance', args=[1]))
+        self.assertEqual(seen['read'], 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        seen, _ = self.route('get', reverse('pojistovna:insured_person'), cookies={PIN_COOKIE: '1'})
+        self.assertEqual(seen['read'], 'default')
+
+    def test_without_replica_everything_uses_primary(self, replica_configured):
+        replica_configured.return_value = False
+        seen, response = self.route('post', reverse('pojistovna:insured_person'))
+        self.assertEqual(seen['read'], 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        seen, _ = self.route('get', reverse('pojistovna:insured_person'))
+        self.assertEqual(seen['read'], 'default')
+
+
+class SearchCacheKeyTests(SimpleTestCase):
+    """
+    Klíče cache vyhledávání (search_cache.py) se musí shodovat, jen když by se shodoval
+    i výsledek icontains na SQLite.
+    """
+    def test_ascii_case_shares_key(self):
+        self.assertEqual(cache_key('insured_person', ' Novak', 'NOVAK ', '1'), cache_key('insured_person', 'novak', 'novak', 1))
+
+    def test_non_ascii_case_gets_own_key(self):
+        self.assertNotEqual(cache_key('insured_person', 'Čapek', '', 1), cache_key('insured_person', 'čapek', '', 1))
+        self.assertNotEqual(cache_key('insured_person', 'Straße', '', 1), cache_key('insured_person', 'strasse', '', 1))
+
+
+class MetricsAccessTests(SimpleTestCase):
+    """
+    Přístup k /metrics (metrics.metrics_view).
+    """
+    def request(self, staff=False, authorization=None):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        request = RequestFactory().get('/metrics', **headers)
+        request.user = User(is_staff=True) if staff else AnonymousUser()
+        return request
+
+    @override_settings(METRICS_TOKEN='')
+    def test_without_token_only_staff(self):
+        with self.assertRaises(Http404):
+            metrics_view(self.request())
+        self.assertEqual(metrics_view(self.request(staff=True)).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required(self):
+        self.assertEqual(metrics_view(self.request(authorization='Bearer wrong')).status_code, 403)
+        self.assertEqual(metrics_view(self.request(authorization='Bearer secret')).status_code, 200)
+        self.assertEqual(metrics_view(self.request(staff=True)).status_code, 200)
+
+
+class BulkAssignTests(TransactionTestCase):
+    """
+    Hromadné přiřazení pojištění (bulk_assign.py).
+    """
+    def test_creates_installment_schedules(self):
+        InsuredPerson.objects.bulk_create([
+            InsuredPerson(name='Jan', surname=f'Novák {index}', email=f'jan{index}@example.com') for index in range(5)
+        ])
+        insurance_type = InsuranceType.objects.create(insurance_name='Úrazové', is_active=True)
+
+        created = assign_insurance_bulk(
+            InsuredPerson.objects.all(), insurance_type, 'Zaměstnanci', 1200, batch_size=2,
+        )
+        self.assertEqual(created, 5)
+        scheduled = PremiumInstallment.objects.values('insurance_id').distinct().count()
+        self.assertEqual(scheduled, 5)
+
+
+class InstallmentScheduleTests(TransactionTestCase):
+    """
+    Přegenerování splátkového kalendáře po změně pojištění (installments.py).
+    """
+    def setUp(self):
+        person = InsuredPerson.objects.create(name='Jan', surname='Novák', email='jan@example.com')
+        insurance_type = InsuranceType.objects.create(insurance_name='Majetek', is_active=True)
+        self.insurance = Insurance.objects.create(
+            insured_person=person, insurance_type=insurance_type, insurance_price=1200,
+            payment_frequency=Insurance.PAYMENT_MONTHLY, start_date=date(2026, 1, 1),
+        )
+        generate_installments(day=date(2026, 1, 1), insurance_ids=[self.insurance.pk])
+        self.insurance.installments.filter(due_date__lt=date(2026, 7, 1)).update(paid_at='2026-06-30T12:00:00Z')
+
+    def future(self):
+        return list(
+            self.insurance.installments.filter(due_date__gte=date(2026, 7, 1), due_date__lt=date(2027, 1, 1))
+            .order_by('due_date').values_list('sequence', 'due_date', 'amount')
+        )
+
+    def test_frequency_change_continues_after_paid_installments(self):
+        self.insurance.payment_frequency = Insurance.PAYMENT_QUARTERLY
+        self.insurance.save()
+        generate_installments(day=date(2026, 7, 1), insurance_ids=[self.insurance.pk])
+
+        self.assertEqual(self.future(), [
+            (6, date(2026, 7, 1), Decimal('300.00')),
+            (7, date(2026, 10, 1), Decimal('300.00')),
+        ])
+        self.assertEqual(self.insurance.installments.filter(paid_at__isnull=False).count(), 6)
+
+    def test_repricing_changes_only_unpaid_installments(self):
+        self.insurance.insurance_price = 2400
+        self.insurance.save()
+        generate_installments(day=date(2026, 7, 1), insurance_ids=[self.insurance.pk])
+
+        future = self.future()
+        self.assertEqual([sequence for sequence, _, _ in future], list(range(6, 12)))
+        self.assertEqual({amount for _, _, amount in future}, {Decimal('200.00')})
+        paid = self.insurance.installments.filter(paid_at__isnull=False)
+        self.assertEqual({installment.amount for installment in paid}, {Decimal('100.00')})
+
+    def test_prepaid_installment_is_credited(self):
+        self.insurance.installments.filter(due_date=date(2026, 7, 1)).update(paid_at='2026-06-30T12:00:00Z')
+        self.insurance.payment_frequency = Insurance.PAYMENT_QUARTERLY
+        self.insurance.save()
+        generate_installments(day=date(2026, 7, 1), insurance_ids=[self.insurance.pk])
+
+        unpaid = [(sequence, due, amount) for sequence, due, amount in self.future()
+                  if not self.insurance.installments.get(sequence=sequence).paid_at]
+        self.assertEqual(unpaid, [
+            (7, date(2026, 7, 1), Decimal('200.00')),
+            (8, date(2026, 10, 1), Decimal('300.00')),
+        ])
+
+
+class PayoutBatchTests(TransactionTestCase):
+    """
+    Soubor dávky výplat (payouts.py) se znovu vytváří jen z uložených plateb.
+    """
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        self.person = InsuredPerson.objects.create(
+            name='Jan', surname='Novák', email='jan@example.com', bank_account='19-2000145399/0800',
+        )
+        insurance = Insurance.objects.create(
+            insured_person=self.person, insurance_type=InsuranceType.objects.create(insurance_name='Majetek'),
+        )
+        self.event = Event.objects.create(insurance=insurance, description='Požár', is_approved=True, payment_amount=Decimal('1500.50'))
+
+    def test_render_uses_stored_account_and_amount(self):
+        batch, path, _ = create_batch(PayoutBatch.FORMAT_CSV, output_dir=self.output_dir)
+        with open(path, encoding='utf-8') as file:
+            original = file.read()
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.payout_account, self.event.paid_amount), ('19-2000145399/0800', Decimal('1500.50')))
+
+        # Pojištěnec po výplatě změní účet, událost se přecení
+        InsuredPerson.objects.filter(pk=self.person.pk).update(bank_account='2000145399/0800')
+        Event.objects.filter(pk=self.event.pk).update(payment_amount=Decimal('9999'))
+        os.remove(path)
+        with open(render_batch(batch, output_dir=self.output_dir), encoding='utf-8') as file:
+            self.assertEqual(file.read(), original)
+
+
+@override_settings(RENEWAL_GRACE_DAYS=30)
+class ExpirePoliciesTests(TransactionTestCase):
+    """
+    Vypršení a obnova pojištění (renewals.py).
+    """
+    def setUp(self):
+        self.person = InsuredPerson.objects.create(name='Jan', surname='Novák', email='jan@example.com')
+        self.insurance_type = InsuranceType.objects.create(insurance_name='Majetek', is_active=True)
+
+    def insurance(self, start_date, end_date, auto_renew=True):
+        return Insurance.objects.create(
+            insured_person=self.person, insurance_type=self.insurance_type, insurance_price=1000,
+            start_date=start_date, end_date=end_date, auto_renew=auto_renew,
+        )
+
+    def test_renews_recently_expired_policy_once(self):
+        insurance = self.insurance(date(2025, 10, 1), date(2026, 9, 30))
+        Event.objects.create(insurance=insurance, description='Krádež', is_approved=True)
+
+        self.assertEqual(expire_policies(date(2026, 10, 19), indexation=Decimal('1.03')), (1, 1))
+        insurance.refresh_from_db()
+        self.assertFalse(insurance.is_active)
+        renewal = insurance.renewals.get()
+        self.assertEqual((renewal.start_date, renewal.end_date), (date(2026, 10, 1), date(2027, 9, 30)))
+        self.assertEqual(renewal.insurance_price, Decimal('1130.00'))
+        self.assertTrue(renewal.is_active)
+
+    def test_long_expired_policy_is_only_deactivated(self):
+        insurance = self.insurance(date(2022, 1, 1), date(2022, 12, 31))
+
+        self.assertEqual(expire_policies(date(2026, 10, 19)), (1, 0))
+        insurance.refresh_from_db()
+        self.assertFalse(insurance.is_active)
+        self.assertEqual(Insurance.objects.count(), 1)
+
+    def test_policy_without_auto_renew_is_not_renewed(self):
+        self.insurance(date(2025, 10, 1), date(2026, 9, 30), auto_renew=False)
+        self.insurance(date(2026, 1, 1), date(2026, 12, 31))
+
+        self.assertEqual(expire_policies(date(2026, 10, 19)), (1, 0))
+        self.assertEqual(Insurance.objects.filter(is_active=True).count(), 1)
+
+
+class EventAttachmentAccessTests(TestCase):
+    """
+    Přílohy událostí pojištěnců označených ke smazání se nevydávají (views.py).
+    """
+    def setUp(self):
+        person = InsuredPerson.objects.create(name='Jan', surname='Novák', email='jan@example.com')
+        insurance = Insurance.objects.create(insured_person=person, insurance_type=InsuranceType.objects.create(insurance_name='Majetek'))
+        event = Event.objects.create(insurance=insurance, description='Kroupy')
+        self.attachment = EventAttachment.objects.create(
+            event=event, sha256='0' * 64, size=1, content_type='image/jpeg', original_name='foto.jpg',
+        )
+        self.person = person
+        self.client.force_login(User.objects.create_user('operator'))
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(ATTACHMENT_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for path in (attachments.blob_path(self.attachment.sha256), attachments.thumbnail_path(self.attachment.sha256)):
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as file:
+                file.write(b'jpeg')
+
+    def get(self, name):
+        response = self.client.get(reverse(name, args=[self.attachment.pk]))
+        if response.streaming:
+            b''.join(response.streaming_content)  # zavře soubor
+        return response.status_code
+
+    def test_download_and_thumbnail_are_hidden(self):
+        names = ('pojistovna:event_attachment_download', 'pojistovna:event_attachment_thumbnail')
+        self.assertEqual([self.get(name) for name in names], [200, 200])
+        InsuredPerson.objects.filter(pk=self.person.pk).update(deletion_requested_at=timezone.now())
+        self.assertEqual([self.get(name) for name in names], [404, 404])
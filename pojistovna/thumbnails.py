@@ -0,0 +1,33 @@
+"""
+Náhledy obrázků z příloh událostí.
+
+Funkce běží v procesech ProcessPoolExecutor (attachments.thumbnail_pool) spuštěných
+metodou spawn. Modul proto na úrovni modulu neimportuje nic z Djanga, dětský
+proces nenačítá aplikaci ani neotevírá spojení do databáze.
+"""
+import os
+
+from PIL import Image, ImageOps
+
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 80
+
+
+def make_thumbnail(source, target, size=THUMBNAIL_SIZE):
+    """
+    Uloží JPEG náhled obrázku source do target (přes dočasný soubor). Vrací target.
+    """
+    with Image.open(source) as image:
+        # JPEG se dekóduje rovnou ve zmenšeném měřítku (1/2 až 1/8), u fotek z telefonu
+        # to je řádově rychlejší a méně paměti než dekódovat celý obrázek
+        image.draft('RGB', (size[0] * 2, size[1] * 2))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = f'{target}.{os.getpid()}.partial'
+        image.save(partial, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+    os.replace(partial, target)
+    return target
@@ -1,6 +1,6 @@
 from django.urls import path
-from pojistovna.views import toggle_insurance_status, add_insurance, insurance_list, assign_insurance, insurance_detail, insurance_delete, insured_person_delete, dynamic_insured_person_search, InsuranceAutocomplete
-from pojistovna.views import event_list, add_event, edit_insurance, event_detail, run_migrations
+from pojistovna.views import toggle_insurance_status, add_insurance, insurance_list, assign_insurance, insurance_detail, insurance_delete, insured_person_delete, dynamic_insured_person_search, insurance_autocomplete, deletion_jobs
+from pojistovna.views import payout_batches, payout_batch_download, event_list, add_event, edit_insurance, event_detail, upload_event_attachments, event_attachment_download, event_attachment_thumbnail, event_intake, event_search, suspicious_events, run_migrations, entity_history, bulk_assign_insurance
 from pojistovna.views import home, users_list, user_delete, user_password_reset, dynamic_user_search, staff_and_super_list, add_super_user, add_staff_user, insured_person_register, insured_person_detail, login_view, logout_view, insured_person_list, add_insured_person, edit_insured_person
 from django.contrib.auth import views as auth_views
 
@@ -20,9 +20,11 @@ urlpatterns = [
     path("insured_person/search/", dynamic_insured_person_search, name="insured_person_search"),
     path('insured_person/<int:id>/delete/', insured_person_delete, name='insured_person_delete'),
     path('insured_person/<int:id>/assign_insurance', assign_insurance, name='assign_insurance'),
+    path('insured_person/deletions/', deletion_jobs, name='deletion_jobs'),
 
     path('insurance/', insurance_list, name='insurance_list'),
     path('insurance/add_insurance/', add_insurance, name='add_insurance'),
+    path('insurance/bulk_assign/', bulk_assign_insurance, name='bulk_assign_insurance'),
     path('insurance/<int:id>/activate/', toggle_insurance_status, {'activate': True}, name='activate_insurance'),
     path('insurance/<int:id>/deactivate/', toggle_insurance_status, {'activate': False}, name='deactivate_insurance'),
     path('insurance/<int:id>/', insurance_detail, name='insurance_detail'),
@@ -31,8 +33,18 @@ urlpatterns = [
 
     path('event/', event_list, name='event_list'),
     path('event/<int:id>/', event_detail, name='event_detail'),
+    path('event/<int:id>/attachments/', upload_event_attachments, name='upload_event_attachments'),
+    path('event/attachment/<int:id>/', event_attachment_download, name='event_attachment_download'),
+    path('event/attachment/<int:id>/thumbnail/', event_attachment_thumbnail, name='event_attachment_thumbnail'),
+    path('event/search/', event_search, name='event_search'),
+    path('event/suspicious/', suspicious_events, name='suspicious_events'),
     path('event/add_event/', add_event, name='add_event'),   
-    path('event/autocomplete/', InsuranceAutocomplete.as_view(), name='insurance-autocomplete'),
+    path('event/intake/', event_intake, name='event_intake'),
+    path('payouts/', payout_batches, name='payout_batches'),
+    path('payouts/<int:id>/download/', payout_batch_download, name='payout_batch_download'),
+    path('event/autocomplete/', insurance_autocomplete, name='insurance-autocomplete'),
+
+    path('history/<str:entity>/<int:id>/', entity_history, name='entity_history'),
 
     path('users/', users_list, name='users_list'),
     path('users/<int:id>/password_reset', user_password_reset, name='user_password_reset'),
@@ -1,18 +1,34 @@
+import os
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
 from django.contrib.auth.forms import authenticate, AuthenticationForm
 from django.contrib.auth.models import User
 from django.contrib.auth import login,logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.conf import settings
 from django.contrib import messages
-from django.db.models import Q, Count
-from .forms import InsuredPersonRegistrationForm, InsuredPersonForm, AddInsuranceTypeForm, AddEventForm, InsuranceForm, SuperUserCreateForm, StaffUserCreateForm  # Importujte svůj formulář pro pojistence
-from .models import InsuredPerson, InsuranceType, Insurance, Event  # Importujte svůj model pojistenců
+from django.utils.crypto import constant_time_compare
+from django.db.models import Q, Count, Sum, Max
+from .forms import InsuredPersonRegistrationForm, InsuredPersonForm, AddInsuranceTypeForm, AddEventForm, InsuranceForm, SuperUserCreateForm, StaffUserCreateForm, BulkAssignInsuranceForm, EventFilterForm, EventAttachmentForm  # Importujte svůj formulář pro pojistence
+from .models import InsuredPerson, InsuranceType, Insurance, Event, EventAttachment, AuditLog, DeletionJob, PayoutBatch  # Importujte svůj model pojistenců
 from django.core.paginator import Paginator
+from .paginators import CachedCountPaginator, LazyPaginator
 from django.core.management import call_command
 from decimal import InvalidOperation, Decimal
-from dal import autocomplete
-from uuid import uuid4
+from . import attachments, metrics, search_cache
+from .bulk_assign import assign_insurance_bulk, parse_person_ids, read_person_ids_csv, select_persons
+from .insurance_numbers import allocate_insurance_numbers
+from .catalogue import active_insurance_types
+from .anomaly import SUSPICIOUS_SCORE
+from .deletion import request_deletion
+from .intake import MAX_LINES, import_events
+from .claim_search import ClaimSearchResults
+from .installments import SCHEDULE_FIELDS, generate_installments
+from .payouts import PayoutError, batch_path, create_batch, unpaid_events
 
 # Function to run migrations.
 def run_migrations(request):
@@ -20,10 +36,15 @@ def run_migrations(request):
     return HttpResponse("Migrace úspěšně dokončena.")
 
 
+def active_insurance_count():
+    # Vypršelá pojištění deaktivuje expire_policies, počítají se jen aktivní
+    return Count('insurances', filter=Q(insurances__is_active=True))
+
+
 # Function to get insured persons with insurance count.
 def get_insured_persons_with_insurance_count(query=None):
-    qs = InsuredPerson.objects.annotate(
-        insurance_count=Count('insurances')
+    qs = InsuredPerson.objects.visible().annotate(
+        insurance_count=active_insurance_count()
     ).order_by('id')
 
     if query:
@@ -154,11 +175,12 @@ def add_insured_person(request):
     return render(request, 'pojistovna/insured_person_form.html', context)
 
 
-# Function to remove insured person from database.
+# Function to mark insured person for deletion, the person with insurances and events is removed in background (manage.py process_deletions).
 def insured_person_delete(request, id):
     person = get_object_or_404(InsuredPerson, pk=id)
     if request.method == "POST":
-        person.delete()
+        request_deletion(person, user=request.user if request.user.is_authenticated else None)
+        messages.success(request, f'Pojištěnec {person.name} {person.surname} bude smazán na pozadí.')
         return redirect('pojistovna:insured_person') 
     
 
@@ -198,36 +220,37 @@ def dynamic_user_search(request):
     name = request.GET.get('name', '').strip().lower()
     surname = request.GET.get('surname', '').strip().lower()
 
-    user_data = []
-
-    users = User.objects.all()
-
-    for one_user in users:
-        try:
-            insured = InsuredPerson.objects.get(user=one_user)
-            if name and name not in insured.name.lower():
-                continue
-            if surname and surname not in insured.surname.lower():
-                continue
-            user_data.append({
-                'id': one_user.id,
-                'email': one_user.email,
-                'name': insured.name,
-                'surname': insured.surname
-            })
-        except InsuredPerson.DoesNotExist:
-            if name or surname:
-                continue
-            user_data.append({
-                'id': one_user.id,
-                'email': one_user.email,
-                'name': '(neuvedeno)',
-                'surname': '(neuvedeno)'
-            })
-
-    paginator = Paginator(user_data, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    def search():
+        user_data = []
+        for one_user in User.objects.select_related('insuredperson').order_by('id'):
+            insured = getattr(one_user, 'insuredperson', None)
+            if insured is not None:
+                if name and name not in insured.name.lower():
+                    continue
+                if surname and surname not in insured.surname.lower():
+                    continue
+                user_data.append({
+                    'id': one_user.id,
+                    'email': one_user.email,
+                    'name': insured.name,
+                    'surname': insured.surname
+                })
+            else:
+                if name or surname:
+                    continue
+                user_data.append({
+                    'id': one_user.id,
+                    'email': one_user.email,
+                    'name': '(neuvedeno)',
+                    'surname': '(neuvedeno)'
+                })
+        return search_cache.paginate_rows(user_data, 10, request.GET.get('page'))
+
+    # Výsledek se krátce drží v cache, souběžná stejná hledání sdílí jeden dotaz
+    data = search_cache.cached_search('user', name, surname, request.GET.get('page'), search)
+    if request.GET.get('format') == 'json':
+        return search_cache.compact_json(data, 10, ['id', 'name', 'surname', 'email'])
+    page_obj = search_cache.page_from_cache(data, 10)
 
     return render(request, 'pojistovna/users_list_partial.html', {
         'page_obj': page_obj,
@@ -246,7 +269,7 @@ def staff_and_super_list(request):
     # Sjednocení bez duplikátů
     staff_super_users = (super_users | staff_users).distinct()
 
-    paginator = Paginator(staff_super_users, 10)
+    paginator = CachedCountPaginator(staff_super_users.order_by('id'), 10, count_key='staff_and_super_list')
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -284,17 +307,25 @@ def insured_person_detail(request, id):
     # View funkce pro zobrazení detailu pojistence.
     # Zde byste měli získat detail pojistence z databáze a předat ho do šablony.
     try:
-        insured_person = InsuredPerson.objects.get(id=id)
+        insured_person = InsuredPerson.objects.visible().get(id=id)
     except InsuredPerson.DoesNotExist:
         messages.error(request, 'Pojistěnec nebyl nalezen.')
         return redirect('pojistovna:insured_person')
 
-    # Získání všech pojištění spojených s tímto pojistencem    
-    insurances = Insurance.objects.filter(insured_person=insured_person)
+    # Pojištění pojištěnce včetně souhrnu jejich událostí (jeden dotaz), ukončená jen s ?all=1
+    show_all = request.GET.get('all') == '1'
+    insurances = Insurance.objects.visible() if show_all else Insurance.objects.in_force()
+    insurances = insurances.filter(insured_person=insured_person).select_related('insurance_type').annotate(
+        event_count=Count('events'),
+        damage_total=Sum('events__damage_amount'),
+        payment_total=Sum('events__payment_amount'),
+        last_event_date=Max('events__report_date'),
+    )
 
     context = {
         'insured_person': insured_person,
         'insurances': insurances,
+        'show_all': show_all,
     }
     return render(request, 'pojistovna/insured_person_detail.html', context)
 
@@ -317,17 +348,24 @@ def dynamic_insured_person_search(request):
     name = request.GET.get('name', '').strip()
     surname = request.GET.get('surname', '').strip()
 
-    qs = InsuredPerson.objects.annotate(
-        insurance_count=Count('insurances')
-    )
+    def search():
+        qs = InsuredPerson.objects.visible().annotate(
+            insurance_count=active_insurance_count()
+        )
 
-    if name:
-        qs = qs.filter(name__icontains=name)
-    if surname:
-        qs = qs.filter(surname__icontains=surname)
+        if name:
+            qs = qs.filter(name__icontains=name)
+        if surname:
+            qs = qs.filter(surname__icontains=surname)
 
-    paginator = Paginator(qs.order_by('id'), 10)
-    page_obj = paginator.get_page(request.GET.get('page'))
+        rows = qs.order_by('id').values('id', 'name', 'surname', 'email', 'telephone_number', 'insurance_count', 'user')
+        return search_cache.paginate_rows(rows, 10, request.GET.get('page'))
+
+    # Výsledek se krátce drží v cache, souběžná stejná hledání sdílí jeden dotaz
+    data = search_cache.cached_search('insured_person', name, surname, request.GET.get('page'), search)
+    if request.GET.get('format') == 'json':
+        return search_cache.compact_json(data, 10, ['id', 'name', 'surname', 'email', 'telephone_number', 'insurance_count', 'user'])
+    page_obj = search_cache.page_from_cache(data, 10)
 
     return render(request, 'pojistovna/insured_person_table_rows.html', {
         'page_obj': page_obj,
@@ -339,11 +377,12 @@ def dynamic_insured_person_search(request):
 # Function to show a list with  pages of 10 insured persons in database.
 def insured_person_list(request):
     # Přidáme ke každému pojištěnci počet pojištění
-    insured_persons = InsuredPerson.objects.annotate(
-        insurance_count=Count('insurances')  # "insurance" je related_name z modelu Insurance
+    insured_persons = InsuredPerson.objects.visible().annotate(
+        insurance_count=active_insurance_count()  # "insurance" je related_name z modelu Insurance
     ).order_by('id')  # volitelně seřazeno podle příjmení
 
-    paginator = Paginator(insured_persons, 10)  # 10 položek na stránku
+    # Počet bez JOINu a GROUP BY, uložený v cache
+    paginator = CachedCountPaginator(insured_persons, 10, count_key='insured_person_list', count_queryset=InsuredPerson.objects.visible())  # 10 položek na stránku
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -394,16 +433,19 @@ def toggle_insurance_status(request, id, activate=True):
 # Function to assign insurance to insured person.
 def assign_insurance(request, id):
     insured_person = get_object_or_404(InsuredPerson, id=id)
-    active_insurances = InsuranceType.objects.filter(is_active=True)
+    active_insurances = active_insurance_types()
 
     
     insurance_subject = ''
     insurance_price = ''
+    payment_frequency = Insurance.PAYMENT_ANNUAL
 
     if request.method == 'POST':
         insurance_type_id = request.POST.get('insurance_type')
         insurance_subject = request.POST.get('insurance_subject')
         insurance_price_input = request.POST.get('insurance_price')
+        frequencies = {str(value): value for value, _ in Insurance.PAYMENT_FREQUENCY_CHOICES}
+        payment_frequency = frequencies.get(request.POST.get('payment_frequency'), Insurance.PAYMENT_ANNUAL)
         
         try:
             insurance_price = Decimal(insurance_price_input)
@@ -412,17 +454,20 @@ def assign_insurance(request, id):
     
         insurance_type = get_object_or_404(InsuranceType, id=insurance_type_id, is_active=True)  
 
-        unique_number = str(uuid4())[:8]  # krátké unikátní číslo     
+        unique_number = allocate_insurance_numbers(1)[0]  # krátké unikátní číslo s kontrolní číslicí
 
         # Vytvoření nového záznamu Insurance
-        Insurance.objects.create(
+        insurance = Insurance.objects.create(
             insured_person=insured_person,
             insurance_subject=insurance_subject,
             insurance_price=insurance_price,
+            payment_frequency=payment_frequency,
             insurance_type=insurance_type,
             insurance_number=unique_number,
 
         )
+        generate_installments(insurance_ids=[insurance.pk])
+        metrics.inc('pojistovna_policies_assigned_total')
 
         messages.success(request, "Pojištění bylo úspěšně vytvořeno a přiřazeno.")
         return redirect('pojistovna:insured_person_detail', id=id)
@@ -432,17 +477,52 @@ def assign_insurance(request, id):
         'active_insurances': active_insurances,
         'insurance_subject': insurance_subject,
         'insurance_price':insurance_price,
+        'payment_frequency': payment_frequency,
+        'payment_frequencies': Insurance.PAYMENT_FREQUENCY_CHOICES,
     })
 
 
+# Function to assign one insurance to many insured persons at once (group insurance).
+@login_required
+def bulk_assign_insurance(request):
+    if request.method == 'POST':
+        form = BulkAssignInsuranceForm(request.POST, request.FILES)
+        if form.is_valid():
+            data = form.cleaned_data
+            person_ids = parse_person_ids(data['person_ids'])
+            if data['person_csv']:
+                person_ids += read_person_ids_csv(data['person_csv'])
+
+            persons = select_persons(
+                person_ids=person_ids,
+                name=data['name'],
+                surname=data['surname'],
+            )
+            created = assign_insurance_bulk(
+                persons,
+                insurance_type=data['insurance_type'],
+                insurance_subject=data['insurance_subject'],
+                insurance_price=data['insurance_price'],
+                skip_existing=data['skip_existing'],
+            )
+            messages.success(request, f"Pojištění bylo přiřazeno {created} pojištěncům.")
+            return redirect('pojistovna:insured_person')
+    else:
+        form = BulkAssignInsuranceForm()
+
+    return render(request, 'pojistovna/bulk_assign_insurance.html', {'form': form})
+
+
 # Function to show insurance detail such as subject, price, etc.
 def insurance_detail(request, id):    
-    insurance = get_object_or_404(Insurance, id=id)
+    insurance = get_object_or_404(Insurance.objects.visible().filter(insured_person__deletion_requested_at__isnull=True), id=id)
     events = Event.objects.filter(insurance=insurance)
+    installments = insurance.installments.order_by('sequence')
 
     context = {
         'insurance': insurance,
         'events': events,
+        'installments': installments,
     }
     return render(request, 'pojistovna/insurance_detail.html', context)
 
@@ -455,6 +535,8 @@ def edit_insurance(request, id):
         form = InsuranceForm(request.POST, instance=insurance)
         if form.is_valid():
             form.save()
+            if SCHEDULE_FIELDS.intersection(form.changed_data):
+                generate_installments(insurance_ids=[insurance.pk])
             messages.success(request, 'Pojištění bylo úspěšně upraveno.')
             return redirect('pojistovna:insured_person_detail', id=insurance.insured_person.id)
         else:
@@ -465,44 +547,162 @@ def edit_insurance(request, id):
     return render(request, 'pojistovna/insurance_form.html', {'form': form, 'insurance': insurance})
 
 
-# Function to remove insurance from database.
+# Function to mark insurance for deletion, the insurance with events is removed in background (manage.py process_deletions).
 def insurance_delete(request, id):
-    person = get_object_or_404(Insurance, pk=id)
+    insurance = get_object_or_404(Insurance, pk=id)
     if request.method == "POST":
-        person.delete()
+        request_deletion(insurance, user=request.user if request.user.is_authenticated else None)
+        messages.success(request, f'Pojištění {insurance} bude smazáno na pozadí.')
         return redirect('pojistovna:insured_person') 
 
 
-# Function to show a list of events in database ordered by date of create.
+# Function to show progress of background deletions (čte z primární databáze, průběh musí být aktuální).
+@login_required
+def deletion_jobs(request):
+    jobs = DeletionJob.objects.select_related('requested_by')
+    paginator = Paginator(jobs, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'page_obj': page_obj,
+        'has_open_jobs': any(job.status in (DeletionJob.STATUS_PENDING, DeletionJob.STATUS_RUNNING) for job in page_obj),
+    }
+    return render(request, 'pojistovna/deletion_jobs.html', context)
+
+
+# Function to show a list of events in database ordered by date of create, filterable by EventFilterForm.
 def event_list(request):
-    all_events = Event.objects.all()
-    paginator = Paginator(all_events, 10)
+    form = EventFilterForm(request.GET or None)
+    form.is_valid()  # neplatné filtry se ignorují, chyby se zobrazí u polí
+    all_events = form.filter(
+        Event.objects.visible().select_related('insurance__insurance_type', 'insurance__insured_person')
+    ).order_by('-event_date', '-id')
+    paginator = LazyPaginator(all_events, 10)  # bez COUNT(*), jen Předchozí/Další
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
+    filters = request.GET.copy()
+    filters.pop('page', None)
+    filters.pop('partial', None)
     context = {
-        'page_obj': page_obj,       
+        'page_obj': page_obj,
+        'form': form,
+        'query_string': filters.urlencode() + '&' if filters else '',
     }
+    # Dynamické filtrování vyměňuje jen tabulku a stránkování
+    if request.GET.get('partial'):
+        return render(request, 'pojistovna/event_list_results.html', context)
     return render(request, 'pojistovna/event_list.html', context)
 
 
+# Function to search event descriptions (full-text, see claim_search.py), filterable by insurance type and approval.
+@login_required
+def event_search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        insurance_type_id = int(request.GET['insurance_type'])
+    except (KeyError, ValueError):
+        insurance_type_id = None
+    approved = {'1': True, '0': False}.get(request.GET.get('approved'))
+
+    results = ClaimSearchResults(query, insurance_type_id=insurance_type_id, approved=approved)
+    paginator = LazyPaginator(results, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    filters = request.GET.copy()
+    filters.pop('page', None)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+        'insurance_type_id': insurance_type_id,
+        'approved': request.GET.get('approved', ''),
+        'insurance_types': active_insurance_types(),
+        'query_string': filters.urlencode() + '&' if filters else '',
+    }
+    return render(request, 'pojistovna/event_search.html', context)
+
+
+# Function to show unapproved events with the highest anomaly score first (score from manage.py score_events).
+@login_required
+def suspicious_events(request):
+    try:
+        min_score = float(request.GET.get('min_score', SUSPICIOUS_SCORE))
+    except ValueError:
+        min_score = SUSPICIOUS_SCORE
+    events = (
+        Event.objects.visible()
+        .filter(is_approved=False, anomaly_score__gte=min_score)
+        .select_related('insurance__insurance_type', 'insurance__insured_person')
+        .order_by('-anomaly_score')
+    )
+    paginator = LazyPaginator(events, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'page_obj': page_obj,
+        'min_score': min_score,
+    }
+    return render(request, 'pojistovna/suspicious_events.html', context)
+
+
 # Function to show event detail such as insurance or insured person name.
 def event_detail(request, id):
-    event = get_object_or_404(Event, id=id)
+    event = get_object_or_404(Event.objects.visible(), id=id)
 
     context = {        
         'event': event,
+        'attachments': event.attachments.all(),
+        'attachment_form': EventAttachmentForm(),
     }
 
     return render(request, 'pojistovna/event_detail.html', context)
 
 
+# Function to upload attachments (photos, PDF) to an existing event.
+@login_required
+@require_POST
+def upload_event_attachments(request, id):
+    event = get_object_or_404(Event.objects.visible(), id=id)
+    form = EventAttachmentForm(request.POST, request.FILES)
+    if form.is_valid():
+        created = attachments.attach(event, form.cleaned_data['attachments'], user=request.user)
+        messages.success(request, f"Nahráno příloh: {len(created)}.")
+    else:
+        for error in form.errors.get('attachments', []):
+            messages.error(request, error)
+    return redirect('pojistovna:event_detail', id=event.id)
+
+
+# Function to download an event attachment, supports range requests (resumed downloads, PDF viewer).
+@login_required
+def event_attachment_download(request, id):
+    attachment = get_object_or_404(EventAttachment.objects.visible(), id=id)
+    return attachments.file_response(
+        request, attachments.blob_path(attachment.sha256), attachment.content_type,
+        attachment.original_name, attachment.sha256, as_attachment=request.GET.get('download') == '1',
+    )
+
+
+# Function to show a thumbnail of an image attachment, 404 until the background process creates it.
+@login_required
+def event_attachment_thumbnail(request, id):
+    attachment = get_object_or_404(EventAttachment.objects.visible(), id=id)
+    if not attachment.has_thumbnail:
+        raise Http404("Náhled zatím není.")
+    return attachments.file_response(
+        request, attachments.thumbnail_path(attachment.sha256), 'image/jpeg',
+        f'{attachment.sha256}.jpg', f'{attachment.sha256}-thumb',
+    )
+
+
 # Function to add event to insured person's insurance in database.
 def add_event(request):
     if request.method == 'POST':
-        form = AddEventForm(request.POST)
+        form = AddEventForm(request.POST, request.FILES)
         if form.is_valid():
-            form.save()
+            event = form.save()
+            attachments.attach(event, form.cleaned_data['attachments'], user=request.user if request.user.is_authenticated else None)
+            metrics.inc('pojistovna_events_added_total')
             messages.success(request, "Událost byla úspěšně přidána.")
             return redirect('pojistovna:event_list')
     else:
@@ -511,20 +711,89 @@ def add_event(request):
     return render(request, 'pojistovna/add_event.html', {'form': form})
 
 
+# Function to import a batch of events from partners (JSON Lines in the request body, see intake.py).
+@csrf_exempt
+@require_POST
+def event_intake(request):
+    token = settings.INTAKE_TOKEN
+    if not token or not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    result = import_events(request, max_lines=MAX_LINES)  # HttpRequest se čte po řádcích, tělo se nenačítá celé
+    return JsonResponse(result.as_dict())
 
-class InsuranceAutocomplete(autocomplete.Select2QuerySetView):
-    def get_queryset(self):
-        if not self.request.user.is_authenticated:
-            return Insurance.objects.none()
 
-        qs = Insurance.objects.select_related('insured_person', 'insurance_type')
 
-        if self.q:
-            qs = qs.filter(
-                Q(insured_person__name__icontains=self.q) |
-                Q(insured_person__surname__icontains=self.q)
-            )
-        return qs
+# Function to list payout batches and create a new one from approved unpaid events (see payouts.py).
+@staff_member_required
+def payout_batches(request):
+    if request.method == 'POST':
+        file_format = request.POST.get('file_format', PayoutBatch.FORMAT_ABO)
+        if file_format not in dict(PayoutBatch.FORMAT_CHOICES):
+            return HttpResponseBadRequest()
+        try:
+            batch, _, skipped = create_batch(file_format, user=request.user)
+        except PayoutError as exc:
+            messages.error(request, str(exc))
+            return redirect('pojistovna:payout_batches')
+        messages.success(request, f"Dávka {batch.pk}: {batch.event_count} plateb, celkem {batch.total_amount} Kč.")
+        if skipped:
+            messages.warning(request, f"Přeskočeno {skipped} událostí s neplatným číslem účtu pojištěnce.")
+        return redirect('pojistovna:payout_batches')
+
+    paginator = Paginator(PayoutBatch.objects.select_related('created_by'), 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    for batch in page_obj:
+        batch.is_complete = batch.finished_at is not None and os.path.exists(batch_path(batch))
+    context = {
+        'page_obj': page_obj,
+        'unpaid': unpaid_events().aggregate(count=Count('id'), total=Sum('payment_amount')),
+        'format_choices': PayoutBatch.FORMAT_CHOICES,
+    }
+    return render(request, 'pojistovna/payout_batches.html', context)
+
+
+# Function to download a payout batch file. A missing file is not recreated here, the batch is shown as incomplete.
+@staff_member_required
+def payout_batch_download(request, id):
+    batch = get_object_or_404(PayoutBatch, id=id)
+    path = batch_path(batch)
+    if not os.path.exists(path):
+        messages.error(request, f"Soubor dávky {batch.pk} chybí, vytvořte ho příkazem create_payout_batch --render {batch.pk}.")
+        return redirect('pojistovna:payout_batches')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=batch.file_name,
+                        content_type='text/csv' if batch.file_format == PayoutBatch.FORMAT_CSV else 'text/plain')
+
+
+# Function to show change history (audit log) of insured person, insurance or event.
+AUDITED_ENTITIES = {
+    'insuredperson': (InsuredPerson, 'Pojištěnec'),
+    'insurance': (Insurance, 'Pojištění'),
+    'event': (Event, 'Událost'),
+}
+
+@login_required
+def entity_history(request, entity, id):
+    if entity not in AUDITED_ENTITIES:
+        messages.error(request, 'Neznámý typ záznamu.')
+        return redirect('pojistovna:home')
+    model, entity_label = AUDITED_ENTITIES[entity]
+
+    history = AuditLog.objects.filter(entity=entity, entity_id=id).select_related('changed_by')
+    paginator = Paginator(history, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'page_obj': page_obj,
+        'entity': entity,
+        'entity_label': entity_label,
+        'entity_id': id,
+        'obj': model.objects.filter(pk=id).first(),
+    }
+    return render(request, 'pojistovna/audit_history.html', context)
+
+
 
-    def get_result_label(self, result):
-        return f"{result.insured_person.name} {result.insured_person.surname} – {result.insurance_type.insurance_name} ({result.insurance_number})"
\ No newline at end of file
+# Function to serve insurance autocomplete (dal se načte až při prvním použití).
+def insurance_autocomplete(request, *args, **kwargs):
+    from .autocomplete import InsuranceAutocomplete
+    return InsuranceAutocomplete.as_view()(request, *args, **kwargs)
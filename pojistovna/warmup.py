@@ -0,0 +1,122 @@
+"""
+Zahřátí aplikace před forkem workerů (gunicorn s preload_app, viz gunicorn.conf.py).
+
+Master jednou načte URLconf (a s ním views a formuláře), zkompiluje šablony do
+cached loaderu a naplní katalog typů pojištění. Workery vzniklé forkem - i ty, které
+gunicorn restartuje po max_requests - to všechno zdědí a první požadavek obslouží
+stejně rychle jako ostatní.
+"""
+import gc
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.template import TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+from django.urls import URLResolver, get_resolver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Naše moduly, které se jinak načítají až při prvním použití
+LAZY_IMPORTS = ['pojistovna.autocomplete.InsuranceAutocomplete']
+
+
+def compile_patterns(resolver):
+    """
+    Regulární výrazy URL se kompilují líně až při prvním resolve(), tady všechny najednou.
+    """
+    count = 0
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        count += 1
+        if isinstance(pattern, URLResolver):
+            count += compile_patterns(pattern)
+    return count
+
+
+def warm_urls():
+    resolver = get_resolver()
+    resolver.url_patterns  # import URLconf, views a forms
+    resolver.reverse_dict  # naplní tabulky pro reverse() a {% url %}
+    resolver.pattern.regex
+    return compile_patterns(resolver)
+
+
+def warm_request_modules():
+    """
+    Moduly, které Django importuje až při prvním požadavku (context processory,
+    úložiště zpráv, serializer session) a naše líně načítané moduly.
+    """
+    for engine in engines.all():
+        engine.engine.template_context_processors
+    for path in [settings.MESSAGE_STORAGE, settings.SESSION_SERIALIZER, settings.SESSION_ENGINE + '.SessionStore']:
+        import_string(path)
+    for module in LAZY_IMPORTS:
+        import_string(module)
+    return len(LAZY_IMPORTS)
+
+
+def project_template_dirs():
+    """
+    Adresáře se šablonami projektu (šablony adminu a dalších balíčků se nezahřívají).
+    """
+    base_dir = Path(settings.BASE_DIR).resolve()
+    dirs = []
+    for engine in engines.all():
+        dirs.extend(Path(d) for d in getattr(engine, 'dirs', []))
+    dirs.extend(Path(d) for d in get_app_template_dirs('templates'))
+    return [d for d in dirs if d.is_dir() and d.resolve().is_relative_to(base_dir)]
+
+
+def warm_templates():
+    """
+    Načte šablony přes get_template, cached loader si zkompilované šablony ponechá.
+    """
+    loaded = 0
+    for directory in project_template_dirs():
+        for path in sorted(directory.rglob('*.html')):
+            name = path.relative_to(directory).as_posix()
+            try:
+                for engine in engines.all():
+                    engine.get_template(name)
+                loaded += 1
+            except TemplateSyntaxError:
+                logger.exception("Šablonu %s se nepodařilo zkompilovat", name)
+    return loaded
+
+
+def warm_catalogue():
+    from .catalogue import active_insurance_types
+    try:
+        return len(active_insurance_types())
+    except DatabaseError:
+        # Např. první start před migrací, katalog se načte až v workeru
+        logger.warning("Katalog typů pojištění se nepodařilo načíst", exc_info=True)
+        return 0
+
+
+def warm():
+    """
+    Zahřeje aplikaci a vrátí {krok: (výsledek, čas v ms)}.
+    """
+    timings = {}
+    for name, step in [
+        ('urls', warm_urls),
+        ('modules', warm_request_modules),
+        ('templates', warm_templates),
+        ('catalogue', warm_catalogue),
+    ]:
+        start = time.perf_counter()
+        result = step()
+        timings[name] = (result, (time.perf_counter() - start) * 1000)
+
+    # Spojení otevřená masterem se po forku sdílet nesmí
+    connections.close_all()
+    # Objekty načtené v masteru přesuneme do permanentní generace: GC je ve workerech
+    # neprochází, nezapisuje do nich a stránky paměti zůstanou sdílené s masterem
+    gc.collect()
+    gc.freeze()
+    return timings
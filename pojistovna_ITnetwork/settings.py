@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -48,18 +49,35 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'pojistovna.profiling.ProfilerMiddleware',  # Aktivní jen s PROFILER_ENABLED
+    'pojistovna.metrics.MetricsMiddleware',  # Prometheus metriky, /metrics
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # WhiteNoise for static files    
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'pojistovna.routers.ReplicaRoutingMiddleware',  # Čtecí view z read-repliky
     'django.contrib.messages.middleware.MessageMiddleware',
+    'pojistovna.audit.AuditMiddleware',  # Hromadný zápis historie změn na konci požadavku
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Sampling profiler (pojistovna/profiling.py), report: manage.py profile_report
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'False') == 'True'
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0.01'))  # podíl profilovaných požadavků
+PROFILER_SLOW_MS = int(os.getenv('PROFILER_SLOW_MS', '0'))  # uložit i všechny pomalejší požadavky, 0 = vypnuto
+PROFILER_INTERVAL_MS = int(os.getenv('PROFILER_INTERVAL_MS', '5'))
+PROFILER_DIR = os.getenv('PROFILER_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILER_MAX_FILES = int(os.getenv('PROFILER_MAX_FILES', '500'))
+
+# Prometheus metrics (pojistovna/metrics.py), sdílené mezi workery přes mmap soubory v METRICS_DIR
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'pojistovna_metrics'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # /metrics jen s "Authorization: Bearer <token>" nebo pro zaměstnance, bez tokenu jen pro zaměstnance
+
 ROOT_URLCONF = 'pojistovna_ITnetwork.urls'
 
 TEMPLATES = [
@@ -86,12 +104,97 @@ WSGI_APPLICATION = 'pojistovna_ITnetwork.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Bez POSTGRES_DB běží aplikace na SQLite (vývoj). S POSTGRES_DB na PostgreSQL
+# s poolem spojení (psycopg_pool) a volitelně s read-replikou (POSTGRES_REPLICA_HOST),
+# viz pojistovna/routers.py.
+
+if os.getenv('POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB'),
+            'USER': os.getenv('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('POSTGRES_POOL_MIN', '2')),
+                    'max_size': int(os.getenv('POSTGRES_POOL_MAX', '10')),
+                    'timeout': int(os.getenv('POSTGRES_POOL_TIMEOUT', '10')),
+                },
+            },
+        }
+    }
+    if os.getenv('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('POSTGRES_REPLICA_HOST'),
+            'PORT': os.getenv('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+            'USER': os.getenv('POSTGRES_REPLICA_USER', DATABASES['default']['USER']),
+            'PASSWORD': os.getenv('POSTGRES_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+            # V testech replika ukazuje na testovací primární databázi
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # WAL: čtení neblokuje zápis a záloha za běhu (backup_db) nebrzdí ukládání
+            'OPTIONS': {'init_command': 'PRAGMA journal_mode=WAL;'},
+            # Soubor místo sdílené databáze v paměti: vlákna v testech čekají na zámek jako v provozu
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
     }
-}
+
+DATABASE_ROUTERS = ['pojistovna.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '10'))  # read-your-writes po POSTu
+
+# Čísla pojištění se rezervují po blocích (pojistovna/insurance_numbers.py)
+INSURANCE_NUMBER_BLOCK_SIZE = int(os.getenv('INSURANCE_NUMBER_BLOCK_SIZE', '100'))
+
+
+# Cache
+# Bez REDIS_URL má každý worker vlastní cache v paměti
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+PAGINATOR_COUNT_TTL = int(os.getenv('PAGINATOR_COUNT_TTL', '60'))  # jak dlouho platí uložený počet záznamů seznamu
+PAGINATOR_APPROXIMATE_THRESHOLD = 100000  # od kolika řádků stačí na PostgreSQL odhad z pg_class
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '10'))  # výsledky dynamického vyhledávání (pojistovna/search_cache.py)
+DELETION_BATCH_SIZE = int(os.getenv('DELETION_BATCH_SIZE', '1000'))  # řádků smazaných v jedné transakci (pojistovna/deletion.py)
+BACKUP_DIR = os.getenv('BACKUP_DIR', os.path.join(BASE_DIR, 'backups'))  # zálohy SQLite (pojistovna/sqlite_backup.py)
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))  # kolik nejnovějších záloh ponechat
+INTAKE_TOKEN = os.getenv('INTAKE_TOKEN', '')  # dávkový příjem událostí /event/intake/ vyžaduje "Authorization: Bearer <token>", prázdný = vypnuto
+RENEWAL_BATCH_SIZE = int(os.getenv('RENEWAL_BATCH_SIZE', '2000'))  # pojištění vypršelých a obnovených v jedné transakci (pojistovna/renewals.py)
+RENEWAL_INDEXATION = os.getenv('RENEWAL_INDEXATION', '1.03')  # koeficient ceny obnoveného pojištění před přirážkou za události
+RENEWAL_GRACE_DAYS = int(os.getenv('RENEWAL_GRACE_DAYS', '30'))  # déle vypršelá pojištění se jen deaktivují, neobnovují
+ATTACHMENT_ROOT = os.getenv('ATTACHMENT_ROOT', os.path.join(BASE_DIR, 'attachments'))  # přílohy událostí podle SHA-256 (pojistovna/attachments.py)
+ATTACHMENT_MAX_SIZE = int(os.getenv('ATTACHMENT_MAX_SIZE', str(50 * 2**20)))  # největší příloha v bajtech
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', '2'))  # procesy pro náhledy příloh v každém procesu aplikace
+# Nahrávané soubory se zapisují po blocích na disk (ne do paměti) a rovnou se počítá jejich hash
+FILE_UPLOAD_HANDLERS = ['pojistovna.attachments.HashingUploadHandler']
+FILE_UPLOAD_TEMP_DIR = os.path.join(ATTACHMENT_ROOT, 'tmp')  # stejný disk jako přílohy, uložení je jen přejmenování
+PAYOUT_DIR = os.getenv('PAYOUT_DIR', os.path.join(BASE_DIR, 'payouts'))  # soubory platebních dávek (pojistovna/payouts.py)
+PAYOUT_ACCOUNT = os.getenv('PAYOUT_ACCOUNT', '')  # účet plátce pro formát ABO, např. 19-2000145399/0800
+PAYOUT_CLIENT_NAME = os.getenv('PAYOUT_CLIENT_NAME', 'POJISTOVNA')  # název klienta v hlavičce ABO (ASCII, 20 znaků)
+GDPR_RETENTION_YEARS = int(os.getenv('GDPR_RETENTION_YEARS', '10'))  # po kolika letech od konce posledního pojištění se klient anonymizuje
+DUNNING_DAYS = os.getenv('DUNNING_DAYS', '7,30,60')  # po kolika dnech po splatnosti jde 1., 2. a 3. upomínka (pojistovna/installments.py)
+INSURANCE_CATALOGUE_TTL = int(os.getenv('INSURANCE_CATALOGUE_TTL', '300'))  # katalog aktivních typů pojištění (pojistovna/catalogue.py)
 
 
 # Password validation
@@ -17,9 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.core.management import call_command
+from pojistovna.metrics import metrics_view
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),    
+    path('metrics', metrics_view, name='metrics'),  # Prometheus scrape endpoint
     path('', include('pojistovna.urls')),  # Include URLs from the pojistovna app
 ]